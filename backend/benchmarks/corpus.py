@@ -0,0 +1,137 @@
+"""
+Synthetic lesson documents (TXT, DOCX, PDF) for extraction benchmarks.
+Content is deterministic so results are comparable across commits.
+"""
+import os
+import random
+from typing import Dict, List
+
+SIZES = {
+    "small": 2_000,
+    "medium": 20_000,
+    "large": 200_000,
+}
+
+WORDS = (
+    "algorithm queue stack hash table latency throughput cache memory index "
+    "request response server client network packet protocol thread process "
+    "lock schedule priority heap tree graph vertex edge search sort merge "
+    "partition replica shard consistency availability tolerance recovery"
+).split()
+
+
+def lesson_paragraphs(num_chars: int, seed: int = 0) -> List[str]:
+    """Generate paragraphs totalling roughly num_chars characters"""
+    rng = random.Random(seed)
+    paragraphs, total, section = [], 0, 1
+    while total < num_chars:
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(8, 18))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = f"Section {section}. " + " ".join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 1
+        section += 1
+    return paragraphs
+
+
+def write_txt(path: str, paragraphs: List[str]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(paragraphs))
+
+
+def write_docx(path: str, paragraphs: List[str]):
+    from docx import Document
+    doc = Document()
+    for paragraph in paragraphs:
+        doc.add_paragraph(paragraph)
+    doc.save(path)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, paragraphs: List[str], lines_per_page: int = 60, chars_per_line: int = 95):
+    """Minimal multi-page PDF with Helvetica text (no external dependency)"""
+    lines = []
+    for paragraph in paragraphs:
+        words, current = paragraph.split(), ""
+        for word in words:
+            if len(current) + len(word) + 1 > chars_per_line:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}".strip()
+        lines.append(current)
+        lines.append("")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = []  # object bodies, numbered from 1
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(b"")  # pages tree, filled in below
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for page_lines in pages:
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(
+            f"({_pdf_escape(line)}) Tj T*" for line in page_lines
+        ) + " ET"
+        stream_bytes = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream_bytes) + stream_bytes + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+WRITERS = {
+    "txt": write_txt,
+    "docx": write_docx,
+    "pdf": write_pdf,
+}
+
+
+def build_corpus(directory: str, sizes: Dict[str, int] = SIZES, formats=("txt", "docx", "pdf")) -> List[Dict]:
+    """
+    Write one document per (format, size) into directory.
+
+    Returns:
+        List of {"path", "filename", "format", "size", "chars"} entries
+    """
+    os.makedirs(directory, exist_ok=True)
+    documents = []
+    for size_name, num_chars in sizes.items():
+        paragraphs = lesson_paragraphs(num_chars, seed=num_chars)
+        for fmt in formats:
+            filename = f"lesson_{size_name}.{fmt}"
+            path = os.path.join(directory, filename)
+            WRITERS[fmt](path, paragraphs)
+            documents.append({
+                "path": path,
+                "filename": filename,
+                "format": fmt,
+                "size": size_name,
+                "chars": sum(len(p) for p in paragraphs),
+            })
+    return documents
@@ -0,0 +1,130 @@
+"""
+Offline stand-in for the Gemini client used by benchmarks.
+
+FakeGeminiClient mimics the small part of genai.Client the app uses
+(`client.models.generate_content` and `client.models.get`) and can inject
+latency, rate limits and malformed JSON. Install it with
+services.gemini_client.set_client(FakeGeminiClient(...)).
+"""
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+
+class FakeAPIError(Exception):
+    """Shaped like google.genai.errors.APIError (has .code and .status)"""
+    def __init__(self, code: int, status: str, message: str):
+        self.code = code
+        self.status = status
+        self.message = message
+        super().__init__(f"{code} {status}. {message}")
+
+
+class FakeModels:
+    def __init__(self, backend: "FakeGeminiClient"):
+        self._backend = backend
+
+    def generate_content(self, model: str, contents, config=None):
+        return self._backend.generate(model, contents, config)
+
+    def get(self, model: str):
+        return SimpleNamespace(name=model)
+
+
+class FakeGeminiClient:
+    """
+    Args:
+        latency_ms: Mean simulated upstream latency per call
+        jitter_ms: Uniform +/- jitter around latency_ms
+        rate_limit_rate: Probability (0-1) a call raises 429 RESOURCE_EXHAUSTED
+        malformed_rate: Probability (0-1) a call returns broken JSON
+        invalid_question_rate: Probability (0-1) each question is missing a required field
+        fenced_rate: Probability (0-1) valid JSON is wrapped in a ```json fence
+        retry_hint_seconds: Value put in the "retry in Ns" hint of 429 errors
+        seed: Seed for reproducible runs
+    """
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_limit_rate: float = 0.0,
+                 malformed_rate: float = 0.0, invalid_question_rate: float = 0.0, fenced_rate: float = 0.0,
+                 retry_hint_seconds: float = 0.01, seed: Optional[int] = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.invalid_question_rate = invalid_question_rate
+        self.fenced_rate = fenced_rate
+        self.retry_hint_seconds = retry_hint_seconds
+        self.models = FakeModels(self)
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.malformed = 0
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def generate(self, model: str, contents, config=None):
+        with self._lock:
+            self.calls += 1
+            call_number = self.calls
+
+        if self.latency_ms or self.jitter_ms:
+            delay = self.latency_ms + (self._roll() * 2 - 1) * self.jitter_ms
+            time.sleep(max(0.0, delay) / 1000)
+
+        if self._roll() < self.rate_limit_rate:
+            with self._lock:
+                self.rate_limited += 1
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED",
+                               f"Quota exceeded. Please retry in {self.retry_hint_seconds}s.")
+
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        match = re.search(r"generate exactly (\d+)", prompt)
+        num_questions = int(match.group(1)) if match else 10
+
+        # Distinct numbering per call, so re-requests don't return the questions already served
+        first = (call_number - 1) * num_questions
+        questions = [make_question(first + i) for i in range(num_questions)]
+        for question in questions:
+            if self._roll() < self.invalid_question_rate:
+                del question["correct_answer"]
+        text = json.dumps({"questions": questions}, indent=2)
+        if self._roll() < self.malformed_rate:
+            with self._lock:
+                self.malformed += 1
+            text = text[: len(text) * 2 // 3]  # truncated mid-object, like a cut-off response
+        elif self._roll() < self.fenced_rate:
+            text = f"Here is your quiz:\n```json\n{text}\n```"
+
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(prompt) // 4,
+                candidates_token_count=len(text) // 4,
+                total_token_count=(len(prompt) + len(text)) // 4,
+            ),
+        )
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "rate_limited": self.rate_limited, "malformed": self.malformed}
+
+
+def make_question(i: int) -> dict:
+    """Deterministic, realistically sized multiple choice question"""
+    return {
+        "question": f"Which statement best describes concept {i} discussed in section {i % 7 + 1}?",
+        "options": {
+            "A": f"Concept {i} increases throughput by batching independent requests",
+            "B": f"Concept {i} trades memory for lower latency using a cache",
+            "C": f"Concept {i} guarantees ordering through a FIFO queue",
+            "D": f"Concept {i} has no measurable effect on performance",
+        },
+        "correct_answer": "ABCD"[i % 4],
+        "explanation": f"The lesson explains that concept {i} is defined by the property in option {'ABCD'[i % 4]}.",
+    }
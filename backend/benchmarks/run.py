@@ -0,0 +1,291 @@
+"""
+Offline benchmark suite - no network, no API key needed.
+
+Micro benchmarks: text extraction, JSON parsing, question selection, analytics.
+Macro benchmark: end-to-end /generate_quiz throughput against FakeGeminiClient.
+
+Usage (from backend/):
+    python -m benchmarks.run                         # all benchmarks
+    python -m benchmarks.run --only parsing selection
+    python -m benchmarks.run --quick                 # fewer repeats, smaller inputs
+    python -m benchmarks.run --compare benchmarks/results/<old>.json
+
+Results are written to benchmarks/results/<commit>.json.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# Keep the app offline and quiet before anything imports it
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+os.environ.setdefault("HEALTH_PROBE_ENABLED", "false")
+os.environ.setdefault("GEMINI_BACKOFF_BASE", "0.005")
+os.environ.setdefault("GEMINI_BACKOFF_MAX", "0.05")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.corpus import SIZES, build_corpus
+from benchmarks.fake_backend import FakeGeminiClient, make_question
+
+
+def measure(fn: Callable, repeat: int, number: int = 1) -> Dict:
+    """Time fn() `number` times per sample, `repeat` samples; stats are per call"""
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):  # silence any stray output from the code under test
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number)
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "median_ms": round(median * 1000, 4),
+        "min_ms": round(samples[0] * 1000, 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 4),
+        "ops_per_sec": round(1 / median, 2) if median > 0 else None,
+        "samples": repeat,
+    }
+
+
+# ============================================================
+# Micro benchmarks
+# ============================================================
+def bench_extraction(ctx) -> Dict:
+    from services.file_handler import extract_text_from_file
+    results = {}
+    for doc in ctx["corpus"]:
+        repeat = 3 if doc["format"] == "pdf" and doc["size"] == "large" else ctx["repeat"]
+        stats = measure(lambda d=doc: extract_text_from_file(d["path"], d["filename"]), repeat)
+        stats["chars"] = doc["chars"]
+        results[f"extraction.{doc['format']}.{doc['size']}"] = stats
+    return results
+
+
+def bench_parsing(ctx) -> Dict:
+    from utils.helpers import parse_JSON_quiz
+    payload = json.dumps({"questions": [make_question(i) for i in range(40)]}, indent=2)
+    inputs = {
+        "clean": payload,
+        "fenced": f"```json\n{payload}\n```",
+        "prose": f"Sure! Here is the quiz you asked for:\n{payload}\nGood luck!",
+        "truncated": payload[: len(payload) * 2 // 3],
+    }
+    results = {}
+    for name, text in inputs.items():
+        outcome = parse_JSON_quiz(text)
+        stats = measure(lambda t=text: parse_JSON_quiz(t), ctx["repeat"], number=20)
+        stats["parsed"] = bool(outcome)
+        results[f"parsing.{name}"] = stats
+    return results
+
+
+def bench_selection(ctx) -> Dict:
+    from utils.quiz_manager import QuizManager
+    results = {}
+    for bank_size in ctx["bank_sizes"]:
+        manager = QuizManager()
+        questions = [make_question(i) for i in range(bank_size)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.upload_and_cache_questions("bench", questions, {})
+        stats = measure(lambda m=manager: m.generate_new_quiz("bench", num_questions=10), ctx["repeat"], number=5)
+        stats["bank_size"] = bank_size
+        results[f"selection.bank_{bank_size}"] = stats
+    return results
+
+
+def bench_analytics(ctx) -> Dict:
+    from routes import analytics
+    results = {}
+    for num_quizzes in ctx["quiz_counts"]:
+        session_id = f"bench_{num_quizzes}"
+        analytics.quiz_sessions[session_id] = [
+            {
+                "timestamp": datetime.now().isoformat(),
+                "topic": f"Topic {q % 5}",
+                "questions": [
+                    {
+                        "question": make_question(i)["question"],
+                        "userAnswer": "A",
+                        "correctAnswer": "ABCD"[i % 4],
+                        "isCorrect": i % 4 == 0,
+                        "timeSpent": 3.0 + (i % 11),
+                    }
+                    for i in range(10)
+                ],
+            }
+            for q in range(num_quizzes)
+        ]
+        stats = measure(lambda s=session_id: asyncio.run(analytics.get_session_analytics(s)), ctx["repeat"])
+        stats["answers"] = num_quizzes * 10
+        results[f"analytics.quizzes_{num_quizzes}"] = stats
+        del analytics.quiz_sessions[session_id]
+    return results
+
+
+# ============================================================
+# Macro benchmark: full request path with a fake model backend
+# ============================================================
+def bench_end_to_end(ctx) -> Dict:
+    import httpx
+    from services.gemini_client import set_client
+    from services.quiz_generator import breaker
+    import main
+
+    lesson = next(d for d in ctx["corpus"] if d["format"] == "txt" and d["size"] == "medium")
+    with open(lesson["path"], "rb") as f:
+        body = f.read()
+
+    scenarios = {
+        "clean": FakeGeminiClient(latency_ms=ctx["latency_ms"]),
+        "flaky": FakeGeminiClient(latency_ms=ctx["latency_ms"], rate_limit_rate=0.2, malformed_rate=0.1, fenced_rate=0.3),
+        "invalid_items": FakeGeminiClient(latency_ms=ctx["latency_ms"], invalid_question_rate=0.1),
+    }
+
+    async def run(total: int, concurrency: int):
+        transport = httpx.ASGITransport(app=main.app)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, statuses = [], []
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/generate_quiz",
+                        files={"file": (lesson["filename"], body)},
+                        data={"num_of_questions": "10"},
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    statuses.append(response.status_code)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(total)))
+            elapsed = time.perf_counter() - start
+        return elapsed, sorted(latencies), statuses
+
+    # Warm-up: first request pays for deferred imports (google.genai types etc.)
+    set_client(FakeGeminiClient())
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(run(2, 1))
+
+    results = {}
+    for name, backend in scenarios.items():
+        set_client(backend)
+        breaker.record_success()  # start every scenario with a closed circuit
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, latencies, statuses = asyncio.run(run(ctx["requests"], ctx["concurrency"]))
+        results[f"end_to_end.{name}"] = {
+            "median_ms": round(statistics.median(latencies) * 1000, 4),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 4),
+            "requests_per_sec": round(len(latencies) / elapsed, 2),
+            "success_rate": round(statuses.count(200) / len(statuses), 4),
+            "requests": len(latencies),
+            "concurrency": ctx["concurrency"],
+            "upstream": backend.stats(),
+        }
+    set_client(None)
+    return results
+
+
+BENCHMARKS = {
+    "extraction": bench_extraction,
+    "parsing": bench_parsing,
+    "selection": bench_selection,
+    "analytics": bench_analytics,
+    "end_to_end": bench_end_to_end,
+}
+
+
+# ============================================================
+# Results storage / comparison
+# ============================================================
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: Dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparison against {baseline.get('commit')} ({baseline_path})")
+    print(f"{'benchmark':40} {'before ms':>12} {'after ms':>12} {'change':>9}")
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("median_ms"):
+            continue
+        change = (result["median_ms"] - old["median_ms"]) / old["median_ms"] * 100
+        print(f"{name:40} {old['median_ms']:12.3f} {result['median_ms']:12.3f} {change:+8.1f}%")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="Run a subset of benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Fewer repeats and smaller inputs")
+    parser.add_argument("--output", help="Results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake upstream latency for end_to_end")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        ctx = {
+            "repeat": 5 if args.quick else 20,
+            "bank_sizes": [100, 1_000] if args.quick else [100, 1_000, 10_000],
+            "quiz_counts": [10, 100] if args.quick else [10, 100, 1_000],
+            "requests": 20 if args.quick else 100,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "corpus": build_corpus(
+                corpus_dir,
+                sizes={"small": 2_000, "medium": 20_000} if args.quick else SIZES,
+            ),
+        }
+
+        report = {
+            "commit": current_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "results": {},
+        }
+        for name in args.only or BENCHMARKS:
+            print(f"[BENCH] {name}...")
+            for key, stats in BENCHMARKS[name](ctx).items():
+                report["results"][key] = stats
+                rate = stats.get("ops_per_sec") or stats.get("requests_per_sec")
+                print(f"[BENCH]   {key:38} median {stats['median_ms']:10.3f} ms   {rate} /s")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Results written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
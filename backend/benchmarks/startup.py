@@ -0,0 +1,88 @@
+"""
+Cold-start guard for autoscaled workers.
+
+Imports the app in a fresh interpreter with `python -X importtime`, reports the
+slowest modules and fails (exit code 1) when the total import time exceeds the
+budget or when a dependency that should be lazy was imported eagerly.
+
+Usage (from backend/):
+    python -m benchmarks.startup --budget-ms 800
+
+The same check runs as a regression test in tests/test_startup.py (python -m pytest).
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only load on first use
+LAZY_MODULES = ["google.genai", "pandas", "numpy", "pdfminer", "docx"]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module: str = "main") -> dict:
+    """Import `module` in a clean interpreter and parse -X importtime output"""
+    check = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "startup-check")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "top_level": len(indent) == 1,
+            })
+
+    total_ms = sum(m["cumulative_ms"] for m in modules if m["top_level"])
+    eager = [m for m in proc.stdout.strip().split(",") if m]
+    return {
+        "module": module,
+        "total_ms": round(total_ms, 2),
+        "slowest": sorted(modules, key=lambda m: m["self_ms"], reverse=True)[:10],
+        "eager_heavy_imports": eager,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Guard app cold-start import time")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "800")))
+    parser.add_argument("--runs", type=int, default=3, help="Best of N runs (reduces noise)")
+    args = parser.parse_args(argv)
+
+    result = min((measure_import(args.module) for _ in range(args.runs)), key=lambda r: r["total_ms"])
+
+    print(f"[STARTUP] import {result['module']}: {result['total_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for m in result["slowest"]:
+        print(f"[STARTUP]   {m['self_ms']:8.1f} ms  {m['module']}")
+
+    ok = True
+    if result["eager_heavy_imports"]:
+        print(f"[STARTUP] FAIL: imported eagerly: {', '.join(result['eager_heavy_imports'])}")
+        ok = False
+    if result["total_ms"] > args.budget_ms:
+        print("[STARTUP] FAIL: import time over budget")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,45 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 
-# Load environment variables FIRST
+# Load environment variables FIRST (the only load_dotenv call at startup)
 load_dotenv()
 
+# Structured, queue-backed logging before any module logs
+from utils.logging_config import setup_logging
+setup_logging()
+
 # Check for API key
 API_KEY = os.getenv("GEMINI_API_KEY")
 if not API_KEY:
     raise ValueError("GEMINI_API_KEY is not found in the .env file")
 
 # Import routers AFTER loading env
-from routes import health, quiz, analytics
+from routes import health, quiz, analytics, metrics
+from utils.compression import CompressionMiddleware
+from utils.snapshot import state_store
+from utils.tracing import TracingMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm restart: load the state snapshot + journal before serving,
+    # write a final snapshot after the routers' shutdown hooks have run
+    await run_in_threadpool(state_store.restore)
+    state_store.start()
+    yield
+    await run_in_threadpool(state_store.stop)
+
 
 # Create FastAPI app
 app = FastAPI(
     title="AI Generated QUIZ",
     version="1.0.0",
-    description="Generated Quiz from PDF or DOCX file using GEMINI AI"
+    description="Generated Quiz from PDF or DOCX file using GEMINI AI",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -30,10 +51,28 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# Response compression (gzip/brotli) above a size threshold,
+# plus compressed request bodies for question bank uploads
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+    decompress_paths=["/api/quiz/upload"],
+)
+
+# Per-request stage timing: Server-Timing header (durations only unless
+# SERVER_TIMING_DETAILS=true) + /metrics histograms
+app.add_middleware(
+    TracingMiddleware,
+    details=os.getenv("SERVER_TIMING_DETAILS", "false").lower() == "true",
+)
+
 # Include routers
 app.include_router(health.router, tags=["Health"])
 app.include_router(quiz.router, tags=["Quiz"])
 app.include_router(analytics.router, tags=["Analytics"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 @app.get("/")
 async def root():
@@ -43,9 +82,12 @@ async def root():
         "version": "1.0.0",
         "status": "online",
         "endpoints": {
-            "GET /health": "Check endpoint health",
+            "GET /health": "Cached health status (?deep=true for a live Gemini check)",
+            "GET /livez": "Liveness probe",
+            "GET /readyz": "Readiness probe with cached upstream status",
             "POST /quiz": "Generate Quiz from PDF/DOCX files",
             "GET /analytics/session/{session_id}": "Get quiz analytics",
+            "GET /metrics": "Prometheus metrics (latency histograms per stage)",
             "GET /docs": "API documentation (Swagger UI)",
             "GET /redoc": "API documentation (ReDoc)"
         }
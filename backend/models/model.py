@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 
 class QuizQuestion(BaseModel):
     """Schema for a single quiz question"""
@@ -7,6 +7,28 @@ class QuizQuestion(BaseModel):
     options: dict
     correct_answer: str
     explanation: str
+    topic: Optional[str] = None  # optional section/topic tag, indexed for topic-filtered quizzes
+
+
+class QuizOptions(BaseModel):
+    """The four answer options, A to D (typed form of QuizQuestion.options)"""
+    A: str
+    B: str
+    C: str
+    D: str
+
+
+class GeneratedQuestion(BaseModel):
+    """A multiple choice question; QuizQuestion with typed options, used as the Gemini response schema"""
+    question: str
+    options: QuizOptions
+    correct_answer: Literal["A", "B", "C", "D"]
+    explanation: str
+
+
+class GeneratedQuiz(BaseModel):
+    """A generated quiz - top-level response schema for structured-output generation"""
+    questions: list[GeneratedQuestion]
 
 
 class QuizResponse(BaseModel):
@@ -15,6 +37,27 @@ class QuizResponse(BaseModel):
     questions: list[QuizQuestion]
     total_questions: int
     message: Optional[str] = None
+    parse_repair: Optional[str] = None  # repair applied to the model output, see parse_JSON_quiz_with_repair
+    near_duplicates: Optional[int] = None  # generated questions dropped as rephrasings of known ones
+    files: Optional[list[dict]] = None  # per-file extraction report for multi-file uploads
+
+
+class AnswerItem(BaseModel):
+    """One answer to a cached question, referenced by its content-hash id"""
+    id: str
+    answer: Optional[str] = None  # chosen option letter; None = not answered
+    timeSpent: float = 0
+
+
+class AnswerSubmission(BaseModel):
+    """Combined submit: answers are graded server-side against the session's bank"""
+    sessionId: str
+    topic: str = "General"
+    cohort: Optional[str] = None  # class / group id for class-level rollups
+    answers: list[AnswerItem]
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+    total_time: Optional[float] = None
 
 
 class ErrorResponse(BaseModel):
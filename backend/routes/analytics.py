@@ -166,12 +166,15 @@
 #         raise
 #     except Exception as e:
 #         raise HTTPException(status_code=500, detail=str(e))
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import pandas as pd
-from datetime import datetime
-import numpy as np
+from datetime import datetime, timezone
+from utils.export import FORMATS, MEDIA_TYPES, analytics_rows, history_rows, resolve_format, stream_export
+from utils.quiz_manager import quiz_manager
+from utils.rollups import DAILY_RETENTION_DAYS, rollups
+from utils.snapshot import state_store
 
 # Change from Flask Blueprint to FastAPI Router
 router = APIRouter()  # ← Changed from analytics_bp = Blueprint(...)
@@ -179,6 +182,41 @@ router = APIRouter()  # ← Changed from analytics_bp = Blueprint(...)
 # Temporary in-memory storage for quiz results (session-based)
 quiz_sessions = {}
 
+
+def record_quiz(session_id: str, topic: str, questions: List[dict], cohort: Optional[str] = None,
+                timestamp: Optional[datetime] = None):
+    """
+    Append one graded quiz to the session's analytics. `questions` items use the
+    QuestionData field names; the list is stored as-is (no copy), so callers can
+    share it with other stores. The hourly/daily rollups are updated in the same call.
+    `timestamp` is only passed when replaying the state journal.
+    """
+    now = timestamp or datetime.now()
+    with quiz_manager.lock:  # in step with the state journal and snapshots
+        quiz_sessions.setdefault(session_id, []).append({
+            'timestamp': now.isoformat(),
+            'topic': topic,
+            'cohort': cohort,
+            'questions': questions
+        })
+        rollups.record(((q['isCorrect'], q['timeSpent'] or 0) for q in questions), topic, cohort, now.timestamp())
+        state_store.record("analytics", {'session_id': session_id, 'topic': topic, 'questions': questions,
+                                         'cohort': cohort, 'timestamp': now})
+
+
+def _clear_quiz_sessions(session_id: str):
+    with quiz_manager.lock:
+        quiz_sessions.pop(session_id, None)
+        state_store.record("analytics_clear", {'session_id': session_id})
+
+
+# Warm restarts: analytics are part of the state snapshot and journal (utils/snapshot.py);
+# a session's list is only appended to, so snapshots save just the new quizzes
+state_store.register_session_component('analytics', quiz_sessions.get, quiz_sessions.__setitem__, append_only=True)
+state_store.register_handler('analytics', lambda p: record_quiz(**p))
+state_store.register_handler('analytics_clear', lambda p: _clear_quiz_sessions(**p))
+
+
 # Pydantic models for request validation
 class QuestionData(BaseModel):
     question: str
@@ -191,6 +229,7 @@ class QuizSubmission(BaseModel):
     sessionId: str
     topic: str
     questions: List[QuestionData]
+    cohort: Optional[str] = None  # class / group id for class-level rollups
 
 # Change from @analytics_bp.route to @router.post
 @router.post('/api/analytics/submit-quiz')
@@ -199,19 +238,8 @@ async def submit_quiz_results(submission: QuizSubmission):
     Store quiz results and return analytics data
     """
     try:
-        session_id = submission.sessionId
-        
-        # Store in session
-        if session_id not in quiz_sessions:
-            quiz_sessions[session_id] = []
-        
-        quiz_result = {
-            'timestamp': datetime.now().isoformat(),
-            'topic': submission.topic,
-            'questions': [q.dict() for q in submission.questions]
-        }
-        
-        quiz_sessions[session_id].append(quiz_result)
+        record_quiz(submission.sessionId, submission.topic, [q.dict() for q in submission.questions],
+                    submission.cohort)
         
         return {
             'success': True,
@@ -253,6 +281,7 @@ async def get_session_analytics(session_id: str):
                     'timestamp': quiz['timestamp']
                 })
         
+        import pandas as pd  # deferred: only this endpoint needs pandas
         df = pd.DataFrame(all_questions)
         
         # Calculate analytics using pandas
@@ -349,6 +378,69 @@ def calculate_analytics(df, session_quizzes):
     }
 
 
+def _utc(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+# Class-level / time-window analytics from the rollup tables (no raw answer scan)
+@router.get('/api/analytics/rollup')
+async def get_rollup(days: float = Query(7, gt=0, le=DAILY_RETENTION_DAYS),
+                     start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     topic: Optional[str] = None, cohort: Optional[str] = None,
+                     group_by: str = 'topic', granularity: Optional[str] = None):
+    """
+    Accuracy and answer times over a time window, e.g. per topic over the last 7 days
+    for one cohort. The window is [start, end), default the last `days` days; it is
+    resolved to whole hours and clipped to the daily retention window. Times without
+    a UTC offset are read as UTC, like the bucket labels.
+    """
+    if group_by not in ('topic', 'cohort', 'topic_cohort', 'bucket'):
+        raise HTTPException(status_code=400, detail="group_by must be 'topic', 'cohort', 'topic_cohort' or 'bucket'")
+    if granularity not in (None, 'hour', 'day'):
+        raise HTTPException(status_code=400, detail="granularity must be 'hour' or 'day'")
+
+    end_ts = _utc(end).timestamp() if end else datetime.now(timezone.utc).timestamp()
+    start_ts = _utc(start).timestamp() if start else end_ts - days * 86400
+    if start_ts >= end_ts:
+        raise HTTPException(status_code=400, detail='start must be before end')
+
+    return {
+        'start': datetime.fromtimestamp(start_ts, timezone.utc).isoformat(),
+        'end': datetime.fromtimestamp(end_ts, timezone.utc).isoformat(),
+        'group_by': group_by,
+        'rows': rollups.query(start_ts, end_ts, topic, cohort, group_by, granularity)
+    }
+
+
+# Answer-level export for the data team: Parquet / Arrow IPC (with pyarrow) or CSV, streamed in batches
+@router.get('/api/analytics/export')
+async def export_answers(source: str = 'analytics', format: str = 'parquet', batch_rows: int = 50000):
+    """
+    Stream every answer from the analytics store (source=analytics) or the quiz
+    history Stack (source=history). Without pyarrow, Parquet/Arrow requests are served
+    as CSV; the X-Export-Format header says which format was written.
+    """
+    if source not in ('analytics', 'history'):
+        raise HTTPException(status_code=400, detail="source must be 'analytics' or 'history'")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    if batch_rows < 1:
+        raise HTTPException(status_code=400, detail='batch_rows must be positive')
+
+    fmt = resolve_format(format)
+    rows = analytics_rows(quiz_sessions) if source == 'analytics' else history_rows(quiz_manager.quiz_history.history)
+    extension = {'parquet': 'parquet', 'arrow': 'arrows', 'csv': 'csv'}[fmt]
+    # A sync generator: Starlette iterates it in the threadpool, so encoding never blocks the event loop
+    return StreamingResponse(
+        stream_export(rows, fmt, batch_rows),
+        media_type=MEDIA_TYPES[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename="{source}-answers.{extension}"',
+            'X-Export-Format': fmt,
+        }
+    )
+
+
 # Change from @analytics_bp.route to @router.delete
 @router.delete('/api/analytics/clear/{session_id}')
 async def clear_session(session_id: str):
@@ -356,8 +448,7 @@ async def clear_session(session_id: str):
     Clear session data
     """
     try:
-        if session_id in quiz_sessions:
-            del quiz_sessions[session_id]
+        _clear_quiz_sessions(session_id)
         
         return {
             'success': True,
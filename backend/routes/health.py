@@ -1,27 +1,107 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
-from google import genai
 
+import asyncio
 import os
-from dotenv import load_dotenv
+from services.context_cache import context_cache
+from services.gemini_client import get_client
+from services.health_monitor import UpstreamProber
+from services.model_router import model_router
+from services.quiz_generator import breaker
+from utils.snapshot import state_store
 
 router = APIRouter()
-load_dotenv()  # Load environment variables
 
-# Get API key
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env file")
+HEALTH_MODEL = "gemini-2.5-flash"
+PROBE_ENABLED = os.getenv("HEALTH_PROBE_ENABLED", "true").lower() == "true"
+READYZ_REQUIRE_UPSTREAM = os.getenv("READYZ_REQUIRE_UPSTREAM", "false").lower() == "true"
+DEEP_CHECK_TIMEOUT = float(os.getenv("HEALTH_DEEP_TIMEOUT", "15"))
 
-# Initialize Gemini client
-client = genai.Client(api_key=API_KEY)
 
+def check_gemini():
+    """Cheap upstream check - model metadata lookup, no generation quota used"""
+    get_client().models.get(model=HEALTH_MODEL)
+
+
+prober = UpstreamProber(
+    check=check_gemini,
+    interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "30")),
+    timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT", "10")),
+    failure_threshold=int(os.getenv("HEALTH_PROBE_FAILURE_THRESHOLD", "3")),
+)
+
+
+@router.on_event("startup")
+async def start_prober():
+    if PROBE_ENABLED:
+        prober.start()
+
+
+@router.on_event("shutdown")
+async def stop_prober():
+    await prober.stop()
+
+
+# ============================================================
+# Liveness - process is up, zero cost
+# ============================================================
+@router.get("/livez")
+async def livez():
+    return {"status": "alive"}
+
+
+# ============================================================
+# Readiness - cached upstream status from the background prober
+# ============================================================
+@router.get("/readyz")
+async def readyz():
+    upstream = prober.snapshot()
+    ready = not READYZ_REQUIRE_UPSTREAM or upstream["status"] != "down"
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "gemini_api": upstream,
+        "circuit_breaker": breaker.snapshot(),
+        "models": model_router.snapshot(),
+        "context_cache": context_cache.snapshot(),
+        "state": state_store.snapshot_stats(),
+    }
+    if not ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
+# ============================================================
+# Health - cached by default, live Gemini call only with ?deep=true
+# ============================================================
 @router.get("/health")
-async def health():
+async def health(deep: bool = False):
+    if not deep:
+        upstream = prober.snapshot()
+        if upstream["status"] == "down":
+            return JSONResponse(
+                status_code=503,
+                content={
+                    "status": "unhealthy",
+                    "gemini_api": "disconnected",
+                    "error": upstream["last_error"],
+                    "upstream": upstream
+                }
+            )
+        return {
+            "status": "healthy",
+            "gemini-ai": "connected" if upstream["status"] == "up" else upstream["status"],
+            "messages": "Cached status from background prober (use ?deep=true for a live check)",
+            "upstream": upstream
+        }
+
     try:
-        test_response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents="Say OK"
+        await asyncio.wait_for(
+            asyncio.to_thread(
+                get_client().models.generate_content,
+                model=HEALTH_MODEL,
+                contents="Say OK"
+            ),
+            timeout=DEEP_CHECK_TIMEOUT
         )
         return {
             "status" :"healthy",
@@ -35,7 +115,6 @@ async def health():
             content={
                 "status": "unhealthy",
                 "gemini_api": "disconnected",
-                "error": str(e)
+                "error": str(e) or type(e).__name__
             }
         )
-
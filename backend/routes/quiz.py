@@ -1,77 +1,256 @@
 from fastapi import APIRouter, UploadFile, HTTPException, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import asyncio
+import functools
+import json
+import math
 import os
-from models.model import QuizResponse
-from services.file_handler import extract_text_from_file
-from services.quiz_generator import generate_quiz_with_retry
-from utils.helpers import parse_JSON_quiz, validate_quiz
+import tempfile
+import threading
+import uuid
+from typing import Optional
+from models.model import AnswerSubmission, QuizResponse
+from routes.analytics import record_quiz
+from services.batch_generator import batch_generator
+from services.context_cache import compact_context
+from services.file_handler import extract_text_from_file, merge_documents
+from services.pool_refiller import pool_refiller
+from services.quiz_generator import generate_validated_quiz
+from utils.logging_config import bind_log_context
 from utils.quiz_manager import quiz_manager
+from utils.tracing import span
 
 router = APIRouter()
 
+
+@router.on_event("shutdown")
+async def stop_pool_refiller():
+    await run_in_threadpool(pool_refiller.stop)
+
+
 # ============================================================
 # Generate Quiz from PDF / DOCX / TXT
 # ============================================================
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", "10"))
+MAX_BATCH_DOCUMENTS = int(os.getenv("MAX_BATCH_DOCUMENTS", "50"))
+# Extractions running at once across all requests (pdfminer is CPU-bound). A thread
+# semaphore taken in the worker thread: unlike asyncio.Semaphore it isn't bound to
+# the first event loop that waits on it (benchmarks / TestClient start new loops)
+extraction_slots = threading.BoundedSemaphore(int(os.getenv("EXTRACT_CONCURRENCY", "4")))
+
+
+def _extract_in_slot(temp_path: str, filename: str) -> str:
+    with extraction_slots:
+        return extract_text_from_file(temp_path, filename)
+
+
+async def save_and_extract(file: UploadFile) -> str:
+    """
+    Save an upload under a unique temp name (concurrent uploads of the same
+    filename no longer overwrite each other) and extract its text off the event loop.
+    """
+    return await extract_upload(file.filename, await file.read())
+
+
+async def extract_upload(filename: str, content: bytes) -> str:
+    if not content:
+        raise HTTPException(400, "Empty file")
+
+    os.makedirs("temp", exist_ok=True)
+    suffix = os.path.splitext(os.path.basename(filename))[1]
+    fd, temp_path = tempfile.mkstemp(dir="temp", suffix=suffix)
+    try:
+        with span("save"), os.fdopen(fd, "wb") as f:
+            f.write(content)
+
+        with span("extract", format=suffix.lstrip(".")):
+            return await run_in_threadpool(_extract_in_slot, temp_path, filename)
+    finally:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+async def generate_from_content(lesson_content: str, num_of_questions: int, session_id: Optional[str],
+                                auto_refill: bool) -> dict:
+    if session_id:
+        bind_log_context(session_id=session_id)
+        if auto_refill:
+            # Keep the text so the session's pool can be topped up in the background
+            quiz_manager.set_source(session_id, lesson_content)
+
+    # Generate, parse and validate per question (blocking client + backoff sleeps run off the event loop).
+    # With a session, rephrasings of questions already in its bank are dropped and re-requested.
+    result = await run_in_threadpool(
+        generate_validated_quiz, lesson_content, num_of_questions,
+        known_questions=quiz_manager.near_duplicate_index(session_id) if session_id else None
+    )
+    if not result.get("success"):
+        if result.get("error") == "invalid_output":
+            raise HTTPException(500, f"Invalid quiz format: {result['message']}")
+        headers = None
+        if result.get("retry_after"):
+            headers = {"Retry-After": str(math.ceil(result["retry_after"]))}
+        raise HTTPException(503, result.get("message", "Failed to generate quiz"), headers=headers)
+
+    questions = result["questions"]
+    return {
+        "success": True,
+        "questions": questions,
+        "total_questions": len(questions),
+        "message": f"Successfully generated {len(questions)} questions",
+        "parse_repair": result["parse_repair"],
+        "near_duplicates": result["near_duplicates"]
+    }
+
+
 @router.post("/generate_quiz", response_model=QuizResponse)
 async def generate_quiz(
     file: UploadFile = File(...),
-    num_of_questions: int = Form(default=10, ge=1, le=40)
+    num_of_questions: int = Form(default=10, ge=1, le=40),
+    session_id: Optional[str] = Form(default=None),
+    auto_refill: bool = Form(default=False)
 ):
-    if not (
-        file.filename.endswith(".pdf") 
-        or file.filename.endswith(".docx") 
-        or file.filename.endswith(".txt")
-    ):
+    if not file.filename.endswith(SUPPORTED_EXTENSIONS):
         raise HTTPException(400, "Only PDF, DOCX, and TXT files are supported")
 
-    temp_path = None
-
     try:
-        os.makedirs("temp", exist_ok=True)
-        temp_path = f"temp/{file.filename}"
-
-        # Save uploaded file temporarily
-        with open(temp_path, "wb") as f:
-            content = await file.read()
-            if not content:
-                raise HTTPException(400, "Empty file")
-            f.write(content)
-
-        # Extract text
-        lesson_content = extract_text_from_file(temp_path, file.filename)
+        lesson_content = await save_and_extract(file)
         if not lesson_content or len(lesson_content.strip()) < 100:
             raise HTTPException(400, "Could not extract sufficient text from file")
 
-        # Generate quiz with AI
-        result = generate_quiz_with_retry(lesson_content, num_of_questions)
-        if not result.get("success"):
-            raise HTTPException(503, result.get("message", "Failed to generate quiz"))
-
+        return await generate_from_content(lesson_content, num_of_questions, session_id, auto_refill)
 
-        # Parse & validate JSON
-        quiz_data = parse_JSON_quiz(result["text"])
-        if not quiz_data:
-            raise HTTPException(500, "Failed to parse quiz JSON")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Internal error: {str(e)}")
 
-        is_valid, validation_msg = validate_quiz(quiz_data)
-        if not is_valid:
-            raise HTTPException(500, f"Invalid quiz format: {validation_msg}")
 
-        return {
-            "success": True,
-            "questions": quiz_data["questions"],
-            "total_questions": len(quiz_data["questions"]),
-            "message": f"Successfully generated {len(quiz_data['questions'])} questions"
-        }
+# ============================================================
+# Generate Quiz from several files (one generation over the combined material)
+# ============================================================
+@router.post("/generate_quiz_multi", response_model=QuizResponse)
+async def generate_quiz_multi(
+    files: list[UploadFile] = File(...),
+    num_of_questions: int = Form(default=10, ge=1, le=40),
+    session_id: Optional[str] = Form(default=None),
+    auto_refill: bool = Form(default=False)
+):
+    if len(files) > MAX_UPLOAD_FILES:
+        raise HTTPException(400, f"At most {MAX_UPLOAD_FILES} files per upload")
+
+    async def extract_one(file: UploadFile) -> dict:
+        report = {"filename": file.filename, "success": False}
+        if not file.filename.endswith(SUPPORTED_EXTENSIONS):
+            report["error"] = "Only PDF, DOCX, and TXT files are supported"
+            return report
+        try:
+            text = compact_context(await save_and_extract(file))
+        except HTTPException as e:
+            report["error"] = e.detail
+            return report
+        except Exception as e:
+            report["error"] = str(e)
+            return report
+        if len(text.strip()) < 100:
+            report["error"] = "Could not extract sufficient text from file"
+            return report
+        report.update(success=True, chars=len(text), text=text)
+        return report
 
+    try:
+        # Files are extracted concurrently (bounded by extraction_slots); failures are per file
+        reports = await asyncio.gather(*(extract_one(file) for file in files))
+        extracted = [r for r in reports if r["success"]]
+        if not extracted:
+            raise HTTPException(400, {"message": "Could not extract sufficient text from any file", "files": reports})
+
+        # The content budget is shared across files in proportion to their size
+        lesson_content = merge_documents([(r["filename"], r.pop("text")) for r in extracted])
+        response = await generate_from_content(lesson_content, num_of_questions, session_id, auto_refill)
+        response["files"] = reports
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Internal error: {str(e)}")
 
-    finally:
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except:
-                pass
+
+# ============================================================
+# Batch Generation (one session bank per document, NDJSON progress stream)
+# ============================================================
+@router.post("/api/quiz/batch")
+async def generate_batch(
+    files: list[UploadFile] = File(default=[]),
+    sources: Optional[str] = Form(default=None),
+    question_counts: Optional[str] = Form(default=None),
+    num_of_questions: int = Form(default=10, ge=1, le=40),
+    batch_id: Optional[str] = Form(default=None),
+    auto_refill: bool = Form(default=False)
+):
+    """
+    Documents are the uploaded files (each cached as session '<batch_id>-<n>') followed by
+    `sources`, a JSON list of session ids whose extracted text is already cached (their
+    banks are appended to). `question_counts` is an optional JSON list of per-document
+    counts in the same order. Streams one JSON event per line as documents complete.
+    """
+    try:
+        source_ids = json.loads(sources) if sources else []
+        counts = json.loads(question_counts) if question_counts else []
+    except json.JSONDecodeError:
+        raise HTTPException(400, "sources and question_counts must be JSON lists")
+    if not isinstance(source_ids, list) or not isinstance(counts, list):
+        raise HTTPException(400, "sources and question_counts must be JSON lists")
+
+    total = len(files) + len(source_ids)
+    if not total:
+        raise HTTPException(400, "At least one file or cached source is required")
+    if total > MAX_BATCH_DOCUMENTS:
+        raise HTTPException(400, f"At most {MAX_BATCH_DOCUMENTS} documents per batch")
+    if counts and (len(counts) != total or not all(isinstance(n, int) and 1 <= n <= 40 for n in counts)):
+        raise HTTPException(400, "question_counts needs one count (1-40) per document")
+
+    batch_id = batch_id or uuid.uuid4().hex[:12]
+    documents = []
+    for file in files:
+        if not file.filename.endswith(SUPPORTED_EXTENSIONS):
+            raise HTTPException(400, f"{file.filename}: only PDF, DOCX, and TXT files are supported")
+        # Read now: the upload is closed once the streaming response starts
+        content = await file.read()
+        documents.append({
+            "name": file.filename,
+            "session_id": f"{batch_id}-{len(documents) + 1}",
+            "load": functools.partial(extract_upload, file.filename, content),
+            "append": False,
+            "keep_source": auto_refill,
+        })
+    for source_id in source_ids:
+        text = quiz_manager.question_cache.get_source(source_id)
+
+        async def load_source(text=text):
+            return text
+
+        documents.append({
+            "name": source_id,
+            "session_id": source_id,
+            "load": load_source,
+            "append": True,
+            "keep_source": False,  # already kept
+        })
+    for index, document in enumerate(documents):
+        document["index"] = index
+        document["num_questions"] = counts[index] if counts else num_of_questions
+
+    async def stream():
+        async for event in batch_generator.run(batch_id, documents):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 # ============================================================
@@ -82,15 +261,25 @@ async def upload_questions(request: Request):
     try:
         data = await request.json()
         session_id = data.get("sessionId")
+        bind_log_context(session_id=session_id)
         questions = data.get("questions", [])
         metadata = data.get("metadata", {})
+        append = data.get("append", False)
+        drop_near_duplicates = data.get("dropNearDuplicates", False)
+        bank_id = data.get("bankId")
+
+        # Reuse a bank already in the library (no questions sent) - O(1)
+        if session_id and bank_id and not questions:
+            return quiz_manager.attach_bank(session_id, bank_id, metadata)
 
         if not session_id or not questions:
-            return {"success": False, "error": "Session ID + questions required"}
+            return {"success": False, "error": "Session ID + questions (or bankId) required"}
 
-        result = quiz_manager.upload_and_cache_questions(
-            session_id=session_id, questions=questions, metadata=metadata
-        )
+        with span("ingest", count=len(questions) if isinstance(questions, list) else 0):
+            result = quiz_manager.upload_and_cache_questions(
+                session_id=session_id, questions=questions, metadata=metadata, append=append,
+                drop_near_duplicates=drop_near_duplicates
+            )
 
         return result
     except Exception as e:
@@ -105,23 +294,61 @@ async def generate_quiz_from_cache(request: Request):
     try:
         data = await request.json()
         session_id = data.get("sessionId")
+        bind_log_context(session_id=session_id)
         num_questions = data.get("numQuestions", 10)
         allow_repeats = data.get("allowRepeats", False)
+        mode = data.get("mode", "random")
+        topics = data.get("topics") or []
+        if isinstance(topics, str):
+            topics = [topic.strip() for topic in topics.split(",") if topic.strip()]
 
         if not session_id:
             return {"success": False, "error": "Session ID is required"}
-
-        result = quiz_manager.generate_new_quiz(
-            session_id=session_id,
-            num_questions=num_questions,
-            allow_repeats=allow_repeats,
-        )
+        if mode not in ("random", "adaptive"):
+            return {"success": False, "error": "mode must be 'random' or 'adaptive'"}
+        if not isinstance(topics, list) or not all(isinstance(topic, str) for topic in topics):
+            return {"success": False, "error": "topics must be a list of strings"}
+
+        with span("select_cached"):
+            result = quiz_manager.generate_new_quiz(
+                session_id=session_id,
+                num_questions=num_questions,
+                allow_repeats=allow_repeats,
+                mode=mode,
+                topics=topics,
+            )
+
+        # Top up opted-in pools in the background; this quiz is served from cache either way
+        if result.get("success"):
+            result["refill_scheduled"] = pool_refiller.maybe_refill(
+                session_id, result["questions_remaining_in_pool"]
+            )
 
         return result
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
+# ============================================================
+# Spaced-Repetition Review (Min-Heap of due times)
+# ============================================================
+@router.post("/api/quiz/review")
+async def review_quiz(request: Request):
+    try:
+        data = await request.json()
+        session_id = data.get("sessionId")
+        bind_log_context(session_id=session_id)
+        num_questions = data.get("numQuestions", 10)
+
+        if not session_id:
+            return {"success": False, "error": "Session ID is required"}
+
+        with span("select_review"):
+            return quiz_manager.generate_review_quiz(session_id, num_questions)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
 # ============================================================
 # Submit Completed Quiz (Stack – History)
 # ============================================================
@@ -130,6 +357,7 @@ async def submit_quiz(request: Request):
     try:
         data = await request.json()
         session_id = data.get("sessionId")
+        bind_log_context(session_id=session_id)
 
         quiz_data = {
             "questions": data.get("questions", []),
@@ -139,6 +367,7 @@ async def submit_quiz(request: Request):
             "end_time": data.get("end_time"),
             "total_time": data.get("total_time"),
             "per_question_time": data.get("per_question_time", []),
+            "answers": data.get("answers"),
         }
 
         if not session_id:
@@ -150,6 +379,35 @@ async def submit_quiz(request: Request):
         return {"success": False, "error": str(e)}
 
 
+# ============================================================
+# Submit Answers - graded server-side, recorded once
+# (history Stack, analytics, mastery / review state)
+# ============================================================
+@router.post("/api/quiz/submit-answers")
+async def submit_answers(submission: AnswerSubmission):
+    try:
+        bind_log_context(session_id=submission.sessionId)
+        timing = {
+            key: getattr(submission, key)
+            for key in ("start_time", "end_time", "total_time")
+            if getattr(submission, key) is not None
+        }
+
+        with span("grade", count=len(submission.answers)):
+            result = quiz_manager.grade_and_submit(
+                submission.sessionId, [a.model_dump() for a in submission.answers], timing
+            )
+        if not result.get("success"):
+            return result
+
+        # Analytics keeps a reference to the same graded list as the history entry
+        record_quiz(submission.sessionId, submission.topic, result["results"], submission.cohort)
+        return result
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
 # ============================================================
 # Session Statistics
 # ============================================================
@@ -169,6 +427,7 @@ async def reset_session(request: Request):
     try:
         data = await request.json()
         session_id = data.get("sessionId")
+        bind_log_context(session_id=session_id)
         keep_cache = data.get("keepCache", True)
 
         if not session_id:
@@ -192,9 +451,29 @@ async def check_cache(session_id: str):
                 "has_cache": True,
                 "total_questions": len(quiz_manager.question_cache.get_questions(session_id)),
                 "metadata": quiz_manager.question_cache.get_metadata(session_id),
+                "bank_id": quiz_manager.question_cache.get_bank(session_id).bank_id,
             }
         
         return {"has_cache": False, "message": "No cached questions"}
 
     except Exception as e:
         raise HTTPException(500, str(e))
+
+
+# ============================================================
+# Topics (inverted index over the session's bank)
+# ============================================================
+@router.get("/api/quiz/topics/{session_id}")
+async def list_topics(session_id: str, limit: int = 50):
+    topics = quiz_manager.get_topics(session_id, limit)
+    if topics is None:
+        return {"success": False, "error": "No questions found in cache. Please upload a file first."}
+    return {"success": True, "topics": topics}
+
+
+# ============================================================
+# Bank Library (shared, content-addressed question banks)
+# ============================================================
+@router.get("/api/quiz/library")
+async def library_stats():
+    return quiz_manager.bank_library.snapshot()
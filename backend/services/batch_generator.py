@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, List
+
+from fastapi.concurrency import run_in_threadpool
+
+from services.quiz_generator import breaker, generate_validated_quiz
+from utils.quiz_manager import QuizManager, quiz_manager
+from utils.tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+batch_documents = metrics.counter("quiz_batch_documents_total", "Batch generation documents by outcome")
+
+
+class RequestPacer:
+    """
+    Spaces generation starts to at most `requests_per_minute`, shared by every
+    batch so concurrent batches together stay under the upstream rate limit.
+    Only used from the event loop thread, so reserving a slot needs no lock.
+
+    Time Complexity: O(1) per request
+    """
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class BatchGenerator:
+    """
+    Generates quizzes for many documents with bounded concurrency and streams one
+    event per document as it completes; each result is cached as the document's
+    session bank, ready for /api/quiz/generate.
+
+    Each document is a dict with:
+    - name, session_id, num_questions
+    - load: coroutine function returning the document text (extraction or cache lookup)
+    - append: add to the session's existing bank instead of replacing it
+    - keep_source: keep the text for background refills of the session
+
+    Time Complexity: O(d) events for d documents; wall time ~ d / concurrency
+    generations, or d / requests_per_minute minutes when the pacer is the bottleneck
+    """
+    def __init__(self, manager: QuizManager, pacer: RequestPacer, concurrency: int = 3):
+        self.manager = manager
+        self.pacer = pacer
+        self.concurrency = concurrency
+
+    async def _wait_for_upstream(self):
+        # Don't spend a document on a known outage: wait out an open circuit once
+        snapshot = breaker.snapshot()
+        if snapshot["state"] == "open":
+            await asyncio.sleep(snapshot["retry_after_seconds"])
+
+    async def _process(self, document: Dict, slots: asyncio.Semaphore) -> Dict:
+        event = {
+            "event": "document",
+            "index": document["index"],
+            "name": document["name"],
+            "session_id": document["session_id"],
+            "success": False,
+        }
+        started = time.monotonic()
+        async with slots:
+            try:
+                text = await document["load"]()
+                if not text or len(text.strip()) < 100:
+                    event["error"] = "Could not extract sufficient text from document"
+                    return event
+
+                await self._wait_for_upstream()
+                await self.pacer.wait()
+                session_id = document["session_id"]
+                result = await run_in_threadpool(
+                    generate_validated_quiz, text, document["num_questions"],
+                    known_questions=self.manager.near_duplicate_index(session_id) if document["append"] else None
+                )
+                if not result.get("success"):
+                    event["error"] = result.get("message", "Failed to generate quiz")
+                    if result.get("retry_after"):
+                        event["retry_after"] = result["retry_after"]
+                    return event
+
+                cached = self.manager.upload_and_cache_questions(
+                    session_id=session_id, questions=result["questions"],
+                    metadata={"filename": document["name"], "batch_id": document["batch_id"]},
+                    append=document["append"]
+                )
+                if not cached.get("success"):
+                    event["error"] = cached.get("error")
+                    return event
+                if document["keep_source"]:
+                    self.manager.set_source(session_id, text)
+
+                event.update(
+                    success=True,
+                    generated=len(result["questions"]),
+                    total_questions=cached["total_questions"],
+                    bank_id=cached["bank_id"],
+                    calls=result["calls"],
+                )
+                return event
+            except Exception as e:
+                detail = getattr(e, "detail", None)  # HTTPException from extraction: a bad document, not a bug
+                log = logger.warning if detail else logger.exception
+                log("Batch document failed: %s", detail or e, extra={"event": "quiz.batch_document_error",
+                                                                    "session_id": document["session_id"]})
+                event["error"] = detail or str(e)
+                return event
+            finally:
+                event["elapsed_seconds"] = round(time.monotonic() - started, 3)
+                batch_documents.inc(outcome="ok" if event["success"] else "failed")
+
+    async def run(self, batch_id: str, documents: List[Dict]) -> AsyncIterator[Dict]:
+        """Events: batch_started, one document event per document in completion order, batch_done"""
+        started = time.monotonic()
+        slots = asyncio.Semaphore(self.concurrency)
+        for document in documents:
+            document["batch_id"] = batch_id
+        tasks = [asyncio.ensure_future(self._process(document, slots)) for document in documents]
+        succeeded = 0
+        yield {"event": "batch_started", "batch_id": batch_id, "documents": len(documents)}
+        try:
+            for finished in asyncio.as_completed(tasks):
+                event = await finished
+                succeeded += event["success"]
+                yield event
+        finally:
+            # Client went away mid-stream: stop the documents not started yet
+            for task in tasks:
+                task.cancel()
+        logger.info("Batch finished", extra={"event": "quiz.batch_done", "batch_id": batch_id,
+                                             "documents": len(documents), "succeeded": succeeded})
+        yield {
+            "event": "batch_done",
+            "batch_id": batch_id,
+            "succeeded": succeeded,
+            "failed": len(documents) - succeeded,
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+        }
+
+
+batch_generator = BatchGenerator(
+    quiz_manager,
+    RequestPacer(float(os.getenv("BATCH_REQUESTS_PER_MINUTE", "10"))),
+    concurrency=int(os.getenv("BATCH_CONCURRENCY", "3")),
+)
@@ -0,0 +1,89 @@
+import math
+import threading
+import time
+from typing import Dict
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open, retry in {math.ceil(retry_after)}s")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared by every request that talks to the same upstream.
+
+    States:
+    - closed: calls flow normally, consecutive failures are counted
+    - open: calls fail fast until recovery_timeout has elapsed
+    - half_open: a limited number of probe calls are let through;
+                 one success closes the circuit, one failure re-opens it
+
+    Time Complexity: O(1) for every operation (guarded by a lock so worker
+    threads see a consistent state)
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    def _current_state(self) -> str:
+        # Caller holds the lock; open -> half_open once the timeout has passed
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def before_call(self):
+        """Reserve a call slot or raise CircuitOpenError to fail fast"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                raise CircuitOpenError(self.retry_after())
+            if state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.retry_after())
+                self._half_open_calls += 1
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit will allow a probe call"""
+        if self._state != self.OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            state = self._current_state()
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_after_seconds": round(self.retry_after(), 2),
+            }
@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from services.model_router import estimate_tokens
+from utils.tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+
+context_cache_events = metrics.counter("gemini_context_cache_total", "Upstream context cache lookups by outcome")
+
+SYSTEM_INSTRUCTION = "You write multiple choice quiz questions strictly from the lesson content provided."
+
+_PAGE_NUMBER = re.compile(r"^(page\s+)?\d+(\s*(/|of)\s*\d+)?$", re.IGNORECASE)
+
+
+def document_key(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8", "ignore")).hexdigest()
+
+
+def compact_context(content: str) -> str:
+    """
+    Shrink extracted document text without dropping lesson content: collapse runs
+    of whitespace, drop bare page numbers and lines repeated 3+ times (running
+    headers/footers from PDF extraction).
+
+    Time Complexity: O(n) for n characters
+    """
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in content.splitlines()]
+    counts: Dict[str, int] = {}
+    for line in lines:
+        if line:
+            counts[line] = counts.get(line, 0) + 1
+
+    kept, blank = [], False
+    for line in lines:
+        if not line:
+            blank = bool(kept)
+            continue
+        if _PAGE_NUMBER.match(line) or (counts[line] >= 3 and len(line) < 80):
+            continue
+        if blank:
+            kept.append("")
+            blank = False
+        kept.append(line)
+    return "\n".join(kept)
+
+
+class ContextCache:
+    """
+    Per-document context handles so repeat generations from the same document
+    don't re-send it.
+
+    - compacted(): compact_context() of a document, computed once per document (LRU)
+    - handle(): name of an upstream cached content holding the (compacted) document
+      for one model. Created on the document's min_uses-th generation, so one-off
+      documents never pay for cache storage; documents below the upstream minimum
+      size, or models where creation fails, fall back to sending the text inline.
+
+    Time Complexity: O(1) lookups after the O(n) hash of the document
+    """
+    def __init__(self, ttl_seconds: int = 3600, min_tokens: int = 1024, min_uses: int = 2,
+                 max_entries: int = 256, enabled: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.min_uses = min_uses
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._compacted: "OrderedDict[str, str]" = OrderedDict()  # document key -> compacted text
+        self._uses: "OrderedDict[str, int]" = OrderedDict()  # document key -> generations seen
+        self._handles: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()  # (key, model) -> (name, expires)
+        self._unsupported_until: Dict[str, float] = {}  # model -> retry creation after
+        self._lock = threading.Lock()
+
+    def _remember(self, table: OrderedDict, key, value):
+        # Caller holds the lock; LRU eviction
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    def compacted(self, content: str, count_use: bool = True) -> Tuple[str, str]:
+        """
+        (document key, compacted text) - the compaction runs once per document.
+        count_use=False for follow-up calls of the same generation (repair rounds),
+        so only separate generations count towards min_uses.
+        """
+        key = document_key(content)
+        uses = 1 if count_use else 0
+        with self._lock:
+            text = self._compacted.get(key)
+            if text is not None:
+                self._compacted.move_to_end(key)
+                self._remember(self._uses, key, self._uses.get(key, 0) + uses)
+                return key, text
+        text = compact_context(content)
+        with self._lock:
+            self._remember(self._compacted, key, text)
+            self._remember(self._uses, key, self._uses.get(key, 0) + uses)
+        return key, text
+
+    def handle(self, client, model: str, key: str, text: str) -> Optional[str]:
+        """Upstream cached-content name for (document, model), creating it when worthwhile; None = send inline"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._handles.get((key, model))
+            if entry and entry[1] > now:
+                self._handles.move_to_end((key, model))
+                context_cache_events.inc(outcome="hit")
+                return entry[0]
+            if self._uses.get(key, 0) < self.min_uses or self._unsupported_until.get(model, 0.0) > now:
+                return None
+        if estimate_tokens(text) < self.min_tokens:
+            return None
+
+        from google.genai import types  # deferred heavy import
+        try:
+            cached = client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=SYSTEM_INSTRUCTION,
+                    contents=[f"LESSON CONTENT:\n{text}"],
+                    ttl=f"{self.ttl_seconds}s",
+                ),
+            )
+        except Exception as e:
+            # Model without caching support, quota, etc. - stop trying for a while
+            logger.warning("Context cache creation failed for %s: %s", model, e,
+                           extra={"event": "gemini.context_cache_error"})
+            context_cache_events.inc(outcome="create_failed")
+            with self._lock:
+                self._unsupported_until[model] = now + self.ttl_seconds
+            return None
+
+        context_cache_events.inc(outcome="created")
+        with self._lock:
+            # Expire locally a minute early so a handle is never used right at the upstream TTL
+            self._remember(self._handles, (key, model), (cached.name, now + self.ttl_seconds - 60))
+        return cached.name
+
+    def invalidate(self, key: str, model: str):
+        """Forget a handle the upstream rejected (expired or deleted)"""
+        with self._lock:
+            self._handles.pop((key, model), None)
+        context_cache_events.inc(outcome="invalidated")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "documents": len(self._compacted),
+                "upstream_handles": len(self._handles),
+            }
+
+
+context_cache = ContextCache(
+    ttl_seconds=int(os.getenv("CONTEXT_CACHE_TTL", "3600")),
+    min_tokens=int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "1024")),
+    min_uses=int(os.getenv("CONTEXT_CACHE_MIN_USES", "2")),
+    enabled=CONTEXT_CACHE_ENABLED,
+)
@@ -1,14 +1,15 @@
-from pdfminer.high_level import extract_text
-from docx import Document
+# pdfminer and python-docx are imported on first use to keep startup fast
 
 def extract_text_pdf(path: str) -> str:
     """Extract text from PDF file"""
+    from pdfminer.high_level import extract_text
     try:
         return extract_text(path)
     except Exception as e:
         raise ValueError(f"Failed to extract PDF text: {str(e)}")
 
 def extract_text_docx(path: str) -> str:
+    from docx import Document
 
     try:
         doc = Document(path)
@@ -35,4 +36,43 @@ def truncate_text(text: str, max_chars: int = 15000) -> str:
     """Truncate text to avoid token limits"""
     if len(text) > max_chars:
         return text[:max_chars]
-    return text
\ No newline at end of file
+    return text
+
+def allocate_budget(sizes: list, max_chars: int) -> list:
+    """
+    Split max_chars across documents of the given sizes, proportionally to size
+    with max-min fairness: documents smaller than their share keep all their
+    text and the unused share goes to the larger ones.
+    Time Complexity: O(f log f) for f documents
+    """
+    budgets = [0] * len(sizes)
+    remaining = max_chars
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = remaining // len(pending)
+        index = pending[0]
+        if sizes[index] <= share:
+            budgets[index] = sizes[index]  # fits entirely
+            remaining -= sizes[index]
+            pending.pop(0)
+            continue
+        # Every remaining document exceeds an equal share: split proportionally to size
+        total = sum(sizes[i] for i in pending)
+        for i in pending:
+            budgets[i] = remaining * sizes[i] // total
+        break
+    return budgets
+
+
+def merge_documents(documents: list, max_chars: int = 15000) -> str:
+    """
+    Combine (filename, text) pairs into one lesson text within max_chars,
+    each under a heading so questions can cover every file.
+    """
+    headings = [f"=== {name} ===\n" for name, _ in documents]
+    budget = max(max_chars - sum(len(h) + 2 for h in headings), 0)
+    budgets = allocate_budget([len(text) for _, text in documents], budget)
+    return "\n\n".join(
+        heading + truncate_text(text, allowance)
+        for heading, (_, text), allowance in zip(headings, documents, budgets)
+    )
\ No newline at end of file
@@ -0,0 +1,42 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+# Single Gemini client shared by every module. Built on first use so that
+# importing the app stays cheap; the client owns a pooled httpx connection,
+# so sharing it also reuses TLS connections across requests.
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_api_key() -> str:
+    """Read GEMINI_API_KEY, loading .env only if the environment lacks it"""
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        load_dotenv()
+        api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in .env file")
+    return api_key
+
+
+def get_client():
+    """
+    Return the shared Gemini client, creating it lazily (thread-safe).
+    Time Complexity: O(1) after the first call
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # Deferred: google.genai takes a few hundred ms to import
+                from google import genai
+                _client = genai.Client(api_key=get_api_key())
+    return _client
+
+
+def set_client(client):
+    """Replace the shared client (e.g. with an offline fake backend)"""
+    global _client
+    with _client_lock:
+        _client = client
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+
+class UpstreamProber:
+    """
+    Background prober that keeps a cached view of Gemini availability.
+    Readiness checks read the cached status in O(1) instead of calling the
+    upstream on every load balancer probe.
+    """
+    def __init__(self, check: Callable[[], None], interval: float = 30.0, timeout: float = 10.0,
+                 failure_threshold: int = 3):
+        """
+        Args:
+            check: Blocking function that raises if the upstream is unreachable
+            interval: Seconds between background probes
+            timeout: Seconds before a single probe is treated as failed
+            failure_threshold: Consecutive failures before status becomes "down"
+        """
+        self.check = check
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+
+        self.status = "unknown"
+        self.last_checked: Optional[str] = None
+        self.last_latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def probe_once(self) -> Dict:
+        """Run one probe off the event loop and update the cached status"""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self.check), timeout=self.timeout)
+            self.consecutive_failures = 0
+            self.last_error = None
+            self.status = "up"
+        except Exception as e:
+            self.consecutive_failures += 1
+            self.last_error = str(e) or type(e).__name__
+            self.status = "down" if self.consecutive_failures >= self.failure_threshold else "degraded"
+        finally:
+            self.last_latency_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.last_checked = datetime.now().isoformat()
+        return self.snapshot()
+
+    async def _run(self):
+        while True:
+            await self.probe_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background loop (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        """Cached upstream status - O(1), never touches the network"""
+        return {
+            "status": self.status,
+            "last_checked": self.last_checked,
+            "last_latency_ms": self.last_latency_ms,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "probe_interval_seconds": self.interval,
+        }
@@ -0,0 +1,139 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Comma-separated "model[:max_prompt_tokens[:max_questions]]", fastest first.
+# A model is preferred for requests within its limits (empty = no limit); models
+# whose limits a request exceeds are only tried last, when every fitting one is
+# rate-limited or failing.
+DEFAULT_MODELS = "gemini-2.5-flash-lite:6000:10,gemini-2.5-flash"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size: ~4 characters per token"""
+    return math.ceil(len(text) / 4)
+
+
+def parse_models(spec: str) -> List[Dict]:
+    models = []
+    for entry in spec.split(","):
+        parts = [part.strip() for part in entry.split(":")]
+        if not parts[0]:
+            continue
+        limits = [int(part) if part else None for part in parts[1:3]] + [None, None]
+        models.append({"name": parts[0], "max_prompt_tokens": limits[0], "max_questions": limits[1]})
+    return models
+
+
+class ModelRouter:
+    """
+    Picks the Gemini model for a generation from recent per-model behaviour.
+
+    Each model keeps a sliding window of (time, latency, ok) samples. route()
+    returns the models that fit the request (prompt tokens, question count),
+    healthy ones first, ordered by observed p95 latency; models without enough
+    samples keep their configured position. The models that don't fit follow,
+    ranked the same way, as last-resort fallbacks. A rate-limited model sits out
+    a cooldown, so the next candidate takes its traffic; quota is per model, so
+    rate limits are tracked here and not in the shared circuit breaker.
+
+    Time Complexity:
+    - record: O(1) amortized (old samples expire from the front of the deque)
+    - route: O(m * w log w) for m models and w samples per window (both small)
+    """
+    def __init__(self, models: List[Dict], window_seconds: float = 300.0, max_samples: int = 200,
+                 min_samples: int = 5, max_error_rate: float = 0.5, rate_limit_cooldown: float = 30.0):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models = models
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self._samples: Dict[str, Deque[Tuple[float, float, bool]]] = {
+            model["name"]: deque(maxlen=max_samples) for model in models
+        }
+        self._cooldown_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _window(self, name: str, now: float) -> Deque[Tuple[float, float, bool]]:
+        # Caller holds the lock
+        samples = self._samples[name]
+        while samples and samples[0][0] < now - self.window_seconds:
+            samples.popleft()
+        return samples
+
+    def _stats(self, name: str, now: float) -> Dict:
+        samples = self._window(name, now)
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "p95_seconds": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else None,
+            "error_rate": round(errors / len(samples), 3) if samples else 0.0,
+            "cooling_down": self._cooldown_until.get(name, 0.0) > now,
+        }
+
+    def route(self, prompt_tokens: int, num_questions: int) -> List[str]:
+        """
+        Every model, best first: the ones that fit the request, then the ones that don't
+        (last resort). The caller falls through the list on rate limits.
+        """
+        now = time.monotonic()
+        fits, oversized = [], []
+        for index, model in enumerate(self.models):
+            fit = ((model["max_prompt_tokens"] is None or prompt_tokens <= model["max_prompt_tokens"])
+                   and (model["max_questions"] is None or num_questions <= model["max_questions"]))
+            (fits if fit else oversized).append((index, model))
+        if not fits:
+            oversized.reverse()  # nothing fits: the largest (last) models first
+
+        with self._lock:
+            def rank(item):
+                index, model = item
+                stats = self._stats(model["name"], now)
+                measured = stats["samples"] >= self.min_samples
+                unhealthy = measured and stats["error_rate"] > self.max_error_rate
+                latency = stats["p95_seconds"] if measured and stats["p95_seconds"] is not None else 0.0
+                return stats["cooling_down"], unhealthy, latency, index
+            ranked = sorted(fits, key=rank) + sorted(oversized, key=lambda item: rank(item)[:3])
+        return [model["name"] for _, model in ranked]
+
+    def record(self, name: str, latency: float, ok: bool, rate_limited: bool = False,
+               retry_after: Optional[float] = None):
+        now = time.monotonic()
+        with self._lock:
+            if name not in self._samples:
+                return
+            self._samples[name].append((now, latency, ok))
+            if rate_limited:
+                self._cooldown_until[name] = now + max(self.rate_limit_cooldown, retry_after or 0.0)
+
+    def is_cooling_down(self, name: str) -> bool:
+        with self._lock:
+            return self._cooldown_until.get(name, 0.0) > time.monotonic()
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model["name"]: {
+                    "max_prompt_tokens": model["max_prompt_tokens"],
+                    "max_questions": model["max_questions"],
+                    **self._stats(model["name"], now),
+                }
+                for model in self.models
+            }
+
+
+# Shared by every request so observed latency and rate limits are seen globally
+model_router = ModelRouter(
+    parse_models(os.getenv("GEMINI_MODELS", DEFAULT_MODELS)),
+    window_seconds=float(os.getenv("MODEL_ROUTER_WINDOW", "300")),
+    min_samples=int(os.getenv("MODEL_ROUTER_MIN_SAMPLES", "5")),
+    max_error_rate=float(os.getenv("MODEL_ROUTER_MAX_ERROR_RATE", "0.5")),
+    rate_limit_cooldown=float(os.getenv("MODEL_ROUTER_RATE_LIMIT_COOLDOWN", "30")),
+)
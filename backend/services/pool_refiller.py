@@ -0,0 +1,122 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+from services.quiz_generator import breaker, generate_validated_quiz
+from utils.quiz_manager import QuizManager, quiz_manager
+from utils.tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+refill_results = metrics.counter("quiz_pool_refills_total", "Background question pool refills by outcome")
+
+
+class PoolRefiller:
+    """
+    Keeps opted-in sessions' question pools warm.
+
+    When a quiz leaves fewer than `watermark` unused questions, the session is
+    queued; a single background worker generates `batch_size` more questions
+    from the session's cached document text, dropping near-duplicates of the
+    bank, and appends them. Serving a quiz never waits on generation.
+
+    Low priority: one worker, one refill at a time, at most one refill per
+    session per `cooldown` seconds, and nothing is sent unless the Gemini
+    circuit breaker is closed.
+
+    Time Complexity: O(1) to request a refill (Set membership + queue put)
+    """
+    def __init__(self, manager: QuizManager, watermark: int = 20, batch_size: int = 10, cooldown: float = 30.0):
+        self.manager = manager
+        self.watermark = watermark
+        self.batch_size = batch_size
+        self.cooldown = cooldown
+
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._pending = set()  # sessions queued or being refilled
+        self._last_refill: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def maybe_refill(self, session_id: str, remaining: int) -> bool:
+        """Queue a refill if the session opted in and its unused pool is below the watermark"""
+        if remaining >= self.watermark or not self.manager.question_cache.get_source(session_id):
+            return False
+        with self._lock:
+            if session_id in self._pending:
+                return False
+            if time.monotonic() - self._last_refill.get(session_id, float("-inf")) < self.cooldown:
+                return False
+            self._pending.add(session_id)
+        self._ensure_started()
+        self._queue.put(session_id)
+        return True
+
+    def refill(self, session_id: str) -> Dict:
+        """Generate and append one batch for the session (blocking; runs on the worker)"""
+        text = self.manager.question_cache.get_source(session_id)
+        if not text:
+            return {"success": False, "error": "no_source"}
+        if breaker.snapshot()["state"] != breaker.CLOSED:
+            return {"success": False, "error": "circuit_open"}  # leave half-open probes to user requests
+
+        result = generate_validated_quiz(
+            text, self.batch_size, known_questions=self.manager.near_duplicate_index(session_id)
+        )
+        if not result.get("success"):
+            return result
+
+        return self.manager.upload_and_cache_questions(
+            session_id, result["questions"], append=True, drop_near_duplicates=True
+        )
+
+    def _run(self):
+        while True:
+            session_id = self._queue.get()
+            if session_id is None:
+                return
+            started = time.perf_counter()
+            try:
+                result = self.refill(session_id)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            finally:
+                with self._lock:
+                    self._pending.discard(session_id)
+                    self._last_refill[session_id] = time.monotonic()
+
+            outcome = "ok" if result.get("success") else str(result.get("error", "failed"))
+            refill_results.inc(outcome="ok" if result.get("success") else "failed")
+            logger.info("Pool refill finished", extra={
+                "event": "quiz.pool_refill",
+                "session_id": session_id,
+                "outcome": outcome,
+                "added": result.get("accepted", 0),
+                "pool_size": result.get("total_questions"),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="pool-refiller", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker after the refill in progress (if any)"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+
+# Global instance
+pool_refiller = PoolRefiller(
+    quiz_manager,
+    watermark=int(os.getenv("POOL_REFILL_WATERMARK", "20")),
+    batch_size=int(os.getenv("POOL_REFILL_BATCH", "10")),
+    cooldown=float(os.getenv("POOL_REFILL_COOLDOWN", "30")),
+)
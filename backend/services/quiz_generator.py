@@ -1,29 +1,99 @@
-from google import genai
-
+import logging
+import math
 import os
+import random
 import time
+from typing import Optional
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.context_cache import context_cache
 from services.file_handler import truncate_text
+from services.gemini_client import get_client
+from services.model_router import estimate_tokens, model_router
+from utils.helpers import parse_JSON_quiz_with_repair, validate_question
+from utils.near_duplicate import NearDuplicateIndex
+from utils.tracing import metrics, span
 import re
-from dotenv import load_dotenv
 
-load_dotenv()  # Load environment variables
+# Retry / deadline tuning
+BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE", "1"))
+BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX", "20"))
+CALL_TIMEOUT_SECONDS = float(os.getenv("GEMINI_CALL_TIMEOUT", "60"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("GEMINI_REQUEST_DEADLINE", "120"))
+
+# "structured": JSON MIME type + response schema; "prompt": JSON format described in the prompt only
+GENERATION_MODE = os.getenv("QUIZ_GENERATION_MODE", "structured").lower()
+# Extra rounds that re-request only the questions that failed validation
+MAX_REPAIR_ROUNDS = int(os.getenv("QUIZ_MAX_REPAIR_ROUNDS", "2"))
+
+# One breaker shared by every request so an outage is detected once, not per request
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+    recovery_timeout=float(os.getenv("GEMINI_BREAKER_RECOVERY", "30")),
+)
+
+logger = logging.getLogger(__name__)
+
+generation_attempts = metrics.counter("gemini_generate_attempts_total", "Gemini generate_content attempts by outcome")
+generation_results = metrics.counter("quiz_generation_requests_total", "Quiz generations by mode and outcome")
+question_results = metrics.counter("quiz_generated_questions_total", "Generated questions by validation result")
+tokens_per_question = metrics.histogram(
+    "quiz_tokens_per_valid_question", "Gemini tokens spent per valid question",
+    buckets=(50, 100, 200, 400, 800, 1600, 3200, 6400)
+)
+
+TRANSIENT_CODES = {408, 429, 500, 502, 503, 504}
+TRANSIENT_MARKERS = ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "timed out", "Timeout")
+
+
+def is_rate_limit(error: Exception) -> bool:
+    error_msg = str(error)
+    return getattr(error, "code", None) == 429 or "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg
+
+
+def is_transient(error: Exception) -> bool:
+    """Errors worth retrying: rate limits, 5xx, timeouts and dropped connections"""
+    if getattr(error, "code", None) in TRANSIENT_CODES:
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__
+    if "Timeout" in name or "Connect" in name:
+        return True
+    error_msg = str(error)
+    return any(marker in error_msg for marker in TRANSIENT_MARKERS) or is_rate_limit(error)
+
 
-# Get API key
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env file")
+def backoff_delay(attempt: int, error: Exception) -> float:
+    """
+    Exponential backoff with full jitter. For rate limits the server's
+    suggested "retry in Ns" is used as a floor.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    if is_rate_limit(error):
+        retry_match = re.search(r'retry in (\d+\.?\d*)s', str(error))
+        if retry_match:
+            delay = max(delay, float(retry_match.group(1)))
+    return delay
 
-# Initialize Gemini client
-client = genai.Client(api_key=API_KEY)
 
+def build_prompt(content: Optional[str], num_of_questions: int, structured: bool, exclude_questions=None) -> str:
+    """
+    Prompt text; in structured mode the schema replaces the JSON format example.
+    content=None builds only the instructions, for a document held in an upstream context cache.
+    """
+    source = "the following lesson content" if content is not None else "the lesson content provided"
+    lesson = f"\n\nLESSON CONTENT:\n{content}" if content is not None else ""
+    avoid = ""
+    if exclude_questions:
+        listed = "\n".join(f"- {q}" for q in exclude_questions)
+        avoid = f"\n\nDo NOT repeat or rephrase any of these existing questions:\n{listed}"
 
-def generate_quiz_with_retry(  content:str, num_of_questions: int = 10, max_retries: int = 3) -> dict:
-    content = truncate_text(content, max_chars=15000)
+    if structured:
+        return f"""Based on {source}, generate exactly {num_of_questions} multiple choice questions.{lesson}
 
-    prompt=f"""Based on the following lesson content, generate exactly {num_of_questions} multiple choice questions.
+Each question must have 4 options (A, B, C, D), one correct_answer letter and an explanation of why it is correct.{avoid}"""
 
-LESSON CONTENT:
-{content}
+    return f"""Based on {source}, generate exactly {num_of_questions} multiple choice questions.{lesson}
 
 CRITICAL INSTRUCTIONS:
 1. Respond ONLY with valid JSON, no markdown code blocks, no additional text
@@ -47,45 +117,151 @@ REQUIRED JSON FORMAT:
       "explanation": "Why this answer is correct"
     }}
   ]
-}}
+}}{avoid}
     Generate Quiz now"""
 
+
+def generate_quiz_with_retry(  content:str, num_of_questions: int = 10, max_retries: int = 3,
+                              structured: bool = False, exclude_questions=None, new_generation: bool = True) -> dict:
+    with span("select"):
+        # Compacted once per document, so more lesson text fits in the same budget;
+        # re-request rounds of one generation don't count as repeat uses of the document
+        document, compacted = context_cache.compacted(content, count_use=new_generation)
+        content = truncate_text(compacted, max_chars=15000)
+
+    prompt = build_prompt(content, num_of_questions, structured, exclude_questions)
+    candidates = model_router.route(estimate_tokens(prompt), num_of_questions)
+    model = candidates[0]
+    use_context_cache = True
+
+    from google.genai import types  # deferred heavy import, cached after first call
+    from models.model import GeneratedQuiz
+
+    client = get_client()
+    deadline = time.monotonic() + REQUEST_DEADLINE_SECONDS
+    schema_config = {"response_mime_type": "application/json", "response_schema": GeneratedQuiz} if structured else {}
+
     for attempt in range(max_retries):
+        # Every path back to the top (retry, model fallback, inline resend) re-checks the deadline
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return {
+                "success": False,
+                "error": "deadline_exceeded",
+                "message": f"Quiz generation timed out after {REQUEST_DEADLINE_SECONDS:.0f} seconds. Please try again.",
+                "retry_after": 0
+            }
+
+        # Fail fast while the upstream is known to be down
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            return {
+                "success": False,
+                "error": "circuit_open",
+                "message": f"Quiz generation is temporarily unavailable. Please try again in {math.ceil(e.retry_after)} seconds.",
+                "retry_after": e.retry_after
+            }
+
+        # Repeat generations from a cached document send only the instructions
+        cache_name = context_cache.handle(client, model, document, content) if use_context_cache else None
+        cache_config = {"cached_content": cache_name} if cache_name else {}
+        contents = build_prompt(None, num_of_questions, structured, exclude_questions) if cache_name else prompt
+
+        call_timeout = min(CALL_TIMEOUT_SECONDS, deadline - time.monotonic())
+
+        started = time.monotonic()
         try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
-            )
+            with span("generate", attempt=attempt + 1, model=model, context_cached=bool(cache_name)) as attrs:
+                attrs["outcome"] = "error"
+                response = client.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=types.GenerateContentConfig(
+                        http_options=types.HttpOptions(timeout=max(1, int(call_timeout * 1000))),
+                        **schema_config,
+                        **cache_config
+                    )
+                )
+                attrs["outcome"] = "ok"
+            model_router.record(model, time.monotonic() - started, ok=True)
+            generation_attempts.inc(outcome="ok", model=model)
+            breaker.record_success()
 
+            usage = getattr(response, "usage_metadata", None)
             return {
                 "success": True,
                 "text": response.text if hasattr(response, 'text') else response.candidates[0].content.parts[0].text,
-                "attempt": attempt + 1
+                "attempt": attempt + 1,
+                "model": model,
+                "tokens": getattr(usage, "total_token_count", None) or 0,
+                "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0
             }
 
         except Exception as e:
             error_msg = str(e)
+            generation_attempts.inc(outcome="rate_limited" if is_rate_limit(e) else "error", model=model)
 
-            # Handle rate limits
-            if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-                retry_match = re.search(r'retry in (\\d+\\.?\\d*)s', error_msg)
-                wait_time = float(retry_match.group(1)) if retry_match else 30
+            # A rejected cache handle (expired, deleted): drop it and send the document inline
+            if cache_name and not is_transient(e) and attempt < max_retries - 1:
+                logger.warning("Cached context rejected, retrying inline: %s", error_msg,
+                               extra={"event": "gemini.context_cache_rejected", "attempt": attempt + 1})
+                context_cache.invalidate(document, model)
+                use_context_cache = False
+                breaker.record_success()  # upstream answered
+                continue
 
-                if attempt < max_retries - 1:
-                    time.sleep(wait_time + 1)
-                    continue
+            # Non-transient errors (bad request, auth) will not improve with retries
+            if not is_transient(e):
+                logger.error("Gemini request failed: %s", error_msg, extra={"event": "gemini.error"})
+                if str(getattr(e, "code", "")).startswith("4"):
+                    breaker.record_success()  # upstream answered; the request itself was rejected
                 else:
-                    return {
-                        "success": False,
-                        "error": "rate_limit",
-                        "message": f"Rate limit exceeded. Please try again in {wait_time:.0f} seconds."
-                    }
+                    breaker.record_failure()
+                return {
+                    "success": False,
+                    "error": "api_error",
+                    "message": f"API error: {error_msg}"
+                }
 
-            # Handle other errors
+            if is_rate_limit(e):
+                # Quota is per model: the router cools this model down; the upstream itself answered
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            wait_time = backoff_delay(attempt, e)
+            model_router.record(model, time.monotonic() - started, ok=False,
+                                rate_limited=is_rate_limit(e), retry_after=wait_time)
+
+            # Quota exhausted on this model: move to the next candidate right away instead of waiting
+            fallback = next((name for name in candidates
+                             if name != model and not model_router.is_cooling_down(name)), None)
+            if is_rate_limit(e) and fallback and attempt < max_retries - 1:
+                logger.warning("Model %s rate-limited, falling back to %s", model, fallback,
+                               extra={"event": "gemini.model_fallback", "attempt": attempt + 1})
+                model = fallback
+                continue
+
+            out_of_time = time.monotonic() + wait_time >= deadline
+
+            if attempt < max_retries - 1 and not out_of_time:
+                logger.warning("Transient Gemini error, retrying in %.2fs: %s", wait_time, error_msg,
+                               extra={"event": "gemini.retry", "attempt": attempt + 1})
+                time.sleep(wait_time)
+                continue
+
+            if is_rate_limit(e):
+                return {
+                    "success": False,
+                    "error": "rate_limit",
+                    "message": f"Rate limit exceeded. Please try again in {wait_time:.0f} seconds.",
+                    "retry_after": wait_time
+                }
             return {
                 "success": False,
                 "error": "api_error",
-                "message": f"API error: {error_msg}"
+                "message": f"API error after {attempt + 1} attempts: {error_msg}",
+                "retry_after": wait_time
             }
 
     return {
@@ -95,6 +271,99 @@ REQUIRED JSON FORMAT:
     }
 
 
+def generate_validated_quiz(content: str, num_of_questions: int = 10, structured: bool = None,
+                            known_questions: NearDuplicateIndex = None) -> dict:
+    """
+    Generate a quiz and validate every question in one pass. Questions that
+    fail validation, or are near-duplicates of each other or of
+    `known_questions` (e.g. the session's bank), are dropped and only that
+    many are re-requested (up to MAX_REPAIR_ROUNDS extra calls), instead of
+    regenerating the whole quiz.
+
+    Returns:
+        Dictionary with success, questions, parse_repair, calls, models, tokens,
+        near_duplicates and tokens_per_valid_question; on upstream failure the
+        error dict from generate_quiz_with_retry is returned unchanged.
+    """
+    if structured is None:
+        structured = GENERATION_MODE == "structured"
+    mode = "structured" if structured else "prompt"
 
+    valid, repairs, models = [], [], []
+    total_tokens, calls, invalid_count, near_duplicates = 0, 0, 0, 0
+    missing = num_of_questions
+    accepted = NearDuplicateIndex()  # questions kept by this request
 
+    for round_number in range(MAX_REPAIR_ROUNDS + 1):
+        result = generate_quiz_with_retry(
+            content, missing, structured=structured,
+            exclude_questions=[q["question"] for q in valid] if valid else None,
+            new_generation=round_number == 0
+        )
+        if not result.get("success"):
+            if valid:
+                break  # keep what the earlier rounds produced
+            generation_results.inc(mode=mode, outcome="failed")
+            return result
 
+        calls += 1
+        total_tokens += result.get("tokens", 0)
+        if result.get("model") and result["model"] not in models:
+            models.append(result["model"])
+
+        with span("parse"):
+            quiz_data, repair = parse_JSON_quiz_with_repair(result["text"])
+        repairs.append(repair)
+
+        with span("validate") as attrs:
+            candidates = quiz_data.get("questions", []) if isinstance(quiz_data, dict) else []
+            round_valid = [q for q in candidates if validate_question(q) is None]
+            attrs["invalid"] = len(candidates) - len(round_valid)
+
+        with span("dedupe") as attrs:
+            fresh = []
+            for question in round_valid:
+                signature = accepted.signature(question)
+                if accepted.find(signature) or (known_questions is not None and known_questions.find(signature)):
+                    continue
+                accepted.add(len(valid) + len(fresh), signature)
+                fresh.append(question)
+            attrs["dropped"] = len(round_valid) - len(fresh)
+
+        invalid_count += len(candidates) - len(round_valid)
+        near_duplicates += len(round_valid) - len(fresh)
+        question_results.inc(len(fresh), result="valid")
+        question_results.inc(len(candidates) - len(round_valid), result="invalid")
+        question_results.inc(len(round_valid) - len(fresh), result="near_duplicate")
+
+        valid.extend(fresh[:missing])
+        missing = num_of_questions - len(valid)
+        if missing <= 0:
+            break
+        logger.info("Re-requesting %d invalid or missing questions", missing,
+                    extra={"event": "quiz.repair_round", "round": round_number + 1, "mode": mode})
+
+    if not valid:
+        generation_results.inc(mode=mode, outcome="failed")
+        return {
+            "success": False,
+            "error": "invalid_output",
+            "message": "Model output did not contain any valid questions"
+        }
+
+    if total_tokens:
+        tokens_per_question.observe(total_tokens / len(valid))
+    generation_results.inc(mode=mode, outcome="complete" if missing <= 0 else "partial")
+
+    return {
+        "success": True,
+        "questions": valid,
+        "parse_repair": repairs[0] if len(set(repairs)) == 1 else ",".join(repairs),
+        "mode": mode,
+        "calls": calls,
+        "models": models,
+        "invalid_questions": invalid_count,
+        "near_duplicates": near_duplicates,
+        "tokens": total_tokens,
+        "tokens_per_valid_question": round(total_tokens / len(valid), 1) if total_tokens else None
+    }
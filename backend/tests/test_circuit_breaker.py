@@ -0,0 +1,90 @@
+"""Circuit breaker states, error classification and jittered backoff."""
+import pytest
+
+from benchmarks.fake_backend import FakeAPIError
+from services import circuit_breaker, quiz_generator
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.quiz_generator import backoff_delay, is_rate_limit, is_transient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.record_success()  # a success resets the count
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after == pytest.approx(30)
+
+
+def test_half_open_allows_one_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_call()  # the probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.snapshot()["state"] == CircuitBreaker.HALF_OPEN
+
+
+def test_half_open_probe_result_decides(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.snapshot()["state"] == CircuitBreaker.OPEN
+
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.snapshot()["state"] == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+@pytest.mark.parametrize("error, transient, rate_limited", [
+    (FakeAPIError(429, "RESOURCE_EXHAUSTED", "Quota exceeded"), True, True),
+    (FakeAPIError(503, "UNAVAILABLE", "Overloaded"), True, False),
+    (TimeoutError("read timed out"), True, False),
+    (ConnectionError("reset"), True, False),
+    (FakeAPIError(400, "INVALID_ARGUMENT", "Bad request"), False, False),
+    (ValueError("bad key"), False, False),
+])
+def test_error_classification(error, transient, rate_limited):
+    assert is_transient(error) is transient
+    assert is_rate_limit(error) is rate_limited
+
+
+def test_backoff_is_jittered_and_capped(monkeypatch):
+    monkeypatch.setattr(quiz_generator, "BACKOFF_BASE_SECONDS", 1.0)
+    monkeypatch.setattr(quiz_generator, "BACKOFF_MAX_SECONDS", 5.0)
+    error = FakeAPIError(503, "UNAVAILABLE", "Overloaded")
+    delays = [backoff_delay(attempt, error) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= 5.0 for delay in delays)
+    assert len(set(delays)) > 100  # full jitter, not a fixed schedule
+    assert max(backoff_delay(0, error) for _ in range(50)) <= 1.0
+
+
+def test_backoff_honours_the_server_retry_hint():
+    error = FakeAPIError(429, "RESOURCE_EXHAUSTED", "Quota exceeded. Please retry in 7.5s.")
+    assert all(backoff_delay(0, error) >= 7.5 for _ in range(20))
@@ -0,0 +1,53 @@
+"""Request-body inflation must stop at max_size for every encoding."""
+import gzip
+import zlib
+
+import pytest
+
+from utils.compression import brotli, decompress_body
+
+MAX_SIZE = 1024 * 1024
+
+
+def test_gzip_and_deflate_round_trip():
+    body = b'{"questions": []}'
+    assert decompress_body(gzip.compress(body), "gzip", MAX_SIZE) == body
+    assert decompress_body(zlib.compress(body), "deflate", MAX_SIZE) == body
+
+
+def test_gzip_bomb_is_refused():
+    with pytest.raises(OverflowError):
+        decompress_body(gzip.compress(b"\0" * (MAX_SIZE + 1)), "gzip", MAX_SIZE)
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli not installed")
+def test_brotli_round_trip_and_truncation():
+    body = b'{"questions": []}' * 100
+    compressed = brotli.compress(body)
+    assert decompress_body(compressed, "br", MAX_SIZE) == body
+    with pytest.raises(ValueError):
+        decompress_body(compressed[:-2], "br", MAX_SIZE)
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli not installed")
+def test_brotli_bomb_stops_near_max_size(monkeypatch):
+    bomb = brotli.compress(b"\0" * (64 * MAX_SIZE), quality=11)
+    produced = []
+    real = brotli.Decompressor
+
+    class Counting:
+        def __init__(self):
+            self._inner = real()
+
+        def process(self, data):
+            out = self._inner.process(data)
+            produced.append(len(out))
+            return out
+
+        def is_finished(self):
+            return self._inner.is_finished()
+
+    monkeypatch.setattr(brotli, "Decompressor", Counting)
+    with pytest.raises(OverflowError):
+        decompress_body(bomb, "br", MAX_SIZE)
+    assert sum(produced) < 64 * MAX_SIZE  # stopped early, not after inflating everything
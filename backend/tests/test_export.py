@@ -0,0 +1,49 @@
+"""Answer export: schema coercion, batched CSV, and the CLI's fallback file name."""
+import csv
+import io
+
+import pytest
+
+from utils import export
+from utils.export import COLUMNS, analytics_rows, coerce_row, stream_export
+
+SESSIONS = {
+    "s1": [{"timestamp": "2026-01-01T10:00:00", "topic": "cells", "cohort": "class-1", "questions": [
+        {"id": "q1", "question": "Q1?", "userAnswer": "A", "correctAnswer": "A", "isCorrect": True, "timeSpent": 3.5},
+        # what older clients stored
+        {"id": 7, "question": "Q2?", "userAnswer": "B", "correctAnswer": "A", "isCorrect": "false", "timeSpent": "4"},
+        {"id": "q3", "question": "Q3?", "userAnswer": None, "correctAnswer": "C", "isCorrect": 1, "timeSpent": "n/a"},
+    ]}],
+}
+
+
+def test_rows_are_coerced_to_the_schema():
+    rows = [coerce_row(row) for row in analytics_rows(SESSIONS)]
+    assert [(row[6], row[10], row[11]) for row in rows] == [("q1", True, 3.5), ("7", False, 4.0), ("q3", True, None)]
+    assert coerce_row(("history", "s", "2", None, None, None, None, None, None, None, "maybe", [1]))[2:] == (
+        2, None, None, None, None, None, None, None, None, None)
+
+
+def test_csv_export_streams_every_batch():
+    chunks = list(stream_export(analytics_rows(SESSIONS), "csv", batch_rows=2))
+    assert len(chunks) == 2
+    table = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert tuple(table[0]) == COLUMNS and len(table) == 4
+    assert table[2][10:] == ["False", "4.0"]
+
+
+def test_empty_csv_export_has_the_header():
+    assert list(stream_export(iter(()), "csv")) == [(",".join(COLUMNS) + "\r\n").encode()]
+
+
+class Response(io.BytesIO):
+    def __init__(self, body, fmt):
+        super().__init__(body)
+        self.headers = {"X-Export-Format": fmt}
+
+
+@pytest.mark.parametrize("written, expected_name", [("parquet", "answers.parquet"), ("csv", "answers.csv")])
+def test_cli_names_the_file_after_the_format_written(tmp_path, monkeypatch, written, expected_name):
+    monkeypatch.setattr("urllib.request.urlopen", lambda url: Response(b"data", written))
+    export.main(["--format", "parquet", "--out", str(tmp_path / "answers.parquet")])
+    assert [path.name for path in tmp_path.iterdir()] == [expected_name]
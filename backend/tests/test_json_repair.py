@@ -0,0 +1,85 @@
+"""Parsing and repairing model output, and validating the generated questions."""
+import json
+import time
+
+import pytest
+
+from utils.helpers import parse_JSON_quiz_with_repair, validate_question, validate_quiz
+
+
+def question(i=0, **overrides):
+    return {
+        "question": f"Question {i}?",
+        "options": {"A": "one", "B": "two", "C": "three", "D": "four"},
+        "correct_answer": "A",
+        "explanation": "Because.",
+        **overrides,
+    }
+
+
+QUIZ = {"questions": [question(0), question(1)]}
+TEXT = json.dumps(QUIZ, indent=2)
+
+
+@pytest.mark.parametrize("text, repair", [
+    (TEXT, "direct"),
+    (f"Here is your quiz:\n```json\n{TEXT}\n```", "extracted"),
+    (TEXT.replace('"four"\n', '"four",\n').replace("Because.\"\n", "Because.\",\n"), "trailing_commas"),
+])
+def test_whole_quizzes_parse(text, repair):
+    data, how = parse_JSON_quiz_with_repair(text)
+    assert how == repair
+    assert data == QUIZ
+
+
+def test_truncated_output_keeps_complete_questions():
+    data, how = parse_JSON_quiz_with_repair(TEXT[: len(TEXT) * 3 // 4])
+    assert how == "truncated_salvage"
+    assert data["questions"] == [question(0)]
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "no json here",
+    '{"options": {"A": "x"}}',  # an object, but not a quiz
+    '[' * 100000,
+    '{"questions": ' + '[' * 100000,
+])
+def test_unusable_output_fails_cleanly(text):
+    assert parse_JSON_quiz_with_repair(text) == (None, "failed")
+
+
+def test_inner_objects_are_never_returned():
+    data, _ = parse_JSON_quiz_with_repair('Sure! {"note": "x"} and then ' + TEXT)
+    assert data == QUIZ
+
+
+def test_repair_is_linear_on_large_truncated_output():
+    big = json.dumps({"questions": [question(i) for i in range(300)]})
+    started = time.perf_counter()
+    data, how = parse_JSON_quiz_with_repair(big[:-500])
+    assert how == "truncated_salvage" and len(data["questions"]) > 290
+    assert time.perf_counter() - started < 1.0
+
+
+@pytest.mark.parametrize("bad, problem", [
+    ("not a dict", "is not an object"),
+    ({k: v for k, v in question().items() if k != "options"}, "missing 'options' field"),
+    (question(options={"A": "x", "B": "y", "C": "z"}), "missing required options (A, B, C, D)"),
+    (question(correct_answer="E"), "has invalid correct_answer"),
+])
+def test_structural_problems_are_described(bad, problem):
+    assert validate_question(bad) == problem
+
+
+def test_full_schema_is_enforced():
+    assert validate_question(question()) is None
+    assert validate_question({k: v for k, v in question().items() if k != "explanation"}).startswith(
+        "has invalid 'explanation'")
+    assert validate_question(question(question=["not", "text"])).startswith("has invalid 'question'")
+
+
+def test_validate_quiz_names_the_failing_question():
+    ok, message = validate_quiz({"questions": [question(0), question(1, correct_answer="Z")]})
+    assert not ok and message == "Question 2 has invalid correct_answer"
+    assert validate_quiz({"questions": []}) == (False, "No questions found")
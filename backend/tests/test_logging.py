@@ -0,0 +1,43 @@
+"""Queued log records are rendered on the caller's thread and keep their traceback."""
+import json
+import logging
+import queue
+
+from utils.logging_config import DeferredQueueHandler, JsonFormatter
+
+
+def log_through_queue(emit):
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("test.deferred")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    handler = DeferredQueueHandler(log_queue)
+    logger.addHandler(handler)
+    try:
+        emit(logger)
+    finally:
+        logger.removeHandler(handler)
+    return log_queue.get_nowait()
+
+
+def test_message_is_rendered_before_args_change():
+    answers = ["A"]
+    record = log_through_queue(lambda logger: logger.info("answers %s", answers, extra={"session_id": "s1"}))
+    answers.append("B")
+    assert record.args is None and record.getMessage() == "answers ['A']"
+    assert json.loads(JsonFormatter().format(record))["session_id"] == "s1"
+
+
+def test_traceback_is_kept_as_text_without_frames():
+    def fail(logger):
+        try:
+            raise ValueError("bad bank")
+        except ValueError:
+            logger.exception("upload failed")
+
+    record = log_through_queue(fail)
+    assert record.exc_info is None
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "upload failed"
+    assert entry["exc_info"].startswith("Traceback") and "ValueError: bad bank" in entry["exc_info"]
+    assert "ValueError: bad bank" in logging.Formatter("%(message)s").format(record)
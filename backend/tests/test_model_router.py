@@ -0,0 +1,73 @@
+"""Model routing, per-model rate-limit fallback and the request deadline."""
+import pytest
+
+from benchmarks.fake_backend import FakeAPIError, FakeGeminiClient
+from services import quiz_generator
+from services.circuit_breaker import CircuitBreaker
+from services.gemini_client import set_client
+from services.model_router import ModelRouter, parse_models
+
+SPEC = "lite:6000:10,full"
+
+
+def test_route_prefers_fitting_models_and_keeps_the_rest_as_fallback():
+    router = ModelRouter(parse_models(SPEC))
+    assert router.route(prompt_tokens=1000, num_questions=5) == ["lite", "full"]
+    assert router.route(prompt_tokens=1000, num_questions=20) == ["full", "lite"]
+    assert router.route(prompt_tokens=9000, num_questions=5) == ["full", "lite"]
+
+
+def test_route_puts_cooling_models_last():
+    router = ModelRouter(parse_models(SPEC))
+    router.record("lite", 0.1, ok=False, rate_limited=True)
+    assert router.route(prompt_tokens=1000, num_questions=5) == ["full", "lite"]
+
+
+def test_nothing_fits_tries_the_largest_model_first():
+    router = ModelRouter(parse_models("a:100:1,b:200:2"))
+    assert router.route(prompt_tokens=1000, num_questions=5) == ["b", "a"]
+
+
+class QuotaPerModel(FakeGeminiClient):
+    """Fake backend whose quota is exhausted for some models"""
+    def __init__(self, exhausted):
+        super().__init__()
+        self.exhausted = set(exhausted)
+        self.models_called = []
+
+    def generate(self, model, contents, config=None):
+        self.models_called.append(model)
+        if model in self.exhausted:
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED", "Quota exceeded. Please retry in 0.01s.")
+        return super().generate(model, contents, config)
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    router = ModelRouter(parse_models(SPEC))
+    breaker = CircuitBreaker(failure_threshold=1)
+    monkeypatch.setattr(quiz_generator, "model_router", router)
+    monkeypatch.setattr(quiz_generator, "breaker", breaker)
+    monkeypatch.setattr(quiz_generator.context_cache, "handle", lambda *args, **kwargs: None)
+    yield router, breaker
+    set_client(None)
+
+
+def test_rate_limit_falls_back_to_an_oversized_model(generator):
+    router, breaker = generator
+    client = QuotaPerModel(exhausted={"full"})
+    set_client(client)
+    result = quiz_generator.generate_quiz_with_retry("Cells divide by mitosis. " * 20, num_of_questions=20)
+    assert result["success"], result
+    assert client.models_called == ["full", "lite"]
+    assert breaker.snapshot()["state"] == CircuitBreaker.CLOSED  # 429s stay per model
+    assert router.is_cooling_down("full")
+
+
+def test_deadline_is_checked_before_every_attempt(generator, monkeypatch):
+    client = QuotaPerModel(exhausted={"lite", "full"})
+    set_client(client)
+    monkeypatch.setattr(quiz_generator, "REQUEST_DEADLINE_SECONDS", 0)
+    result = quiz_generator.generate_quiz_with_retry("Cells divide by mitosis. " * 20, num_of_questions=5)
+    assert result["error"] == "deadline_exceeded"
+    assert client.models_called == []
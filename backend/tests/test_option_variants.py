@@ -0,0 +1,79 @@
+"""Option permutations of repeat serves, and grading against the permutation served."""
+import pytest
+
+from utils.option_variants import (has_unmapped_letters, is_positional, option_variant, split_variant_id,
+                                   variant_count)
+from utils.quiz_manager import QuizManager
+
+
+def make_question(explanation="Mitochondria make most of the cell's ATP.", **options):
+    return {
+        "id": "q1",
+        "question": "Which organelle makes most ATP?",
+        "options": options or {"A": "Nucleus", "B": "Mitochondria", "C": "Ribosome", "D": "Golgi body"},
+        "correct_answer": "B",
+        "explanation": explanation,
+    }
+
+
+def test_variants_move_the_correct_answer_to_every_position():
+    question = make_question()
+    variants = [option_variant(question, v) for v in range(variant_count(question))]
+    assert variants[0] is question
+    assert sorted(v["correct_answer"] for v in variants) == ["A", "B", "C", "D"]
+    for v in variants:
+        assert v["options"][v["correct_answer"]] == "Mitochondria"
+        assert split_variant_id(v["id"])[0] == "q1"
+
+
+@pytest.mark.parametrize("explanation", [
+    "B is correct: mitochondria make ATP.",
+    "The answer is B.",
+    "Answer: B",
+    "Option B, mitochondria.",
+    "(B) mitochondria make ATP.",
+])
+def test_explanation_letter_references_follow_the_permutation(explanation):
+    question = make_question(explanation)
+    assert variant_count(question) == 4
+    variant = option_variant(question, 1)
+    assert "B" not in variant["explanation"].replace("ATP", "")
+    assert variant["correct_answer"] in variant["explanation"]
+
+
+@pytest.mark.parametrize("explanation", [
+    "B and D are both organelles, but only B makes ATP.",
+    "Unlike C, it makes ATP.",
+])
+def test_unmappable_letter_references_keep_the_original_order(explanation):
+    question = make_question(explanation)
+    assert has_unmapped_letters(question)
+    assert variant_count(question) == 1
+    assert option_variant(question, 3) is question
+
+
+def test_articles_and_compound_words_are_not_references():
+    assert not has_unmapped_letters(make_question("A cell makes ATP in B-cells and T-cells alike."))
+
+
+def test_positional_options_are_never_permuted():
+    question = make_question(A="Nucleus", B="Mitochondria", C="Ribosome", D="All of the above")
+    assert is_positional(question)
+    assert variant_count(question) == 1
+
+
+def test_repeat_serves_are_graded_against_the_permutation_shown():
+    manager = QuizManager(option_variants=True)
+    manager.upload_and_cache_questions("s", [make_question("The answer is B.")])
+    first = manager.generate_new_quiz("s", 1, allow_repeats=True)["questions"][0]
+    second = manager.generate_new_quiz("s", 1, allow_repeats=True)["questions"][0]
+    assert first["id"] != second["id"]
+    assert second["options"][second["correct_answer"]] == "Mitochondria"
+
+    graded = manager.grade_and_submit("s", [
+        {"id": second["id"], "answer": second["correct_answer"], "timeSpent": 3},
+    ])
+    assert graded["score"] == 1
+    wrong = next(letter for letter in second["options"] if letter != second["correct_answer"])
+    graded = manager.grade_and_submit("s", [{"id": second["id"], "answer": wrong}])
+    assert graded["score"] == 0
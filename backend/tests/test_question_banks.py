@@ -0,0 +1,139 @@
+"""Upload dedupe, shared content-addressed banks with copy-on-write appends, used bitmap and topic index."""
+from utils.bank_library import UsedBitmap
+from utils.question_bank import ingest_questions
+from utils.quiz_manager import QuizManager
+from utils.topic_index import TopicIndex, bitmap_positions
+
+
+def raw(i, topic="biology", **overrides):
+    return {
+        "question": f"Question {i}: what does organelle number {i * 7} do?",
+        "options": {"A": f"answer {i}", "B": "other", "C": "another", "D": "none"},
+        "correct_answer": "A",
+        "explanation": "By definition.",
+        "topic": topic,
+        **overrides,
+    }
+
+
+# ---- ingest: validation, normalization, dedupe -----------------------------
+
+def test_ingest_normalizes_and_dedupes_by_content():
+    messy = raw(1, question="  Question 1: what does organelle number 7 do? ", correct_answer="a")
+    accepted, errors, duplicates = ingest_questions([raw(1), messy, raw(2)])
+    assert errors == []
+    assert [d["index"] for d in duplicates] == [1]
+    assert len(accepted) == 2 and accepted[0]["correct_answer"] == "A"
+
+
+def test_ingest_reports_invalid_items_and_keeps_the_rest():
+    accepted, errors, _ = ingest_questions([raw(1), {"question": "no options"}, raw(2, correct_answer="Z")])
+    assert len(accepted) == 1
+    assert [e["index"] for e in errors] == [1, 2]
+
+
+def test_ingest_treats_existing_ids_as_duplicates():
+    first, _, _ = ingest_questions([raw(1)])
+    accepted, _, duplicates = ingest_questions([raw(1), raw(2)], existing_ids={first[0]["id"]})
+    assert len(accepted) == 1 and duplicates[0]["id"] == first[0]["id"]
+
+
+# ---- shared banks and copy-on-write --------------------------------------
+
+def test_identical_uploads_share_one_bank():
+    manager = QuizManager()
+    a = manager.upload_and_cache_questions("a", [raw(i) for i in range(5)])
+    b = manager.upload_and_cache_questions("b", [raw(i) for i in range(5)])
+    assert a["bank_id"] == b["bank_id"]
+    assert len(manager.bank_library.banks) == 1
+    assert manager.bank_library.get(a["bank_id"]).refcount == 2
+
+
+def test_append_to_a_shared_bank_copies_it():
+    manager = QuizManager()
+    shared_id = manager.upload_and_cache_questions("a", [raw(i) for i in range(5)])["bank_id"]
+    manager.upload_and_cache_questions("b", [raw(i) for i in range(5)])
+    appended = manager.upload_and_cache_questions("a", [raw(5), raw(0)], append=True)
+
+    assert appended["accepted"] == 1 and appended["duplicates"] == 1
+    shared = manager.bank_library.get(shared_id)
+    assert len(shared) == 5 and shared.refcount == 1  # session b still sees the original
+    mine = manager.question_cache.get_bank("a")
+    assert mine is not shared and len(mine) == 6
+    assert mine.questions[0] is shared.questions[0]  # question dicts are shared, not copied
+
+
+def test_append_by_the_sole_owner_extends_in_place():
+    manager = QuizManager()
+    first_id = manager.upload_and_cache_questions("a", [raw(i) for i in range(5)])["bank_id"]
+    bank = manager.question_cache.get_bank("a")
+    manager.upload_and_cache_questions("a", [raw(5)], append=True)
+    assert manager.question_cache.get_bank("a") is bank
+    assert bank.bank_id != first_id and list(manager.bank_library.banks) == [bank.bank_id]
+
+
+def test_banks_are_freed_with_their_last_session():
+    manager = QuizManager()
+    manager.upload_and_cache_questions("a", [raw(i) for i in range(5)])
+    manager.upload_and_cache_questions("a", [raw(i) for i in range(10, 15)])
+    assert len(manager.bank_library.banks) == 1
+    manager.reset_session("a", keep_cache=False)
+    assert manager.bank_library.banks == {}
+
+
+def test_used_questions_survive_an_append():
+    manager = QuizManager()
+    manager.upload_and_cache_questions("a", [raw(i) for i in range(6)])
+    served = {q["id"] for q in manager.generate_new_quiz("a", 4)["questions"]}
+    manager.upload_and_cache_questions("a", [raw(i) for i in range(6, 10)], append=True)
+    later = {q["id"] for q in manager.generate_new_quiz("a", 6)["questions"]}
+    assert not served & later
+
+
+# ---- used bitmap ------------------------------------------------------------
+
+def test_used_bitmap_tracks_membership_and_count():
+    used = UsedBitmap()
+    used.update([0, 9, 9, 1000])
+    assert len(used) == 3
+    assert 9 in used and 1000 in used and 8 not in used and 5000 not in used
+    assert bitmap_positions(used.as_int()) == [0, 9, 1000]
+    used.clear()
+    assert len(used) == 0 and 9 not in used
+
+
+def test_used_bitmap_changes_replay_to_the_same_flags():
+    used, replica = UsedBitmap(), UsedBitmap()
+    used.update([1, 2])
+    replica.apply_changes(*used.take_changes())
+    used.clear()
+    used.update([3, 3, 70])
+    replica.apply_changes(*used.take_changes())
+    assert used.bits == replica.bits and len(replica) == 2
+    assert used.take_changes() == (False, [])
+
+
+# ---- topic index ------------------------------------------------------------
+
+def test_topic_index_matches_any_topic_and_all_words_of_one():
+    index = TopicIndex()
+    index.add(0, {"question": "How do plant cells divide?", "topic": "mitosis"})
+    index.add(1, {"question": "What drives animal cell division?", "topic": "mitosis"})
+    index.add(2, {"question": "Who won the battle of Hastings?", "topic": "history"})
+    index.add(3, {"question": "What do plant roots absorb?"})
+
+    assert bitmap_positions(index.match(["mitosis"])) == [0, 1]
+    assert bitmap_positions(index.match(["plant cells"])) == [0]  # both words
+    assert bitmap_positions(index.match(["history", "roots"])) == [2, 3]  # either topic
+    assert index.match(["the of"]) is None  # nothing indexable
+    assert index.match(["volcano"]) == 0
+
+
+def test_topic_index_copy_is_independent():
+    index = TopicIndex()
+    index.add(0, {"question": "How do plant cells divide?"})
+    index.match(["plant"])  # cache the bitmap
+    clone = index.copy()
+    clone.add(1, {"question": "Do plant roots grow?"})
+    assert bitmap_positions(index.match(["plant"])) == [0]
+    assert bitmap_positions(clone.match(["plant"])) == [0, 1]
@@ -0,0 +1,78 @@
+"""Hourly/daily analytics rollups: recording, range planning and merged queries."""
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.rollups import DAY, HOUR, RollupStore, TimingSketch
+
+NOW = 1_760_000_000 // DAY * DAY + 15 * HOUR  # 15:00 UTC on some day
+
+
+@pytest.fixture
+def store():
+    return RollupStore(hourly_retention_days=14, daily_retention_days=400)
+
+
+def test_query_merges_buckets_and_groups(store):
+    store.record([(True, 4), (False, 8)], "cells", "class-1", NOW - 2 * DAY)
+    store.record([(True, 2)], "cells", "class-2", NOW - HOUR)
+    store.record([(True, 1)], "history", "class-1", NOW - HOUR)
+
+    by_topic = {row["topic"]: row for row in store.query(NOW - 7 * DAY, NOW)}
+    assert by_topic["cells"]["answered"] == 3 and by_topic["cells"]["correct"] == 2
+    assert by_topic["cells"]["accuracy"] == pytest.approx(66.67)
+    assert by_topic["history"]["avg_time"] == 1
+
+    by_cohort = store.query(NOW - 7 * DAY, NOW, topic="cells", group_by="cohort")
+    assert [(row["cohort"], row["answered"]) for row in by_cohort] == [("class-1", 2), ("class-2", 1)]
+
+    recent = store.query(NOW - 3 * HOUR, NOW, group_by="topic_cohort")
+    assert [(row["topic"], row["cohort"]) for row in recent] == [("cells", "class-2"), ("history", "class-1")]
+
+
+def test_bucket_series_is_labelled_in_utc(store):
+    store.record([(True, 1)], "cells", None, NOW - DAY)
+    rows = store.query(NOW - 3 * DAY, NOW, group_by="bucket")
+    day = datetime.fromtimestamp(NOW - DAY, timezone.utc).date().isoformat()
+    assert rows[0]["bucket_start"].startswith(day) and rows[0]["bucket_start"].endswith("+00:00")
+
+
+def test_plan_uses_whole_days_with_hourly_edges(store):
+    plan = store.plan(NOW - 3 * DAY, NOW, now=NOW)
+    days = [bucket for granularity, bucket in plan if granularity == "day"]
+    hours = [bucket for granularity, bucket in plan if granularity == "hour"]
+    assert len(days) == 2 and len(hours) == 24  # 9 hours of the first day + 15 of today
+    covered = sum(DAY if granularity == "day" else HOUR for granularity, _ in plan)
+    assert covered == 3 * DAY
+
+
+def test_plan_falls_back_to_days_once_hours_expired(store):
+    plan = store.plan(NOW - 30 * DAY - 5 * HOUR, NOW - 20 * DAY, now=NOW)
+    assert {granularity for granularity, _ in plan} == {"day"}
+
+
+def test_plan_is_clipped_to_retention(store):
+    plan = store.plan(0, 10 ** 12, granularity="hour", now=NOW)
+    assert len(plan) <= 402 * 24
+    assert plan[0][1] >= NOW - 402 * DAY
+
+
+def test_old_buckets_are_pruned_and_reported_dirty(store):
+    store.record([(True, 1)], "cells", None, NOW - 20 * DAY)
+    store.take_dirty()
+    store.record([(True, 1)], "cells", None, NOW)
+    dirty = store.take_dirty()
+    old_hour = (NOW - 20 * DAY) // HOUR * HOUR
+    assert ("hour", old_hour) in dirty and old_hour not in store.tables["hour"]
+    assert ("hour", NOW) in dirty and ("day", NOW // DAY * DAY) in dirty
+    assert store.take_dirty() == set()
+
+
+def test_timing_sketch_quantiles_within_relative_error():
+    sketch, other = TimingSketch(), TimingSketch()
+    for seconds in range(1, 501):
+        (sketch if seconds % 2 else other).add(float(seconds))
+    sketch.merge(other)
+    assert sketch.quantile(0.5) == pytest.approx(250, rel=0.06)
+    assert sketch.quantile(0.9) == pytest.approx(450, rel=0.06)
+    assert TimingSketch().quantile(0.5) is None
@@ -0,0 +1,84 @@
+"""Quiz selection: used-question bitmap, near-duplicate clusters, adaptive and topic modes."""
+import logging
+
+import pytest
+
+from utils.quiz_manager import QuizManager
+
+ATP = {"A": "Nucleus", "B": "Mitochondria", "C": "Ribosome", "D": "Golgi body"}
+
+
+def bank(unrelated=10):
+    # Questions 0 and 1 are rephrasings of each other (one near-duplicate cluster)
+    return [
+        {"question": "What organelle produces most of the ATP in a eukaryotic cell?", "options": ATP,
+         "correct_answer": "B", "explanation": "Mitochondria make ATP.", "topic": "cells"},
+        {"question": "Which organelle produces most of the ATP in eukaryotic cells?", "options": ATP,
+         "correct_answer": "B", "explanation": "Mitochondria make ATP.", "topic": "cells"},
+    ] + [
+        {"question": f"Unrelated question number {i} about subject {i * 13}?",
+         "options": {"A": f"answer {i}", "B": "other", "C": "another", "D": "none"},
+         "correct_answer": "A", "explanation": "By definition.", "topic": "history" if i % 2 else "cells"}
+        for i in range(unrelated)
+    ]
+
+
+@pytest.fixture
+def manager():
+    manager = QuizManager(option_variants=True)
+    result = manager.upload_and_cache_questions("s", bank())
+    assert result["success"] and result["near_duplicates"] == 1
+    return manager
+
+
+def served_positions(manager, questions):
+    positions = manager.question_cache.get_bank("s").positions
+    return {positions[q["id"].split("~")[0]] for q in questions}
+
+
+def test_random_quizzes_never_repeat_or_pair_near_duplicates(manager):
+    seen = []
+    for _ in range(3):
+        seen += served_positions(manager, manager.generate_new_quiz("s", 3)["questions"])
+    assert len(seen) == len(set(seen))
+    assert not {0, 1} <= set(seen)
+
+
+def test_adaptive_marks_near_duplicates_used(manager):
+    for _ in range(20):
+        manager.reset_session("s")
+        drawn = served_positions(manager, manager.generate_new_quiz("s", 6, mode="adaptive")["questions"])
+        used = manager.used_questions["s"]
+        assert drawn <= {i for i in range(12) if i in used}
+        if drawn & {0, 1}:
+            assert 0 in used and 1 in used
+            rest = manager.generate_new_quiz("s", 12 - len(used))["questions"]
+            assert not served_positions(manager, rest) & {0, 1}
+            return
+    pytest.fail("adaptive selection never drew the clustered question")
+
+
+def test_adaptive_unseen_metric_ignores_variant_ids(manager, caplog):
+    every_question = manager.question_cache.get_bank("s").questions
+    manager.grade_and_submit("s", [{"id": q["id"], "answer": "A"} for q in every_question])
+    manager.generate_new_quiz("s", 12, allow_repeats=True)  # second serve: variant ids
+    with caplog.at_level(logging.INFO, logger="utils.quiz_manager"):
+        manager.generate_new_quiz("s", 5, mode="adaptive", allow_repeats=True)
+    record = next(r for r in caplog.records if getattr(r, "mode", None) == "adaptive")
+    assert record.unseen_selected == 0  # every question has been answered
+
+
+def test_topic_quiz_only_draws_matching_unused_questions(manager):
+    quiz = manager.generate_new_quiz("s", 3, topics=["history"])
+    assert quiz["success"]
+    bank_questions = manager.question_cache.get_bank("s").questions
+    assert all(bank_questions[i]["topic"] == "history" for i in served_positions(manager, quiz["questions"]))
+    again = manager.generate_new_quiz("s", 2, topics=["history"])
+    assert not served_positions(manager, quiz["questions"]) & served_positions(manager, again["questions"])
+
+
+def test_topic_quiz_tolerates_positions_without_a_cluster(manager):
+    shared = manager.question_cache.get_bank("s")
+    shared.clusters = shared.clusters[:2]  # e.g. a bank whose cluster map covers fewer positions
+    quiz = manager.generate_new_quiz("s", 4, topics=["history"])
+    assert quiz["success"] and quiz["total_questions"] == 4
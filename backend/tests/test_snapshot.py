@@ -0,0 +1,157 @@
+"""
+Warm restarts: state written by one process (snapshot + journal) must come back
+identical in the next. Each phase runs in a fresh interpreter, like a real restart.
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRELUDE = """
+import pickle, time
+from utils.quiz_manager import quiz_manager as qm
+from routes.analytics import quiz_sessions, record_quiz
+from utils.rollups import rollups
+from utils.snapshot import state_store
+
+TOPICS = ("alpha", "beta", "gamma")
+
+def questions(n, offset=0):
+    return [{"question": f"What is fact number {i} about region {i * 7}?",
+             "options": {"A": f"a{i}", "B": f"b{i}", "C": f"c{i}", "D": f"d{i}"},
+             "correct_answer": "A", "explanation": "By definition.", "topic": TOPICS[i % 3]}
+            for i in range(offset, offset + n)]
+
+def play(session_id, count, answer="A", **options):
+    quiz = qm.generate_new_quiz(session_id, count, **options)["questions"]
+    graded = qm.grade_and_submit(session_id, [{"id": q["id"], "answer": answer, "timeSpent": 3} for q in quiz])
+    record_quiz(session_id, "geo", graded["results"], "class-1")
+
+def fingerprint():
+    return (
+        {s: (e["bank"].bank_id, e["total_questions"]) for s, e in qm.question_cache.cache.items()},
+        {s: [(h["quiz_number"], h["timestamp"], h["score"]) for h in v] for s, v in qm.quiz_history.history.items()},
+        {s: (bytes(u.bits), len(u)) for s, u in qm.used_questions.items()},
+        {s: m.state for s, m in qm.mastery.items()},
+        {s: r.cards for s, r in qm.review_schedules.items()},
+        {s: bytes(v.counts) for s, v in qm.variant_counters.items()},
+        {s: [(q["timestamp"], len(q["questions"])) for q in v] for s, v in quiz_sessions.items()},
+        {g: {b: {k: (c.answered, c.correct) for k, c in cells.items()} for b, cells in t.items()}
+         for g, t in rollups.tables.items()},
+        sorted(qm.bank_library.banks),
+        {b: bank.refcount for b, bank in qm.bank_library.banks.items()},
+    )
+
+state_store.restore()
+"""
+
+
+def run_phase(state_dir, body):
+    env = {**os.environ, "STATE_DIR": str(state_dir), "LOG_LEVEL": "ERROR", "STATE_SNAPSHOT_INTERVAL": "3600"}
+    result = subprocess.run([sys.executable, "-c", PRELUDE + textwrap.dedent(body)], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+CRASH = """
+with open(EXPECTED, "wb") as f:
+    pickle.dump(fingerprint(), f)
+os._exit(0)  # no shutdown snapshot
+"""
+
+CHECK = """
+with open(EXPECTED, "rb") as f:
+    assert fingerprint() == pickle.load(f), "state differs after restore"
+print(state_store.stats["last_restore"]["journal_records"])
+"""
+
+
+def phase(state_dir, body, crash=False):
+    header = f"import os\nEXPECTED = {str(state_dir / 'expected')!r}\n"
+    return run_phase(state_dir, header + textwrap.dedent(body) + (CRASH if crash else CHECK))
+
+
+@pytest.fixture
+def state_dir(tmp_path):
+    return tmp_path / "state"
+
+
+def test_journal_alone_restores_the_state(state_dir):
+    phase(state_dir, """
+        qm.upload_and_cache_questions("s1", questions(20))
+        qm.upload_and_cache_questions("s2", questions(20))  # same bank, shared
+        play("s1", 5)
+        play("s1", 5, answer="B", allow_repeats=True)
+        play("s2", 4, topics=["beta"])
+        qm.submit_quiz_results("s2", {"questions": [], "score": 0, "total": 0})
+    """, crash=True)
+    assert int(phase(state_dir, "")) > 0
+
+
+def test_snapshot_plus_journal_restores_the_state(state_dir):
+    phase(state_dir, """
+        qm.upload_and_cache_questions("s1", questions(20))
+        play("s1", 5)
+        state_store.snapshot()
+        qm.upload_and_cache_questions("s1", questions(5, 20), append=True)
+        play("s1", 8, mode="adaptive")
+        qm.upload_and_cache_questions("s3", questions(6, 100))
+        qm.reset_session("s3", keep_cache=False)
+    """, crash=True)
+    phase(state_dir, "")
+
+
+def test_review_pops_and_answer_times_replay_exactly(state_dir):
+    phase(state_dir, """
+        qm.upload_and_cache_questions("s1", questions(10))
+        play("s1", 6, answer="B")
+        later = time.time() + 30 * 86400
+        real_time, time.time = time.time, lambda: later  # reviews are due a month later
+        assert qm.generate_review_quiz("s1", 3)["total_questions"] == 3
+        play("s1", 2)
+        time.time = real_time
+    """, crash=True)
+    phase(state_dir, "")
+
+
+def test_restored_state_keeps_snapshotting_incrementally(state_dir):
+    phase(state_dir, """
+        for s in range(5):
+            qm.upload_and_cache_questions(f"s{s}", questions(10))
+            play(f"s{s}", 3)
+        assert state_store.snapshot()["sessions_saved"] == 5
+        play("s1", 3)
+        assert state_store.snapshot()["sessions_saved"] == 1
+        assert state_store.snapshot()["sessions_saved"] == 0
+        quiz_sessions.pop("s2")  # an append-only list removed outright
+        state_store.record("analytics_clear", {"session_id": "s2"})
+        play("s3", 3)
+        state_store.snapshot()
+    """, crash=True)
+    assert phase(state_dir, "").strip() == "0"  # everything came from the snapshot
+
+
+def test_torn_journal_record_is_ignored(state_dir):
+    phase(state_dir, """
+        qm.upload_and_cache_questions("s1", questions(10))
+        play("s1", 3)
+    """, crash=True)
+    journal = sorted(state_dir.glob("journal-*.log"))[-1]
+    with open(journal, "ab") as f:
+        f.write(b"\x00\x00\x10\x00partial")  # a record cut off by the crash
+    phase(state_dir, "")
+
+
+def test_unreadable_snapshot_starts_empty(state_dir):
+    state_dir.mkdir()
+    (state_dir / "snapshot.bin").write_bytes(b"not a snapshot")
+    output = run_phase(state_dir, """
+        assert qm.question_cache.cache == {}
+        print(state_store.stats["last_restore"]["snapshot_loaded"])
+    """)
+    assert output.strip() == "False"
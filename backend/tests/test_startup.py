@@ -0,0 +1,30 @@
+"""
+Cold-start regression guard: importing the app must stay under the import-time
+budget and must not pull in the heavy dependencies that load on first use.
+Runs the same check as `python -m benchmarks.startup` in a fresh interpreter.
+"""
+import os
+
+from benchmarks.startup import LAZY_MODULES, measure_import
+
+BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "800"))
+
+
+def _best_of(runs: int = 3) -> dict:
+    return min((measure_import("main") for _ in range(runs)), key=lambda r: r["total_ms"])
+
+
+def test_heavy_modules_are_lazy():
+    result = measure_import("main")
+    assert result["eager_heavy_imports"] == [], (
+        f"imported eagerly (should load on first use): {result['eager_heavy_imports']}; "
+        f"guarded: {LAZY_MODULES}"
+    )
+
+
+def test_import_time_within_budget():
+    result = _best_of()
+    slowest = ", ".join(f"{m['module']} {m['self_ms']:.1f} ms" for m in result["slowest"][:5])
+    assert result["total_ms"] <= BUDGET_MS, (
+        f"import main took {result['total_ms']:.1f} ms (budget {BUDGET_MS:.0f} ms); slowest: {slowest}"
+    )
@@ -0,0 +1,55 @@
+"""Server-Timing contents and the route label on request latency."""
+import gzip
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils import tracing
+from utils.compression import CompressionMiddleware
+from utils.tracing import RequestTrace, TracingMiddleware, span
+
+
+def make_client(details=False):
+    app = FastAPI()
+
+    @app.post("/api/items/{item_id}")
+    async def create(item_id: str, body: dict):
+        with span("generate", model="secret-model", outcome="ok"):
+            pass
+        return {"item": item_id, "size": len(body)}
+
+    app.add_middleware(CompressionMiddleware, decompress_paths=["/api/items/1"])
+    app.add_middleware(TracingMiddleware, details=details)
+    return TestClient(app)
+
+
+def routes_seen(histogram):
+    return {dict(key)["route"] for key in histogram._series}
+
+
+def test_server_timing_sends_durations_only_by_default():
+    header = make_client().post("/api/items/1", json={"a": 1}).headers["Server-Timing"]
+    assert header.startswith("generate;dur=") and "total;dur=" in header
+    assert "secret-model" not in header and "desc" not in header
+
+
+def test_server_timing_details_behind_flag():
+    header = make_client(details=True).post("/api/items/1", json={"a": 1}).headers["Server-Timing"]
+    assert 'generate;desc="model=secret-model outcome=ok";dur=' in header
+
+
+def test_details_cannot_break_out_of_the_header_value():
+    trace = RequestTrace()
+    trace.add_span("parse", 0.001, {"note": 'a"b\nc'})
+    assert trace.server_timing(details=True).startswith('parse;desc="note=ab c";dur=')
+
+
+def test_decompressed_requests_keep_their_route_label(monkeypatch):
+    histogram = tracing.Histogram("test_request_duration_seconds", "test")
+    monkeypatch.setattr(tracing, "request_duration", histogram)
+    response = make_client().post(
+        "/api/items/1", content=gzip.compress(b'{"a": 1}'),
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json"},
+    )
+    assert response.json() == {"item": "1", "size": 1}
+    assert routes_seen(histogram) == {"/api/items/{item_id}"}
@@ -0,0 +1,139 @@
+import random
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Selection weights: unseen questions sit between missed (high) and mastered (low) ones
+UNSEEN_WEIGHT = 1.0
+MISSED_WEIGHT = 2.0
+MASTERED_WEIGHT = 0.1
+# How fast mastery follows recent answers (exponentially weighted moving average)
+MASTERY_ALPHA = 0.4
+
+
+class MasteryTracker:
+    """
+    Hash Map of question id -> mastery for one session.
+
+    Mastery is an exponentially weighted average of correctness in [0, 1], so
+    a recent miss on a long-mastered question still raises its weight.
+
+    Time Complexity: O(1) per recorded answer and per weight lookup
+    """
+    def __init__(self):
+        self.state: Dict[str, Dict] = {}  # id -> {"attempts", "correct", "mastery"}
+
+    def record(self, question_id: str, correct: bool) -> float:
+        """Record one answer and return the question's new selection weight"""
+        entry = self.state.get(question_id)
+        value = 1.0 if correct else 0.0
+        if entry is None:
+            self.state[question_id] = {"attempts": 1, "correct": int(correct), "mastery": value}
+        else:
+            entry["attempts"] += 1
+            entry["correct"] += int(correct)
+            entry["mastery"] += MASTERY_ALPHA * (value - entry["mastery"])
+        return self.weight(question_id)
+
+    def weight(self, question_id: Optional[str]) -> float:
+        entry = self.state.get(question_id)
+        if entry is None:
+            return UNSEEN_WEIGHT
+        return MASTERED_WEIGHT + (MISSED_WEIGHT - MASTERED_WEIGHT) * (1.0 - entry["mastery"])
+
+    def summary(self) -> Dict:
+        seen = len(self.state)
+        mastered = sum(1 for entry in self.state.values() if entry["mastery"] >= 0.8)
+        return {"questions_seen": seen, "questions_mastered": mastered}
+
+
+class FenwickSampler:
+    """
+    Fenwick tree (Binary Indexed Tree) over item weights for weighted random
+    sampling. Unlike an alias table it supports cheap single-weight updates,
+    so answering a question or appending to the bank never rebuilds it.
+
+    Time Complexity:
+    - build: O(n)
+    - update / append / sample: O(log n)
+    - sample k without replacement: O(k log n)
+    """
+    def __init__(self, weights: Iterable[float] = ()):
+        self.weights: List[float] = list(weights)
+        n = len(self.weights)
+        self.tree = [0.0] * (n + 1)
+        for i, weight in enumerate(self.weights, 1):
+            self.tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= n:
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def _prefix(self, i: int) -> float:
+        """Sum of the first i weights"""
+        total = 0.0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def total(self) -> float:
+        return self._prefix(len(self.weights))
+
+    def update(self, index: int, weight: float):
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def append(self, weight: float):
+        self.weights.append(weight)
+        i = len(self.weights)
+        # Node i covers (i - lowbit(i), i]: the new weight plus the tail of what is already there
+        self.tree.append(weight + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+
+    def sample(self, rng=random) -> Optional[int]:
+        """Index drawn with probability weight / total, or None if all weights are zero"""
+        total = self.total()
+        if total <= 0:
+            return None
+        target = rng.random() * total
+        position, step = 0, 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            nxt = position + step
+            if nxt < len(self.tree) and self.tree[nxt] <= target:
+                position = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        # Float rounding can land on a zero-weight slot at the very end; step back to a real one
+        while position >= len(self.weights) or self.weights[position] <= 0:
+            position -= 1
+            if position < 0:
+                return None
+        return position
+
+    def sample_distinct(self, k: int, exclude_with: Optional[Callable[[int], Iterable[int]]] = None,
+                        rng=random) -> List[int]:
+        """
+        Draw up to k distinct indices. `exclude_with(index)` returns other indices
+        that must not be drawn alongside it (e.g. its near-duplicates). Weights
+        are zeroed while drawing and restored afterwards.
+        """
+        removed: Dict[int, float] = {}
+        picked = []
+        try:
+            while len(picked) < k:
+                index = self.sample(rng)
+                if index is None:
+                    break
+                picked.append(index)
+                for other in [index, *(exclude_with(index) if exclude_with else ())]:
+                    if other not in removed:
+                        removed[other] = self.weights[other]
+                        self.update(other, 0.0)
+        finally:
+            for index, weight in removed.items():
+                self.update(index, weight)
+        return picked
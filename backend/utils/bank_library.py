@@ -0,0 +1,210 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.near_duplicate import NearDuplicateIndex
+from utils.topic_index import TopicIndex
+
+
+class QuestionBank:
+    """
+    A question bank shared by every session that uploaded the same content.
+
+    Holds the questions plus everything derived from them alone: id -> position
+    map, the near-duplicate index/clusters and the topic inverted index.
+    Per-session state (used questions, mastery, history) lives in QuizManager
+    and refers to positions in here.
+    Banks are treated as immutable once published to the library; appending
+    produces a new bank (see BankLibrary.build).
+    """
+    def __init__(self, bank_id: str):
+        self.bank_id = bank_id
+        self.questions: List[Dict] = []
+        self.positions: Dict[str, int] = {}  # question id -> position
+        self.near_duplicates = NearDuplicateIndex()
+        self.clusters: List[int] = []  # position -> cluster id (first member's position)
+        self.cluster_members: Dict[int, List[int]] = {}  # cluster id -> positions, only clusters of 2+
+        self.topics = TopicIndex()
+        self.refcount = 0  # sessions referencing this bank
+        self.build_report: Dict = {}
+
+    def add_questions(self, questions: List[Dict], drop_near_duplicates: bool) -> Tuple[List[Dict], int]:
+        """
+        Append questions, assigning each to the cluster of its closest near-duplicate
+        already in the bank, or to a new cluster. Only called before the bank is
+        published or while exactly one session owns it.
+
+        Time Complexity: O(n) where n = len(questions) (LSH lookups don't grow with bank size)
+
+        Returns:
+            (questions added, number of near-duplicates); near-duplicates are left out
+            when drop_near_duplicates=True
+        """
+        added, near_duplicates = [], 0
+        for question in questions:
+            signature = self.near_duplicates.signature(question)
+            match = self.near_duplicates.find(signature)
+            if match:
+                near_duplicates += 1
+                if drop_near_duplicates:
+                    continue
+            position = len(self.questions)
+            if match:
+                cluster = self.clusters[match[0]]
+                self.cluster_members.setdefault(cluster, [cluster]).append(position)
+            else:
+                cluster = position
+            self.clusters.append(cluster)
+            self.near_duplicates.add(position, signature)
+            self.topics.add(position, question)
+            self.positions[question['id']] = position
+            self.questions.append(question)
+            added.append(question)
+        return added, near_duplicates
+
+    def copy(self, bank_id: str) -> "QuestionBank":
+        """
+        Copy for copy-on-write appends. Question dicts are shared, only the
+        containers are copied - O(n) references, no question data.
+        """
+        clone = QuestionBank(bank_id)
+        clone.questions = list(self.questions)
+        clone.positions = dict(self.positions)
+        clone.near_duplicates = self.near_duplicates.copy()
+        clone.clusters = list(self.clusters)
+        clone.cluster_members = {cluster: list(members) for cluster, members in self.cluster_members.items()}
+        clone.topics = self.topics.copy()
+        return clone
+
+    def __len__(self):
+        return len(self.questions)
+
+
+class BankLibrary:
+    """
+    Content-addressed Hash Map of bank id -> QuestionBank with reference counts.
+
+    A bank id is the hash of its parent bank id plus the ids of the questions
+    added (and the near-duplicate policy), so identical uploads resolve to the
+    same bank and are stored once. Banks are freed when no session refers to them.
+
+    Copy-on-write on append: a bank referenced by other sessions is copied
+    before the new questions are added; a bank only the appending session uses
+    is extended in place and re-keyed.
+
+    Time Complexity:
+    - lookup / acquire / release: O(1)
+    - build: O(n) for n new questions (+ O(m) container copy for a shared parent of size m)
+    """
+    def __init__(self):
+        self.banks: Dict[str, QuestionBank] = {}
+
+    @staticmethod
+    def bank_id(parent: Optional[QuestionBank], question_ids: Iterable[str], drop_near_duplicates: bool) -> str:
+        digest = hashlib.sha1(f"{parent.bank_id if parent else ''}|{int(drop_near_duplicates)}".encode())
+        for question_id in question_ids:
+            digest.update(question_id.encode())
+        return digest.hexdigest()[:20]
+
+    def get(self, bank_id: str) -> Optional[QuestionBank]:
+        return self.banks.get(bank_id)
+
+    def build(self, questions: List[Dict], drop_near_duplicates: bool = False,
+              parent: Optional[QuestionBank] = None) -> QuestionBank:
+        """
+        Bank for `parent` + `questions`, reusing an identical existing bank when there is one.
+        The bank's build_report holds the number of questions added and near-duplicates.
+        """
+        bank_id = self.bank_id(parent, (q['id'] for q in questions), drop_near_duplicates)
+        existing = self.banks.get(bank_id)
+        if existing is not None:
+            return existing
+
+        if parent is not None and parent.refcount <= 1 and self.banks.get(parent.bank_id) is parent:
+            # Sole owner: extend in place and re-key instead of copying
+            del self.banks[parent.bank_id]
+            bank = parent
+            bank.bank_id = bank_id
+        else:
+            bank = parent.copy(bank_id) if parent is not None else QuestionBank(bank_id)
+
+        added, near_duplicates = bank.add_questions(questions, drop_near_duplicates)
+        bank.build_report = {'added': len(added), 'near_duplicates': near_duplicates}
+        self.banks[bank_id] = bank
+        return bank
+
+    def acquire(self, bank: QuestionBank):
+        bank.refcount += 1
+
+    def release(self, bank: QuestionBank):
+        bank.refcount -= 1
+        if bank.refcount <= 0 and self.banks.get(bank.bank_id) is bank:
+            del self.banks[bank.bank_id]
+
+    def snapshot(self) -> Dict:
+        return {
+            'banks': len(self.banks),
+            'questions_stored': sum(len(bank) for bank in self.banks.values()),
+            'session_references': sum(bank.refcount for bank in self.banks.values()),
+        }
+
+
+class UsedBitmap:
+    """
+    Per-session "already used" flags over bank positions: one bit per question
+    instead of a Set entry (~1/500th of the memory of a Set of ints).
+
+    Changes since the last take_changes() (a clear, then the positions newly set)
+    are kept as well, so a serve is journaled as a delta, not as the whole bitmap.
+
+    Time Complexity: O(1) add / contains / len; take_changes O(1)
+    """
+    __slots__ = ("bits", "count", "_cleared", "_added")
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.count = 0
+        self._cleared = False
+        self._added: List[int] = []
+
+    def add(self, index: int):
+        byte, bit = divmod(index, 8)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte - len(self.bits) + 1))
+        if not self.bits[byte] >> bit & 1:
+            self.bits[byte] |= 1 << bit
+            self.count += 1
+            self._added.append(index)
+
+    def update(self, indices: Iterable[int]):
+        for index in indices:
+            self.add(index)
+
+    def __contains__(self, index: int) -> bool:
+        byte, bit = divmod(index, 8)
+        return byte < len(self.bits) and bool(self.bits[byte] >> bit & 1)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.bits = bytearray()
+        self.count = 0
+        self._cleared = True
+        self._added = []
+
+    def take_changes(self) -> Tuple[bool, List[int]]:
+        """(cleared, positions set afterwards) since the previous call"""
+        changes = (self._cleared, self._added)
+        self._cleared, self._added = False, []
+        return changes
+
+    def apply_changes(self, cleared: bool, added: Iterable[int]):
+        """Replay a take_changes() delta"""
+        if cleared:
+            self.clear()
+        self.update(added)
+        self.take_changes()
+
+    def as_int(self) -> int:
+        """The flags as an int bitmap (bit i = position i), for AND/NOT with index bitmaps"""
+        return int.from_bytes(self.bits, "little")
@@ -0,0 +1,241 @@
+import gzip
+import zlib
+from typing import Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+try:
+    import brotli
+except ImportError:  # brotli is optional - fall back to gzip only
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+BROTLI_INPUT_CHUNK = 16  # bytes of compressed input per Decompressor.process() call
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best response encoding from an Accept-Encoding header.
+    Prefers brotli (when installed) over gzip; honours q=0 exclusions and "*".
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    wildcard = weights.get("*")
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = weights.get(encoding, wildcard if wildcard is not None else 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_body(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """Compress a complete response body with the negotiated encoding"""
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+def decompress_body(body: bytes, encoding: str, max_size: int) -> bytes:
+    """
+    Decompress a request body, refusing to inflate past max_size bytes
+    so a small compressed upload cannot expand into an unbounded payload.
+    """
+    if encoding == "br":
+        if brotli is None:
+            raise ValueError("Brotli request bodies are not supported")
+        # The brotli binding has no output limit, so feed the input in small pieces and
+        # stop once past max_size (a few input bytes can still expand to one ~16 MB block)
+        decompressor, chunks, size = brotli.Decompressor(), [], 0
+        for offset in range(0, len(body), BROTLI_INPUT_CHUNK):
+            chunk = decompressor.process(body[offset:offset + BROTLI_INPUT_CHUNK])
+            size += len(chunk)
+            if size > max_size:
+                raise OverflowError("Decompressed body too large")
+            chunks.append(chunk)
+        if not decompressor.is_finished():
+            raise ValueError("Truncated compressed body")
+        return b"".join(chunks)
+
+    # gzip carries its own header; deflate is zlib-wrapped
+    wbits = 16 + zlib.MAX_WBITS if encoding in ("gzip", "x-gzip") else zlib.MAX_WBITS
+    decompressor = zlib.decompressobj(wbits)
+    data = decompressor.decompress(body, max_size + 1)
+    if len(data) > max_size or decompressor.unconsumed_tail:
+        raise OverflowError("Decompressed body too large")
+    if not decompressor.eof:
+        raise ValueError("Truncated compressed body")
+    return data
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware for negotiated response compression and compressed uploads.
+
+    - Responses are compressed with brotli or gzip only when the client accepts it,
+      the body is at least minimum_size bytes and the content type is compressible.
+    - Streaming responses (more than one body chunk) are passed through untouched
+      so that event streams are not delayed by buffering.
+    - Request bodies with Content-Encoding gzip/deflate/br are inflated for the
+      paths in decompress_paths, so handlers still see plain JSON.
+    """
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        decompress_paths: Iterable[str] = (),
+        max_decompressed_size: int = 20 * 1024 * 1024,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.decompress_paths = set(decompress_paths)
+        self.max_decompressed_size = max_decompressed_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+
+        content_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if content_encoding != "identity":
+            if scope["path"] not in self.decompress_paths:
+                response = JSONResponse(
+                    {"success": False, "error": f"Content-Encoding '{content_encoding}' not accepted on this endpoint"},
+                    status_code=415,
+                )
+                await response(scope, receive, send)
+                return
+            decoded = await self._decompress_request(scope, receive, content_encoding)
+            if decoded is None:  # client disconnected mid-upload
+                return
+            scope, receive, error = decoded
+            if error is not None:
+                await error(scope, receive, send)
+                return
+
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self._send_compressed(scope, receive, send, encoding)
+
+    async def _decompress_request(self, scope, receive, encoding: str):
+        """Buffer and inflate the request body, replaying it as a single message"""
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+
+        try:
+            body = decompress_body(b"".join(chunks), encoding, self.max_decompressed_size)
+        except OverflowError as e:
+            return scope, receive, JSONResponse({"success": False, "error": str(e)}, status_code=413)
+        except Exception as e:  # zlib.error, brotli.error, ValueError
+            return scope, receive, JSONResponse(
+                {"success": False, "error": f"Invalid {encoding} request body: {str(e)}"},
+                status_code=400,
+            )
+
+        # Drop the encoding and stale length so downstream sees a plain body
+        raw_headers = [
+            (k, v) for k, v in scope["headers"]
+            if k not in (b"content-encoding", b"content-length")
+        ]
+        raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        # In place, not a copy: outer middleware (tracing) reads the matched route from this scope
+        scope["headers"] = raw_headers
+
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return scope, replay, None
+
+    async def _send_compressed(self, scope, receive, send, encoding: str):
+        start_message = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = MutableHeaders(raw=start_message["headers"])
+
+            if more_body or not self._should_compress(headers, body):
+                # Streaming or not worth it: release the original response as-is
+                passthrough = True
+                if not more_body and self._is_compressible(headers):
+                    headers.add_vary_header("Accept-Encoding")
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress_body(body, encoding, self.gzip_level, self.brotli_quality)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, wrapped_send)
+
+    def _is_compressible(self, headers: MutableHeaders) -> bool:
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _should_compress(self, headers: MutableHeaders, body: bytes) -> bool:
+        if "content-encoding" in headers:
+            return False
+        if len(body) < self.minimum_size:
+            return False
+        return self._is_compressible(headers)
@@ -0,0 +1,241 @@
+"""
+Columnar export of answer-level data from the analytics store (quiz_sessions)
+or the quiz history Stack (QuizHistory).
+
+Rows are produced by a generator and written in fixed-size batches (one Parquet
+row group / Arrow record batch / CSV chunk each), so memory stays bounded by the
+batch size however many answers are exported. Parquet and Arrow IPC need pyarrow
+(optional, see requirements-optional.txt); without it the export falls back to CSV.
+
+CLI - streams the export from a running server to a file:
+    python -m utils.export --format parquet --out answers.parquet
+    python -m utils.export --source history --format csv --out - > history.csv
+"""
+import csv
+import io
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+COLUMNS = (
+    "source", "session_id", "quiz_number", "timestamp", "topic", "cohort",
+    "question_id", "question", "user_answer", "correct_answer", "is_correct", "time_spent",
+)
+FORMATS = ("parquet", "arrow", "csv")
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "csv": "text/csv",
+}
+DEFAULT_BATCH_ROWS = 50000
+
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_format(requested: str) -> str:
+    """The format actually written: Parquet/Arrow fall back to CSV without pyarrow"""
+    if requested in ("parquet", "arrow") and not pyarrow_available():
+        return "csv"
+    return requested
+
+
+def analytics_rows(quiz_sessions: Dict[str, List[Dict]]) -> Iterator[Tuple]:
+    """One row per answer in the analytics store (QuestionData fields)"""
+    for session_id, quizzes in list(quiz_sessions.items()):  # snapshot: submits may add sessions meanwhile
+        for quiz_number, quiz in enumerate(list(quizzes), start=1):
+            for q in quiz['questions']:
+                yield ("analytics", session_id, quiz_number, quiz['timestamp'], quiz['topic'], quiz.get('cohort'),
+                       q.get('id'), q.get('question'), q.get('userAnswer'), q.get('correctAnswer'),
+                       q.get('isCorrect'), q.get('timeSpent'))
+
+
+def history_rows(history: Dict[str, List[Dict]]) -> Iterator[Tuple]:
+    """
+    One row per question in the quiz history Stack. Entries from the combined submit hold
+    graded results; older entries hold the served questions (no answer recorded).
+    """
+    for session_id, entries in list(history.items()):
+        for entry in list(entries):
+            times = entry.get('per_question_time') or []
+            for i, q in enumerate(entry['questions']):
+                time_spent = q.get('timeSpent', times[i] if i < len(times) else None)
+                yield ("history", session_id, entry['quiz_number'], entry['timestamp'], None, None,
+                       q.get('id'), q.get('question'), q.get('userAnswer'),
+                       q.get('correctAnswer', q.get('correct_answer')), q.get('isCorrect'), time_spent)
+
+
+def batched(rows: Iterable[Tuple], batch_rows: int) -> Iterator[List[Tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every batch"""
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("source", pa.string()), ("session_id", pa.string()), ("quiz_number", pa.int32()),
+        ("timestamp", pa.string()), ("topic", pa.string()), ("cohort", pa.string()),
+        ("question_id", pa.string()), ("question", pa.string()), ("user_answer", pa.string()),
+        ("correct_answer", pa.string()), ("is_correct", pa.bool_()), ("time_spent", pa.float64()),
+    ])
+
+
+def _to_bool(value) -> Optional[bool]:
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ("true", "1", "yes"):
+            return True
+        if lowered in ("false", "0", "no", ""):
+            return False
+        return None
+    if isinstance(value, (int, float)):
+        return bool(value)
+    return None
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    number = _to_float(value)
+    return int(number) if number is not None and number == number and abs(number) < 2 ** 31 else None
+
+
+def _to_str(value) -> Optional[str]:
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def coerce_row(row: Tuple) -> Tuple:
+    """
+    Fit a row to the export schema. Older clients submitted isCorrect/timeSpent as
+    strings or numbers, and ids as ints; values that cannot be read become null
+    instead of failing the export halfway through.
+    """
+    (source, session_id, quiz_number, timestamp, topic, cohort,
+     question_id, question, user_answer, correct_answer, is_correct, time_spent) = row
+    return (source, _to_str(session_id), _to_int(quiz_number), _to_str(timestamp), _to_str(topic),
+            _to_str(cohort), _to_str(question_id), _to_str(question), _to_str(user_answer),
+            _to_str(correct_answer), _to_bool(is_correct), _to_float(time_spent))
+
+
+def _record_batch(schema, batch: List[Tuple]):
+    import pyarrow as pa
+    columns = list(zip(*batch))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+    )
+
+
+def stream_export(rows: Iterable[Tuple], fmt: str, batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[bytes]:
+    """
+    Encode rows as `fmt` (already resolved, see resolve_format), yielding the bytes
+    of each batch as soon as it is written.
+
+    Time Complexity: O(n) for n rows; memory O(batch_rows)
+    """
+    rows = map(coerce_row, rows)
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        for batch in batched(rows, batch_rows):
+            writer.writerows(batch)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()  # header only: nothing exported
+        return
+
+    import pyarrow as pa
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+        write = lambda batch: writer.write_table(pa.Table.from_batches([batch]))  # one row group per batch
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+
+    for batch in batched(rows, batch_rows):
+        write(_record_batch(schema, batch))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    import os
+    import shutil
+    import sys
+    import urllib.parse
+    import urllib.request
+
+    parser = argparse.ArgumentParser(description="Export answer data from a running quiz server")
+    parser.add_argument("--url", default="http://localhost:8000", help="server base URL")
+    parser.add_argument("--source", choices=("analytics", "history"), default="analytics")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS)
+    parser.add_argument("--out", required=True, help="output file, or - for stdout")
+    args = parser.parse_args(argv)
+
+    query = urllib.parse.urlencode({"source": args.source, "format": args.format, "batch_rows": args.batch_rows})
+    with urllib.request.urlopen(f"{args.url.rstrip('/')}/api/analytics/export?{query}") as response:
+        written = response.headers.get("X-Export-Format", args.format)
+        out_path = args.out
+        if written != args.format:
+            if out_path != "-":
+                out_path = os.path.splitext(out_path)[0] + ".csv"  # never CSV bytes under a .parquet name
+            print(f"Server has no pyarrow; writing {written} to {out_path} instead of {args.format}",
+                  file=sys.stderr)
+        if out_path == "-":
+            shutil.copyfileobj(response, sys.stdout.buffer)
+        else:
+            with open(out_path, "wb") as out:
+                shutil.copyfileobj(response, out)
+
+
+if __name__ == "__main__":
+    main()
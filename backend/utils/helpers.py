@@ -1,33 +1,146 @@
 import json
 import re
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
+from pydantic import TypeAdapter, ValidationError
+from models.model import GeneratedQuestion
+from utils.tracing import annotate, metrics
+
+parse_outcomes = metrics.counter("quiz_parse_strategy_total", "Model output parses by repair applied")
+
+# Start of a JSON object: "{" followed by a key or an immediate "}"
+_OBJECT_START = re.compile(r'\{\s*["}]')
+_QUIZ_START = re.compile(r'\{\s*"questions"')
+# Structural tokens; strings are consumed whole so braces inside them are ignored
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*(")?|[{}\[\],]')
+_CLOSERS = {'{': '}', '[': ']'}
+_decoder = json.JSONDecoder()
+_question_schema = TypeAdapter(GeneratedQuestion)
+
+
+def _parsed(data, repair: str):
+    parse_outcomes.inc(strategy=repair)
+    annotate("strategy", repair)
+    return data, repair
+
+
+def _scan_object(text: str, start: int) -> Tuple[Optional[str], str]:
+    """
+    Single pass over the object starting at `start`.
+    Drops trailing commas and, if the text is cut off, keeps everything up to
+    the last complete array element (e.g. the last whole question) and closes
+    the still-open brackets.
+
+    Returns:
+        (repaired JSON text or None, repair name)
+    """
+    stack: List[str] = []
+    trailing_commas: List[int] = []
+    last_comma = -1
+    salvage = None  # (end offset, open brackets, trailing commas count) after last complete element
+
+    for match in _TOKEN.finditer(text, start):
+        token = match.group()
+        char = token[0]
+
+        if char == '"':
+            if match.group(1) is None:  # unterminated string - output was cut off
+                break
+            continue
+
+        if char in '{[':
+            stack.append(char)
+        elif char in '}]':
+            if not stack or _CLOSERS[stack[-1]] != char:
+                break  # mismatched bracket - not repairable
+            if last_comma > 0 and not text[last_comma + 1:match.start()].strip():
+                trailing_commas.append(last_comma)
+            stack.pop()
+            if not stack:
+                body = _drop_positions(text, start, match.end(), trailing_commas)
+                return body, "trailing_commas" if trailing_commas else "extracted"
+            if char == '}' and stack[-1] == '[':
+                salvage = (match.end(), tuple(stack), len(trailing_commas))
+        else:  # ','
+            last_comma = match.start()
+
+    if salvage is None:
+        return None, "failed"
+
+    end, open_brackets, comma_count = salvage
+    body = _drop_positions(text, start, end, trailing_commas[:comma_count])
+    return body + "".join(_CLOSERS[b] for b in reversed(open_brackets)), "truncated_salvage"
+
+
+def _drop_positions(text: str, start: int, end: int, positions: List[int]) -> str:
+    pieces, cursor = [], start
+    for pos in positions:
+        pieces.append(text[cursor:pos])
+        cursor = pos + 1
+    pieces.append(text[cursor:end])
+    return "".join(pieces)
 
-def parse_JSON_quiz(response_text: str) -> Optional[dict]:
-    if not response_text:
-        return None
-    try:
-        return json.loads(response_text)
-    except json.JSONDecodeError:
-        pass
-        # Strategy 2: Remove markdown
-    cleaned = response_text.strip()
-    cleaned = re.sub(r'^```json\\s*', '', cleaned)
-    cleaned = re.sub(r'^```\\s*', '', cleaned)
-    cleaned = re.sub(r'\\s*```$', '', cleaned)
 
+def _is_quiz(data) -> bool:
+    return isinstance(data, dict) and 'questions' in data
+
+
+def _decode(text: str, start: int = 0):
+    """raw_decode that treats pathological nesting like any other malformed JSON"""
     try:
-        return json.loads(cleaned)
-    except json.JSONDecodeError:
-        pass
+        return _decoder.raw_decode(text, start)
+    except RecursionError:
+        raise json.JSONDecodeError("nesting too deep", text, start)
+
+
+def parse_JSON_quiz_with_repair(response_text: str) -> Tuple[Optional[dict], str]:
+    """
+    Locate and parse the outermost JSON object in model output.
+
+    - "direct": the whole text is valid JSON
+    - "extracted": object found inside code fences / surrounding prose
+    - "trailing_commas": trailing commas removed
+    - "truncated_salvage": output was cut off; complete questions kept
+    - "failed": nothing usable
+
+    Only the outermost object (and the first '{"questions"' object, if that is a
+    different one) is tried, and a parse only counts when it has a 'questions'
+    key - an inner object such as an options dict is never returned. The common
+    cases run entirely in the C JSON decoder; the repair scanner only runs when
+    that fails, once per candidate, so the whole parse is linear in the text.
+    """
+    if not response_text:
+        return None, "failed"
+
+    candidates = []
+    for pattern in (_OBJECT_START, _QUIZ_START):
+        match = pattern.search(response_text)
+        if match and match.start() not in candidates:
+            candidates.append(match.start())
 
-    # Strategy 3: Extract JSON with regex
-    json_match = re.search(r'\\{.*\\}', response_text, re.DOTALL)
-    if json_match:
+    for start in candidates:
         try:
-            return json.loads(json_match.group())
+            data, end = _decode(response_text, start)
+            if _is_quiz(data):
+                clean = start == 0 and not response_text[end:].strip()
+                return _parsed(data, "direct" if clean else "extracted")
         except json.JSONDecodeError:
             pass
 
+        repaired, repair = _scan_object(response_text, start)
+        if repaired is not None:
+            try:
+                data, _ = _decode(repaired)
+                if _is_quiz(data):
+                    return _parsed(data, repair)
+            except json.JSONDecodeError:
+                pass
+
+    return _parsed(None, "failed")
+
+
+def parse_JSON_quiz(response_text: str) -> Optional[dict]:
+    return parse_JSON_quiz_with_repair(response_text)[0]
+
 def validate_quiz(quiz_data: dict) -> Tuple[bool,str]:
     if not quiz_data or not isinstance(quiz_data, dict):
         return False, "Invalid quiz data format"
@@ -39,18 +152,34 @@ def validate_quiz(quiz_data: dict) -> Tuple[bool,str]:
         return False, "No questions found"
         # Validate each question
     for i, q in enumerate(quiz_data['questions'], 1):
-        if 'question' not in q:
-            return False, f"Question {i} missing 'question' field"
-        if 'options' not in q:
-            return False, f"Question {i} missing 'options' field"
-        if 'correct_answer' not in q:
-            return False, f"Question {i} missing 'correct_answer' field"
-        # Check options
-        if not all(opt in q['options'] for opt in ['A', 'B', 'C', 'D']):
-            return False, f"Question {i} missing required options (A, B, C, D)"
-        # Check correct answer
-        if q['correct_answer'] not in ['A', 'B', 'C', 'D']:
-            return False, f"Question {i} has invalid correct_answer"
+        error = validate_question(q)
+        if error:
+            return False, f"Question {i} {error}"
 
     return True, "Valid"
 
+
+def validate_question(q) -> Optional[str]:
+    """Validate one question; returns the problem description or None if valid"""
+    if not isinstance(q, dict):
+        return "is not an object"
+    if 'question' not in q:
+        return "missing 'question' field"
+    if 'options' not in q:
+        return "missing 'options' field"
+    if 'correct_answer' not in q:
+        return "missing 'correct_answer' field"
+    # Check options
+    if not isinstance(q['options'], dict) or not all(opt in q['options'] for opt in ['A', 'B', 'C', 'D']):
+        return "missing required options (A, B, C, D)"
+    # Check correct answer
+    if q['correct_answer'] not in ['A', 'B', 'C', 'D']:
+        return "has invalid correct_answer"
+    # Full schema (explanation, field types) - what QuizResponse will require of it
+    try:
+        _question_schema.validate_python(q)
+    except ValidationError as e:
+        error = e.errors()[0]
+        return f"has invalid '{'.'.join(str(part) for part in error['loc'])}': {error['msg']}"
+    return None
+
@@ -0,0 +1,152 @@
+import functools
+import hashlib
+import operator
+import re
+from array import array
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+_word = re.compile(r"[a-z0-9]+")
+
+# Function words carry no meaning for "is this the same question"
+_STOPWORDS = frozenset("""
+a an and are as at be by does did do for from has have how in is it its of on or the this that these those
+to was were what when where which who whom why will with would can could should following best most
+""".split())
+
+
+def question_text(question: Dict) -> str:
+    """Text that identifies a question: the stem plus its correct option"""
+    options = question.get("options") or {}
+    correct = options.get(question.get("correct_answer"), "") if isinstance(options, dict) else ""
+    return f"{question.get('question', '')} {correct}"
+
+
+def content_words(text: str) -> FrozenSet[str]:
+    """Lower-cased words minus stopwords, with a naive plural strip (cells -> cell)"""
+    words = set()
+    for word in _word.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_hashes(word: str, digest_size: int) -> array:
+    # Banks from one document reuse a small vocabulary, so most words hit the cache
+    return array("I", hashlib.shake_128(word.encode()).digest(digest_size))
+
+
+class Signature:
+    """MinHash signature plus the question's numbers (which must match exactly)"""
+    __slots__ = ("minhash", "numbers")
+
+    def __init__(self, minhash: Tuple[int, ...], numbers: FrozenSet[str]):
+        self.minhash = minhash
+        self.numbers = numbers
+
+    def similarity(self, other: "Signature") -> float:
+        """Estimated Jaccard similarity of the two word sets"""
+        same = sum(map(operator.eq, self.minhash, other.minhash))
+        return same / len(self.minhash)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH (banding) index for rephrased questions.
+
+    Each question is reduced to its set of content words and summarized by a
+    `bands * rows` MinHash signature. Signatures are split into bands, and each
+    band is a Hash Map key; questions sharing any band become candidates, and a
+    candidate is a near-duplicate when its estimated Jaccard similarity is at
+    least `threshold` and both mention the same numbers ("2 + 2" vs "3 + 3").
+
+    With the default 16 bands x 4 rows, pairs at Jaccard 0.8 collide in some
+    band with probability > 0.99, pairs at 0.3 with ~0.12.
+
+    Questions from one document share phrasing ("Which of the following describes
+    ..."), so some band buckets grow with the bank. Two things keep lookups flat:
+    the question's numbers are part of every band key (they must match anyway), and
+    find() checks only the `bucket_candidates` most recently added keys of a bucket.
+    A true near-duplicate matches in several bands (~6 of 16 at Jaccard 0.8), so it
+    is still found through the smaller buckets.
+
+    Time Complexity:
+    - signature: O(w * bands * rows) where w = words in the question (min over words runs in C)
+    - add: O(bands)
+    - find: O(bands * bucket_candidates) worst case, independent of bank size; stops
+      after the first band with a match
+    """
+    def __init__(self, threshold: float = 0.6, bands: int = 16, rows: int = 4, bucket_candidates: int = 8):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.bucket_candidates = bucket_candidates
+        self._digest_size = bands * rows * 4
+        self._buckets: List[Dict[int, List]] = [{} for _ in range(bands)]  # hash(band rows, numbers) -> keys
+        self.signatures: Dict = {}  # key -> Signature
+
+    def signature(self, question: Dict) -> Signature:
+        words = content_words(question_text(question))
+        numbers = frozenset(w for w in words if w.isdigit())
+        # One extendable-output hash per word gives all bands * rows independent 32-bit hash values
+        hashed = [_word_hashes(w, self._digest_size) for w in words]
+        minhash = tuple(map(min, zip(*hashed))) if hashed else (0,) * (self.bands * self.rows)
+        return Signature(minhash, numbers)
+
+    def _bands(self, signature: Signature):
+        # Keys are plain ints (hash of the band's rows + numbers): no per-key tuples for
+        # the GC to track; a rare hash collision only adds a candidate that find() rejects
+        rows, numbers, minhash = self.rows, signature.numbers, signature.minhash
+        for band in range(self.bands):
+            yield band, hash((minhash[band * rows:(band + 1) * rows], numbers))
+
+    def add(self, key, signature: Signature):
+        self.signatures[key] = signature
+        for band, value in self._bands(signature):
+            self._buckets[band].setdefault(value, []).append(key)
+
+    def find(self, signature: Signature) -> Optional[Tuple[object, float]]:
+        """Return (key, similarity) of an indexed near-duplicate (the closest in the first matching band), or None"""
+        best = None
+        checked = set()
+        for band, value in self._bands(signature):
+            bucket = self._buckets[band].get(value)
+            if not bucket:
+                continue
+            for key in bucket[-self.bucket_candidates:]:  # numbers already match: they are in the key
+                if key in checked:
+                    continue
+                checked.add(key)
+                similarity = signature.similarity(self.signatures[key])
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (key, similarity)
+            if best is not None:
+                return best  # closest in the first band with a match; later bands rarely beat it
+        return best
+
+    def copy(self) -> "NearDuplicateIndex":
+        """Independent copy; signatures are immutable and shared - O(n * bands) references"""
+        clone = NearDuplicateIndex(self.threshold, self.bands, self.rows, self.bucket_candidates)
+        clone._buckets = [{value: list(keys) for value, keys in bucket.items()} for bucket in self._buckets]
+        clone.signatures = dict(self.signatures)
+        return clone
+
+    def __getstate__(self):
+        # Band keys come from hash(), which is salted per process: pickle the signatures
+        # (in insertion order) and rebuild the buckets on load
+        state = dict(self.__dict__)
+        del state["_buckets"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._buckets = [{} for _ in range(self.bands)]
+        for key, signature in self.signatures.items():
+            for band, value in self._bands(signature):
+                self._buckets[band].setdefault(value, []).append(key)
+
+    def __len__(self):
+        return len(self.signatures)
@@ -0,0 +1,131 @@
+import random
+import re
+from typing import Dict, Tuple
+
+VARIANT_SEPARATOR = "~"
+# Letter references in explanations that must follow the shuffle: "Option B", "answer (C)",
+# "the answer is D", "answer: A", "(B)", "C is correct"; the letter is the only capture
+_LETTER_REFERENCE = re.compile(
+    r"\b(?:[Oo]ptions?|[Aa]nswers?|[Cc]hoices?)(?:\s+(?:is|was))?\s*:?\s*\(?([A-Z])\b"
+    r"|\(([A-Z])\)"
+    r"|\b([A-Z])(?=\s+(?:is|was|would\s+be)\s+(?:the\s+)?(?:correct|incorrect|wrong|right|best|only|true|false)\b)"
+)
+# Any other standalone capital letter ("B and D both mention ...") may be an option reference
+# that can't be remapped; "A" before a lower-case word is the article
+_BARE_LETTER = re.compile(r"(?<![-'])\b([A-Z])\b(?![-'])(?!(?<=A)\s+[a-z0-9])")
+
+# Options whose meaning depends on where they are or on other options' letters:
+# "All/None of the above", "Both A and B", "Option C", "(a) and (b)"
+_POSITIONAL_OPTION = re.compile(
+    r"\b(?:all|none|both|neither|either|any)\s+of\s+(?:the\s+)?(?:above|below|these|those|preceding|"
+    r"(?:the\s+)?(?:options|choices|answers))\b"
+    r"|\b[A-H]\s*(?:,|&|and|or|nor)\s*[A-H]\b"
+    r"|\b(?:[Oo]ptions?|[Cc]hoices?|[Aa]nswers?)\s+\(?[A-H]\b"
+    r"|\([a-hA-H]\)\s*(?:,|&|and|or|nor)",
+    re.IGNORECASE
+)
+
+
+def is_positional(question: Dict) -> bool:
+    """True when an option refers to other options by position or letter, so the order must stay"""
+    options = question.get('options') or {}
+    return any(isinstance(text, str) and _POSITIONAL_OPTION.search(text) for text in options.values())
+
+
+def has_unmapped_letters(question: Dict) -> bool:
+    """True when the explanation mentions an option letter in a form that can't be remapped safely"""
+    explanation = question.get('explanation')
+    if not isinstance(explanation, str) or not explanation:
+        return False
+    options = question.get('options') or {}
+    remaining = _LETTER_REFERENCE.sub(" ", explanation)
+    return any(match.group(1) in options for match in _BARE_LETTER.finditer(remaining))
+
+
+def variant_id(question_id: str, variant: int) -> str:
+    return question_id if variant == 0 else f"{question_id}{VARIANT_SEPARATOR}{variant}"
+
+
+def split_variant_id(question_id: str) -> Tuple[str, int]:
+    """'<id>~2' -> ('<id>', 2); plain ids are variant 0"""
+    base, separator, variant = question_id.rpartition(VARIANT_SEPARATOR)
+    if separator and variant.isdigit():
+        return base, int(variant)
+    return question_id, 0
+
+
+def variant_count(question: Dict) -> int:
+    """
+    Distinct variants of a question: one per position of the correct answer. Only the
+    original if an option is positional or the explanation names letters ambiguously.
+    """
+    if is_positional(question) or has_unmapped_letters(question):
+        return 1
+    return max(len(question.get('options') or {}), 1)
+
+
+def option_variant(question: Dict, variant: int) -> Dict:
+    """
+    Deterministic option permutation of `question`, computed on the fly (nothing stored).
+
+    Variant v moves the correct answer v letters along (mod number of options), so
+    the n variants of an n-option question all have the answer in a different place;
+    distractors are shuffled with a seed of (question id, v). Variant 0 is the
+    question itself, and the only variant of a positional question ("All of the
+    above", "Both A and B") or of one whose explanation mentions letters in a form
+    that can't be remapped. correct_answer and letter references in the explanation
+    are remapped.
+
+    Time Complexity: O(o + e) for o options and an explanation of length e
+    """
+    variant %= variant_count(question)
+    if variant == 0:
+        return question
+
+    letters = list(question['options'])
+    correct = question['correct_answer']
+    if correct not in question['options']:
+        return question
+    distractors = [letter for letter in letters if letter != correct]
+    random.Random(f"{question['id']}:{variant}").shuffle(distractors)
+
+    correct_slot = (letters.index(correct) + variant) % len(letters)
+    order = distractors[:correct_slot] + [correct] + distractors[correct_slot:]
+    remap = {old: new for new, old in zip(letters, order)}  # original letter -> shown letter
+
+    def _remap_reference(match):
+        group = next(i for i in (1, 2, 3) if match.group(i) is not None)
+        shown = remap.get(match.group(group))
+        if shown is None:
+            return match.group(0)
+        start, end = match.start(group) - match.start(), match.end(group) - match.start()
+        return match.group(0)[:start] + shown + match.group(0)[end:]
+
+    return {
+        **question,
+        'id': variant_id(question['id'], variant),
+        'options': {new: question['options'][old] for new, old in zip(letters, order)},
+        'correct_answer': remap[correct],
+        'explanation': _LETTER_REFERENCE.sub(_remap_reference, question.get('explanation', '')),
+    }
+
+
+class VariantCounter:
+    """
+    Times each bank position has been served in a session, one byte per question.
+    The (question, permutation) pairs already used are exactly {(p, v): v < count[p]},
+    so the next serve of p uses variant count[p] mod n - no per-pair set.
+
+    Time Complexity: O(1) per serve
+    """
+    __slots__ = ("counts",)
+
+    def __init__(self):
+        self.counts = bytearray()
+
+    def next_variant(self, position: int, variants: int) -> int:
+        if position >= len(self.counts):
+            self.counts.extend(bytes(position - len(self.counts) + 1))
+        served = self.counts[position]
+        self.counts[position] = (served + 1) % 256
+        return served % variants
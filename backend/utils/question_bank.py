@@ -0,0 +1,97 @@
+import hashlib
+import re
+from typing import Collection, Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from models.model import QuizQuestion
+from utils.helpers import validate_question
+
+_question_list = TypeAdapter(list[QuizQuestion])
+_whitespace = re.compile(r"\s+")
+
+
+def _clean(text) -> str:
+    return _whitespace.sub(" ", str(text)).strip()
+
+
+def normalize_question(question: QuizQuestion) -> Dict:
+    """Collapse whitespace, upper-case the answer letter and order options A-D first"""
+    options = {str(k).strip().upper(): _clean(v) for k, v in question.options.items()}
+    ordered = {k: options[k] for k in sorted(options, key=lambda k: (k not in "ABCD", k))}
+    normalized = {
+        "question": _clean(question.question),
+        "options": ordered,
+        "correct_answer": question.correct_answer.strip().upper(),
+        "explanation": _clean(question.explanation),
+    }
+    if question.topic and question.topic.strip():
+        normalized["topic"] = _clean(question.topic)
+    normalized["id"] = question_hash(normalized)
+    return normalized
+
+
+def question_hash(question: Dict) -> str:
+    """
+    Content hash of normalized question text + options (case-insensitive).
+    Identical questions from different uploads share an id.
+    """
+    options = "\x1f".join(f"{k}={v.casefold()}" for k, v in sorted(question["options"].items()))
+    key = f"{question['question'].casefold()}\x1e{options}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _format_error(error: Dict) -> str:
+    field = ".".join(str(part) for part in error["loc"][1:]) or "item"
+    return f"{field}: {error['msg']}"
+
+
+def ingest_questions(raw_questions: List, existing_ids: Optional[Collection[str]] = None) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    Validate, normalize and dedupe an uploaded question list.
+
+    Validation runs over the whole list in one pydantic pass; only when some
+    items fail is the remaining (valid) subset validated again.
+
+    Time Complexity: O(n) where n = len(raw_questions), independent of the existing bank size
+    (hash Set lookups are O(1))
+
+    Args:
+        raw_questions: Questions as received from the client
+        existing_ids: Ids already in the bank (append mode) - treated as duplicates.
+            Any container with O(1) membership (e.g. the bank's id -> position map); not copied
+
+    Returns:
+        (accepted questions, per-item errors, duplicates) where errors are
+        {"index", "errors"} and duplicates are {"index", "id"}
+    """
+    if not isinstance(raw_questions, list):
+        return [], [{"index": None, "errors": ["questions must be a list"]}], []
+
+    errors_by_index: Dict[int, List[str]] = {}
+    try:
+        parsed = _question_list.validate_python(raw_questions)
+        candidates = list(enumerate(parsed))
+    except ValidationError as e:
+        for error in e.errors():
+            errors_by_index.setdefault(error["loc"][0], []).append(_format_error(error))
+        good = [i for i in range(len(raw_questions)) if i not in errors_by_index]
+        candidates = list(zip(good, _question_list.validate_python([raw_questions[i] for i in good])))
+
+    existing_ids = existing_ids or ()
+    seen = set()
+    accepted, duplicates = [], []
+    for index, question in candidates:
+        normalized = normalize_question(question)
+        problem = validate_question(normalized)
+        if problem:
+            errors_by_index.setdefault(index, []).append(problem)
+            continue
+        if normalized["id"] in seen or normalized["id"] in existing_ids:
+            duplicates.append({"index": index, "id": normalized["id"]})
+            continue
+        seen.add(normalized["id"])
+        accepted.append(normalized)
+
+    errors = [{"index": i, "errors": errs} for i, errs in sorted(errors_by_index.items())]
+    return accepted, errors, duplicates
@@ -1,51 +1,97 @@
 from datetime import datetime
 from collections import deque
+import functools
+import logging
+import os
 import random
-from typing import List, Dict, Optional, Any
+import threading
+import time
+from typing import List, Dict, Optional, Any, Callable, Tuple
+from utils.adaptive import FenwickSampler, MasteryTracker
+from utils.bank_library import BankLibrary, QuestionBank, UsedBitmap
+from utils.near_duplicate import NearDuplicateIndex
+from utils.option_variants import VariantCounter, option_variant, split_variant_id, variant_count
+from utils.question_bank import ingest_questions
+from utils.review_scheduler import ReviewScheduler, sm2_quality
+from utils.topic_index import bitmap_positions
+
+logger = logging.getLogger(__name__)
+
+# Serve repeat appearances of a question with its options permuted (see utils/option_variants.py)
+OPTION_VARIANTS = os.getenv("QUIZ_OPTION_VARIANTS", "true").lower() == "true"
+
+
+def synchronized(method):
+    """Run a QuizManager method under the manager's lock (request handlers and the pool refiller share it)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class QuestionCache:
     """
     Hash Map data structure to cache questions from uploaded files
     Allows multiple quiz generations without re-uploading
+    Sessions hold a reference to a shared QuestionBank, not their own copy
     Time Complexity: O(1) for get/set operations
     """
     def __init__(self):
         self.cache: Dict[str, Dict[str, Any]] = {}
+        self.sources: Dict[str, str] = {}  # document text per session, for background refills (opt-in)
     
-    def store_questions(self, session_id: str, questions: List[Dict], metadata: Optional[Dict] = None):
+    def store_bank(self, session_id: str, bank: QuestionBank, metadata: Optional[Dict] = None):
         """
-        Store questions in cache with O(1) complexity
+        Point the session at a question bank with O(1) complexity
         
         Args:
             session_id: Unique session identifier
-            questions: List of question objects
+            bank: Shared question bank (from BankLibrary)
             metadata: Additional file information
         """
         self.cache[session_id] = {
-            'questions': questions,
+            'bank': bank,
             'metadata': metadata or {},
             'timestamp': datetime.now().isoformat(),
-            'total_questions': len(questions)
+            'total_questions': len(bank)
         }
-        print(f"[CACHE] Stored {len(questions)} questions for session {session_id}")
+        logger.info("Stored %d questions", len(bank), extra={
+            "event": "cache.stored", "session_id": session_id,
+            "total_questions": len(bank), "bank_id": bank.bank_id
+        })
+
+    def get_bank(self, session_id: str) -> Optional[QuestionBank]:
+        entry = self.cache.get(session_id)
+        return entry['bank'] if entry else None
     
     def get_questions(self, session_id: str) -> List[Dict]:
         """Retrieve all questions with O(1) lookup"""
-        return self.cache.get(session_id, {}).get('questions', [])
+        bank = self.get_bank(session_id)
+        return bank.questions if bank is not None else []
     
     def has_questions(self, session_id: str) -> bool:
         """Check if session has cached questions"""
-        return session_id in self.cache and len(self.cache[session_id].get('questions', [])) > 0
+        bank = self.get_bank(session_id)
+        return bank is not None and len(bank) > 0
     
     def get_metadata(self, session_id: str) -> Dict:
         """Get cached session metadata"""
         return self.cache.get(session_id, {}).get('metadata', {})
     
+    def set_source(self, session_id: str, text: str):
+        """Keep the document text questions are generated from, so the pool can be refilled"""
+        self.sources[session_id] = text
+
+    def get_source(self, session_id: str) -> Optional[str]:
+        return self.sources.get(session_id)
+
     def clear_session(self, session_id: str):
         """Remove session from cache"""
+        self.sources.pop(session_id, None)
         if session_id in self.cache:
             del self.cache[session_id]
-            print(f"[CACHE] Cleared session {session_id}")
+            logger.info("Cleared session", extra={"event": "cache.cleared", "session_id": session_id})
 
 
 class QuizQueue:
@@ -150,81 +196,252 @@ class QuizManager:
     - Hash Map (QuestionCache) for O(1) question storage and retrieval
     - Queue (QuizQueue) using collections.deque for FIFO question management - O(1) enqueue/dequeue
     - Stack (QuizHistory) using list for LIFO quiz attempt tracking - O(1) push/pop
-    - Set for tracking used questions with O(1) lookup and add operations
+    - Bitmap (UsedBitmap) for tracking used questions with O(1) lookup and add operations
+    - Content-addressed library (BankLibrary) of shared, immutable question banks; each bank
+      carries its MinHash/LSH index (NearDuplicateIndex) grouping rephrased questions into clusters
+    - Hash Map (MasteryTracker) of per-question mastery + Fenwick tree (FenwickSampler)
+      for adaptive, weighted selection
+    - Min-heap (ReviewScheduler) of SM-2 due times for spaced-repetition review quizzes
+    - Byte counter per position (VariantCounter): each repeat serve of a question shows
+      the next deterministic option permutation, computed on the fly
     
     Time Complexity Overview:
-    - upload_and_cache_questions: O(n) where n = number of questions (one-time setup)
-    - generate_new_quiz: O(k) where k = num_questions requested (Set operations are O(1))
-    - submit_quiz_results: O(1) - Stack push operation
+    - upload_and_cache_questions: O(n) where n = number of questions (one-time setup);
+      O(1) when attaching an existing bank by id
+    - generate_new_quiz: O(k) where k = num_questions requested (Bitmap operations are O(1));
+      adaptive mode O(k log n)
+    - submit_quiz_results: O(1) - Stack push operation (+ O(log n) per answer with mastery tracking)
+    - generate_review_quiz: O(k log r) where r = scheduled questions (heap pops)
     - get_session_stats: O(m) where m = number of quiz attempts (for averaging)
-    - reset_session: O(1) - Dictionary/Set clearing operations
+    - reset_session: O(1) - Dictionary/Bitmap clearing operations
     """
-    def __init__(self):
+    def __init__(self, option_variants: bool = OPTION_VARIANTS):
         self.question_cache = QuestionCache()  # Hash Map for O(1) storage/retrieval
         self.quiz_history = QuizHistory()  # Stack (list) for LIFO history tracking
         self.quiz_queues: Dict[str, QuizQueue] = {}  # Queue per session for FIFO distribution
-        self.used_questions: Dict[str, set] = {}  # Set data structure for O(1) lookup
-    
-    def upload_and_cache_questions(self, session_id: str, questions: List[Dict], metadata: Optional[Dict] = None):
+        self.used_questions: Dict[str, UsedBitmap] = {}  # Bitmap over bank positions for O(1) lookup
+        self.bank_library = BankLibrary()  # banks shared by sessions, stored once
+        self.mastery: Dict[str, MasteryTracker] = {}  # per-question mastery per session
+        self.samplers: Dict[str, FenwickSampler] = {}  # adaptive selection weights, built on first use
+        self.review_schedules: Dict[str, ReviewScheduler] = {}  # SM-2 due-time heap per session
+        self.option_variants = option_variants
+        self.variant_counters: Dict[str, VariantCounter] = {}  # serves per position -> next permutation
+        self.journal: Optional[Callable[[str, Dict], None]] = None  # mutation log for warm restarts (utils/snapshot.py)
+        self._lock = threading.RLock()
+
+    @property
+    def lock(self) -> threading.RLock:
+        """The manager's lock, for callers that must mutate other stores in step with it"""
+        return self._lock
+
+    def _journal(self, op: str, **payload):
+        # Called with the lock held, after the mutation succeeded
+        if self.journal is not None:
+            self.journal(op, payload)
+
+    def near_duplicate_index(self, session_id: str) -> Optional[NearDuplicateIndex]:
+        """The session bank's near-duplicate index, e.g. to filter newly generated questions"""
+        bank = self.question_cache.get_bank(session_id)
+        return bank.near_duplicates if bank is not None else None
+
+    def _positions(self, session_id: str) -> Dict[str, int]:
+        bank = self.question_cache.get_bank(session_id)
+        return bank.positions if bank is not None else {}
+
+    def _render(self, session_id: str, questions: List[Dict], indices: List[int]) -> List[Dict]:
+        """
+        Questions to serve for bank positions: a question's first serve is the original,
+        each later serve the next option permutation (a new dict; the bank is untouched).
+        Once every permutation has been shown the cycle starts again.
+
+        Time Complexity: O(k) for k positions
         """
-        Upload and cache questions using Hash Map data structure.
-        Also initializes Queue and Set tracking for the session.
+        # Selection state (used flags, variant counters) changes with every serve;
+        # the journal gets the used-flag delta, O(k) rather than O(bank size)
+        used = self.used_questions.get(session_id)
+        self._journal("serve", session_id=session_id, indices=list(indices),
+                      used=used.take_changes() if used is not None else None)
+        if not self.option_variants:
+            return [questions[i] for i in indices]
+        counter = self.variant_counters.setdefault(session_id, VariantCounter())
+        rendered = []
+        for i in indices:
+            question = questions[i]
+            rendered.append(option_variant(question, counter.next_variant(i, variant_count(question))))
+        return rendered
+
+    @synchronized
+    def set_source(self, session_id: str, text: str):
+        """Keep the document text for background refills of the session (see QuestionCache.set_source)"""
+        self.question_cache.set_source(session_id, text)
+        self._journal("source", session_id=session_id, text=text)
+
+    def _lookup(self, session_id: str, question_id: str) -> Tuple[Optional[Dict], str]:
+        """(question as served, bank question id) for a possibly variant id - O(1)"""
+        base_id, variant = split_variant_id(question_id)
+        bank = self.question_cache.get_bank(session_id)
+        position = bank.positions.get(base_id) if bank is not None else None
+        if position is None:
+            return None, base_id
+        return option_variant(bank.questions[position], variant), base_id
+
+    @synchronized
+    def upload_and_cache_questions(self, session_id: str, questions: List[Dict], metadata: Optional[Dict] = None,
+                                   append: bool = False, drop_near_duplicates: bool = False):
+        """
+        Validate, normalize and dedupe questions, then cache them using Hash Map data structure.
+        Identical uploads (from any session) resolve to one shared bank in the library.
+        Also initializes Queue and Bitmap tracking for the session.
         
         Time Complexity: O(n) where n = len(questions)
-        - Hash Map insertion: O(1) per question (amortized)
-        - Queue initialization: O(n)
-        - Set initialization: O(1)
+        - Validation + dedupe: O(n) single pass (Set of content hashes)
+        - Bank lookup by content hash: O(n) to hash, O(1) lookup; near-duplicate
+          clustering O(n) only for content not in the library yet
+        - Hash Map insertion: O(1)
+        - Queue update: O(n) for appended questions (built lazily otherwise)
+        - Bitmap initialization: O(1)
         
         Args:
             session_id: Unique session identifier
-            questions: List of question dictionaries
+            questions: List of question dictionaries (raw, as uploaded)
             metadata: Optional metadata about the uploaded file
+            append: If True, add to the session's existing bank instead of replacing it
+                    (used-question tracking is kept; a bank shared with other sessions is
+                    copied first, copy-on-write)
+            drop_near_duplicates: If True, rephrasings of questions already in the bank (or
+                    earlier in the upload) are rejected; otherwise they are kept but never
+                    drawn together or after one another (see generate_new_quiz)
         
         Returns:
-            Dictionary with success status and caching information
+            Dictionary with success status, caching information and per-item errors
         """
-        # Store in Hash Map - O(1) average case insertion
-        self.question_cache.store_questions(session_id, questions, metadata)
-        
-        # Initialize Queue with question indices for FIFO distribution - O(n)
-        # Using collections.deque for O(1) enqueue/dequeue operations
-        # Store indices to enable tracking via Set
-        indices = list(range(len(questions)))
-        random.shuffle(indices)  # Shuffle for variety before FIFO distribution
-        # Wrap indices in dict format for Queue compatibility
-        index_items = [{'index': idx} for idx in indices]
-        self.quiz_queues[session_id] = QuizQueue(index_items)
+        current = self.question_cache.get_bank(session_id)
+        parent = current if append and current is not None and len(current) else None
+        accepted, errors, duplicates = ingest_questions(questions, parent.positions if parent else None)
+
+        report = {
+            'accepted': 0,
+            'near_duplicates': 0,
+            'duplicates': len(duplicates),
+            'duplicate_indices': [d['index'] for d in duplicates],
+            'rejected': len(errors),
+            'errors': errors,
+        }
+
+        if not accepted and parent is None:
+            return {
+                'success': False,
+                'error': 'No valid questions in upload',
+                'session_id': session_id,
+                **report
+            }
+
+        bank = self.bank_library.build(accepted, drop_near_duplicates, parent) if accepted else parent
+        if accepted:
+            report['accepted'] = bank.build_report['added']
+            report['near_duplicates'] = bank.build_report['near_duplicates']
+
+        if parent is not None:
+            metadata = {**self.question_cache.get_metadata(session_id), **(metadata or {})}
+        self._attach(session_id, bank, metadata, previous_size=len(parent) if parent else None)
+        self._journal("upload", session_id=session_id, questions=questions, metadata=metadata, append=append,
+                      drop_near_duplicates=drop_near_duplicates)
         
-        # Initialize Set for tracking used questions - O(1) lookup
-        self.used_questions[session_id] = set()
+        return {
+            'success': True,
+            'total_questions': len(bank),
+            'session_id': session_id,
+            'bank_id': bank.bank_id,
+            'message': f'Cached {len(bank)} questions ({report["accepted"]} new). Ready to generate quizzes.',
+            **report
+        }
+
+    @synchronized
+    def attach_bank(self, session_id: str, bank_id: str, metadata: Optional[Dict] = None) -> Dict:
+        """
+        Start a session on a bank already in the library (e.g. an instructor's upload)
+        without sending the questions again.
         
+        Time Complexity: O(1)
+        """
+        bank = self.bank_library.get(bank_id)
+        if bank is None:
+            return {'success': False, 'error': 'Unknown bank id', 'session_id': session_id}
+        self._attach(session_id, bank, metadata)
+        self._journal("attach", session_id=session_id, bank_id=bank_id, metadata=metadata)
         return {
             'success': True,
-            'total_questions': len(questions),
+            'total_questions': len(bank),
             'session_id': session_id,
-            'message': f'Cached {len(questions)} questions. Ready to generate quizzes.'
+            'bank_id': bank.bank_id,
+            'message': f'Attached bank with {len(bank)} questions. Ready to generate quizzes.'
         }
+
+    def _attach(self, session_id: str, bank: QuestionBank, metadata: Optional[Dict],
+                previous_size: Optional[int] = None):
+        """
+        Point the session at `bank` and adjust its per-session state. previous_size is
+        set when `bank` extends the session's previous bank (append), so positions
+        below it are unchanged and used/adaptive state carries over.
+        """
+        current = self.question_cache.get_bank(session_id)
+        if bank is not current:
+            self.bank_library.acquire(bank)
+            if current is not None:
+                self.bank_library.release(current)
+
+        # Store reference in Hash Map - O(1)
+        self.question_cache.store_bank(session_id, bank, metadata)
+
+        if previous_size is None:
+            # New content: fresh Bitmap, Queue/sampler rebuilt lazily on first quiz - O(1)
+            self.used_questions[session_id] = UsedBitmap()
+            self.quiz_queues.pop(session_id, None)
+            self.samplers.pop(session_id, None)
+            self.variant_counters.pop(session_id, None)
+            return
+
+        # Appended questions join the FIFO Queue and adaptive weights - O(new questions)
+        new_positions = list(range(previous_size, len(bank)))
+        random.shuffle(new_positions)
+        if session_id in self.quiz_queues:
+            for idx in new_positions:
+                self.quiz_queues[session_id].enqueue({'index': idx})  # O(1) each
+        self.used_questions.setdefault(session_id, UsedBitmap())
+        sampler = self.samplers.get(session_id)
+        if sampler is not None:
+            mastery = self.mastery.get(session_id) or MasteryTracker()
+            for question in bank.questions[len(sampler):]:
+                sampler.append(mastery.weight(question['id']))  # O(log n)
     
-    def generate_new_quiz(self, session_id: str, num_questions: int = 10, allow_repeats: bool = False) -> Dict:
+    @synchronized
+    def generate_new_quiz(self, session_id: str, num_questions: int = 10, allow_repeats: bool = False,
+                          mode: str = "random", topics: Optional[List[str]] = None) -> Dict:
         """
-        Generate new quiz from cached questions using Queue (FIFO) and Set data structures.
+        Generate new quiz from cached questions using Queue (FIFO) and Bitmap data structures.
         No file upload required - questions are retrieved from Hash Map cache.
         
         Time Complexity: O(k) where k = num_questions
         - Hash Map lookup: O(1)
         - Queue dequeue operations: O(1) each
-        - Set lookups and additions: O(1) each
+        - Bitmap lookups and additions: O(1) each
         - Overall: O(k) for k questions
         
         Data Structures Used:
         1. Hash Map (QuestionCache): O(1) question retrieval
         2. Queue (QuizQueue): O(1) FIFO question distribution
-        3. Set (used_questions): O(1) duplicate checking
+        3. Bitmap (used_questions): O(1) duplicate checking
+        4. Cluster map (bank.cluster_members): drawing a question also marks its near-duplicates
+           as selected/used, so rephrasings never appear in the same or a later quiz
         
         Args:
             session_id: Session identifier
             num_questions: Number of questions to generate
             allow_repeats: If True, allows previously used questions
+            mode: "random" (uniform over unused questions) or "adaptive" (weighted towards
+                  missed and unseen questions, see _select_adaptive)
+            topics: Only draw questions matching one of these topics/keywords
+                    (see _select_by_topics)
         
         Returns:
             Dictionary with quiz questions, metadata, and remaining pool size
@@ -236,20 +453,28 @@ class QuizManager:
                 'error': 'No questions found in cache. Please upload a file first.'
             }
         
-        all_questions = self.question_cache.get_questions(session_id)  # Hash Map get - O(1)
+        bank = self.question_cache.get_bank(session_id)  # Hash Map get - O(1)
+        all_questions = bank.questions
         
-        # Get or initialize Set for tracking used question indices - O(1) lookup
+        # Get or initialize Bitmap for tracking used question indices - O(1) lookup
         if session_id not in self.used_questions:
-            self.used_questions[session_id] = set()
+            self.used_questions[session_id] = UsedBitmap()
         
-        used_indices = self.used_questions[session_id]  # Set for O(1) lookup
+        used_indices = self.used_questions[session_id]  # Bitmap for O(1) lookup
+        clusters = bank.clusters
+        cluster_members = bank.cluster_members
+
+        if topics:
+            return self._select_by_topics(session_id, bank, topics, num_questions, allow_repeats)
+        if mode == "adaptive":
+            return self._select_adaptive(session_id, bank, num_questions, allow_repeats)
         
         # Build available indices list (questions not yet used)
         # If allow_repeats, all indices are available
         if allow_repeats:
             available_indices = list(range(len(all_questions)))
         else:
-            # Filter out used indices - Set lookup is O(1) per check
+            # Filter out used indices - Bitmap lookup is O(1) per check
             available_indices = [i for i in range(len(all_questions)) if i not in used_indices]
         
         # Edge case: No available questions
@@ -259,7 +484,8 @@ class QuizManager:
                 available_indices = list(range(len(all_questions)))
             else:
                 # Pool exhausted - reset for fresh questions
-                print(f"[QUIZ] Question pool exhausted. Resetting for session {session_id}")
+                logger.info("Question pool exhausted, resetting",
+                            extra={"event": "quiz.pool_reset", "session_id": session_id})
                 used_indices.clear()
                 available_indices = list(range(len(all_questions)))
         
@@ -278,7 +504,8 @@ class QuizManager:
         # Cap num_questions to available pool size
         max_possible = len(all_questions)
         if num_questions > max_possible:
-            print(f"[QUIZ] Requested {num_questions} questions but only {max_possible} available. Capping to {max_possible}.")
+            logger.debug("Requested %d questions but only %d available, capping", num_questions, max_possible,
+                         extra={"event": "quiz.capped", "session_id": session_id})
             num_questions = max_possible
         
         # Build list of available question indices based on allow_repeats setting
@@ -291,7 +518,9 @@ class QuizManager:
             
             # If not enough unique questions available, reset the pool
             if len(available_indices) < num_questions:
-                print(f"[QUIZ] Only {len(available_indices)} unused questions available, need {num_questions}. Resetting pool.")
+                logger.info("Only %d unused questions available, need %d; resetting pool",
+                            len(available_indices), num_questions,
+                            extra={"event": "quiz.pool_reset", "session_id": session_id})
                 used_indices.clear()
                 available_indices = list(range(len(all_questions)))
         
@@ -313,7 +542,8 @@ class QuizManager:
                 
                 if not remaining:
                     # All questions already selected in this quiz - shouldn't happen but reset pool
-                    print(f"[QUIZ] All questions selected. Resetting used_indices.")
+                    logger.debug("All questions selected, resetting used indices",
+                                 extra={"event": "quiz.pool_reset", "session_id": session_id})
                     if not allow_repeats:
                         used_indices.clear()
                     remaining = [i for i in range(len(all_questions)) if i not in selected_set]
@@ -338,20 +568,32 @@ class QuizManager:
             # Mark as used across quizzes if no repeats allowed
             if not allow_repeats:
                 used_indices.add(question_idx)  # O(1) add
+
+            # Near-duplicates of the drawn question count as drawn too
+            if cluster_members and question_idx < len(clusters):
+                for sibling in cluster_members.get(clusters[question_idx], ()):
+                    selected_set.add(sibling)
+                    if not allow_repeats:
+                        used_indices.add(sibling)
         
         # Validate we got the right number
         if len(selected_indices) != num_questions:
-            print(f"[WARNING] Generated {len(selected_indices)} questions (requested {num_questions})")
+            logger.warning("Generated %d questions (requested %d)", len(selected_indices), num_questions,
+                           extra={"event": "quiz.short", "session_id": session_id})
         
-        # Convert indices to actual questions - O(k) where k = num_questions
-        selected_questions = [all_questions[i] for i in selected_indices]
+        # Convert indices to actual questions (repeats as option permutations) - O(k) where k = num_questions
+        selected_questions = self._render(session_id, all_questions, selected_indices)
         
         # Shuffle final selection for variety
         random.shuffle(selected_questions)
         
-        print(f"[QUIZ] Generated quiz with {len(selected_questions)} questions for session {session_id}")
-        print(f"[QUIZ] Selected {len(selected_indices)} unique questions (requested {num_questions}, total available: {len(all_questions)})")
-        print(f"[QUIZ] Using Set (O(1) lookup) data structure for duplicate prevention")
+        logger.info("Generated quiz", extra={
+            "event": "quiz.generated",
+            "session_id": session_id,
+            "selected": len(selected_indices),
+            "requested": num_questions,
+            "pool_size": len(all_questions),
+        })
         
         return {
             'success': True,
@@ -361,7 +603,252 @@ class QuizManager:
             'questions_remaining_in_pool': len(all_questions) - len(used_indices) if not allow_repeats else len(all_questions)
         }
     
-    def submit_quiz_results(self, session_id: str, quiz_data: Dict):
+    def _select_by_topics(self, session_id: str, bank: QuestionBank, topics: List[str],
+                          num_questions: int, allow_repeats: bool) -> Dict:
+        """
+        Draw from the questions matching `topics` using the bank's inverted index:
+        the topic bitmap is ANDed with NOT(used bitmap), so only matching, unused
+        positions are ever materialized. When fewer unused matches remain than
+        requested, used matches top the quiz up (the rest of the pool is untouched).
+
+        Time Complexity: O(n / 64) word operations for the bitmap intersection
+        + O(m) for the m matching positions
+        """
+        all_questions = bank.questions
+        clusters = bank.clusters
+        cluster_members = bank.cluster_members
+        used_indices = self.used_questions[session_id]
+
+        matched = bank.topics.match(topics)
+        if matched is None:
+            return {'success': False, 'error': 'Topics must contain at least one keyword'}
+        if not matched:
+            return {'success': False, 'error': f'No questions match topics: {", ".join(topics)}'}
+
+        candidates = matched if allow_repeats else matched & ~used_indices.as_int()
+        available = bitmap_positions(candidates)
+        random.shuffle(available)
+        if len(available) < num_questions and not allow_repeats:
+            # Top up with matching questions from earlier quizzes
+            fallback = bitmap_positions(matched & ~candidates)
+            random.shuffle(fallback)
+            available.extend(fallback)
+
+        selected_indices, selected_set = [], set()
+        for question_idx in available:
+            if len(selected_indices) >= num_questions:
+                break
+            if question_idx in selected_set:
+                continue
+            selected_indices.append(question_idx)
+            selected_set.add(question_idx)
+            if question_idx < len(clusters):
+                selected_set.update(cluster_members.get(clusters[question_idx], ()))
+        if not allow_repeats:
+            used_indices.update(selected_indices)
+            for question_idx in selected_indices:
+                if question_idx < len(clusters):
+                    used_indices.update(cluster_members.get(clusters[question_idx], ()))
+
+        matching = matched.bit_count()
+        logger.info("Generated quiz", extra={
+            "event": "quiz.generated",
+            "session_id": session_id,
+            "mode": "topics",
+            "selected": len(selected_indices),
+            "requested": num_questions,
+            "pool_size": len(all_questions),
+            "matching": matching,
+        })
+
+        return {
+            'success': True,
+            'questions': self._render(session_id, all_questions, selected_indices),
+            'total_questions': len(selected_indices),
+            'quiz_number': self.quiz_history.size(session_id) + 1,
+            'questions_remaining_in_pool': len(all_questions) - len(used_indices) if not allow_repeats else len(all_questions),
+            'topics': topics,
+            'matching_questions': matching,
+            'matching_remaining': (matched & ~used_indices.as_int()).bit_count() if not allow_repeats else matching,
+        }
+
+    @synchronized
+    def get_topics(self, session_id: str, limit: int = 50) -> Optional[List[Dict]]:
+        """Most common indexed terms of the session's bank, for building topic filters"""
+        bank = self.question_cache.get_bank(session_id)
+        return bank.topics.top_terms(limit) if bank else None
+
+    def _sampler(self, session_id: str) -> FenwickSampler:
+        """Session's adaptive sampler, built from current mastery on first use - O(n) once"""
+        sampler = self.samplers.get(session_id)
+        if sampler is None:
+            mastery = self.mastery.get(session_id) or MasteryTracker()
+            questions = self.question_cache.get_questions(session_id)
+            sampler = FenwickSampler(mastery.weight(q.get('id')) for q in questions)
+            self.samplers[session_id] = sampler
+        return sampler
+
+    def _select_adaptive(self, session_id: str, bank: QuestionBank, num_questions: int,
+                         allow_repeats: bool) -> Dict:
+        """
+        Weighted draw without replacement from a Fenwick tree of selection weights:
+        missed questions (weight up to 2.0) > unseen (1.0) > mastered (down to 0.1).
+        Used questions stay eligible - re-practising weak items is the point - but
+        near-duplicates are never drawn into the same quiz. Without allow_repeats the
+        drawn questions and their near-duplicates are marked used, as in the other modes.
+
+        Time Complexity: O(k log n) where k = num_questions, n = bank size
+        (O(n) once per session to build the tree)
+        """
+        all_questions = bank.questions
+        clusters = bank.clusters
+        cluster_members = bank.cluster_members
+        used_indices = self.used_questions[session_id]
+
+        selected_indices = self._sampler(session_id).sample_distinct(
+            min(num_questions, len(all_questions)),
+            exclude_with=lambda i: cluster_members.get(clusters[i], ()) if i < len(clusters) else ()
+        )
+        if not allow_repeats:
+            used_indices.update(selected_indices)
+            # Near-duplicates of the drawn questions count as drawn too, as in the random / topic paths
+            for question_idx in selected_indices:
+                if question_idx < len(clusters):
+                    used_indices.update(cluster_members.get(clusters[question_idx], ()))
+
+        selected_questions = self._render(session_id, all_questions, selected_indices)
+        mastery = self.mastery.get(session_id) or MasteryTracker()
+        logger.info("Generated quiz", extra={
+            "event": "quiz.generated",
+            "session_id": session_id,
+            "mode": "adaptive",
+            "selected": len(selected_indices),
+            "requested": num_questions,
+            "pool_size": len(all_questions),
+            "unseen_selected": sum(1 for i in selected_indices if all_questions[i].get('id') not in mastery.state),
+        })
+
+        return {
+            'success': True,
+            'questions': selected_questions,
+            'total_questions': len(selected_questions),
+            'quiz_number': self.quiz_history.size(session_id) + 1,
+            'questions_remaining_in_pool': len(all_questions) - len(used_indices) if not allow_repeats else len(all_questions),
+            'mode': 'adaptive'
+        }
+
+    def _record_answers(self, session_id: str, questions: List[Dict], answers: List,
+                        times: Optional[List] = None, now: Optional[float] = None) -> int:
+        """
+        Update per-question mastery (O(1)), the adaptive weight (O(log n)) and the
+        SM-2 review schedule (O(log r)) for each answered question that has an id.
+
+        Returns:
+            Number of answers recorded
+        """
+        times = times or []
+        recorded = 0
+        for i, (question, answer) in enumerate(zip(questions, answers)):
+            question_id = question.get('id') if isinstance(question, dict) else None
+            if not question_id or answer is None:
+                continue
+            time_spent = times[i] if i < len(times) and isinstance(times[i], (int, float)) else None
+            base_id, _ = split_variant_id(question_id)
+            self._record_answer(session_id, base_id, answer == question.get('correct_answer'), time_spent, now)
+            recorded += 1
+        return recorded
+
+    def _record_answer(self, session_id: str, question_id: str, correct: bool, time_spent: Optional[float],
+                       now: Optional[float] = None):
+        """Selection state for one answer: mastery O(1), adaptive weight O(log n), review heap O(log r)"""
+        weight = self.mastery.setdefault(session_id, MasteryTracker()).record(question_id, correct)
+        self.review_schedules.setdefault(session_id, ReviewScheduler()).record(
+            question_id, sm2_quality(correct, time_spent), now
+        )
+        sampler = self.samplers.get(session_id)
+        position = self._positions(session_id).get(question_id)
+        if sampler is not None and position is not None:
+            sampler.update(position, weight)
+
+    @synchronized
+    def grade_and_submit(self, session_id: str, answers: List[Dict], timing: Optional[Dict] = None,
+                         now: Optional[float] = None) -> Dict:
+        """
+        Grade answers server-side against the cached bank and record them everywhere in
+        one pass: history Stack, mastery / adaptive weights / review schedule.
+
+        The returned `results` list is the single stored copy of the answers: the history
+        entry holds it, and callers (the analytics store) keep a reference to the same
+        list rather than a second copy. Items use the analytics field names and share
+        the bank's question strings.
+
+        Time Complexity: O(k log n) where k = answers (O(1) Hash Map lookup + O(log n)
+        selection-state updates per answer)
+
+        Args:
+            session_id: Session identifier
+            answers: [{'id', 'answer', 'timeSpent'}] - chosen option letter per question id
+            timing: Optional start_time / end_time / total_time for the attempt
+            now: Answer time for the review schedule; only passed when replaying the state journal
+
+        Returns:
+            Dictionary with score, total, results and any ids not found in the bank
+        """
+        now = time.time() if now is None else now
+        if not self._positions(session_id):
+            return {
+                'success': False,
+                'error': 'No questions found in cache. Please upload a file first.'
+            }
+
+        results, unknown_ids = [], []
+        score = 0
+        for item in answers:
+            # Variant ids are graded against the same permutation that was served
+            question, base_id = self._lookup(session_id, item['id'])
+            if question is None:
+                unknown_ids.append(item['id'])
+                continue
+            answer = item.get('answer')
+            correct = answer is not None and answer == question['correct_answer']
+            time_spent = item.get('timeSpent') or 0
+            score += correct
+            results.append({
+                'id': question['id'],
+                'question': question['question'],
+                'userAnswer': answer if answer is not None else 'Not answered',
+                'correctAnswer': question['correct_answer'],
+                'isCorrect': correct,
+                'timeSpent': time_spent,
+            })
+            if answer is not None:
+                self._record_answer(session_id, base_id, correct, time_spent, now)
+
+        if not results:
+            return {
+                'success': False,
+                'error': 'None of the submitted question ids are in this session\'s bank',
+                'unknown_ids': unknown_ids
+            }
+
+        quiz_data = {'questions': results, 'score': score, 'total': len(results), **(timing or {})}
+        quiz_data['per_question_time'] = [r['timeSpent'] for r in results]
+        self.quiz_history.push(session_id, quiz_data)
+        self._journal("grade", session_id=session_id, answers=answers, timing=timing, now=now,
+                      at=self.quiz_history.peek(session_id)['timestamp'])
+
+        return {
+            'success': True,
+            'quiz_number': self.quiz_history.size(session_id),
+            'score': score,
+            'total': len(results),
+            'percentage': round(score / len(results) * 100, 2),
+            'results': results,
+            'unknown_ids': unknown_ids
+        }
+
+    @synchronized
+    def submit_quiz_results(self, session_id: str, quiz_data: Dict, now: Optional[float] = None):
         """
         Submit quiz results to Stack data structure (LIFO).
         Uses list as Stack for O(1) push operation.
@@ -370,30 +857,97 @@ class QuizManager:
         
         Data Structure: Stack (QuizHistory using list.append)
         - Push operation: O(1) amortized
+        - Mastery update (when answers are given): O(1) per answer, + O(log n)
+          Fenwick tree update for adaptive selection
         
         Args:
             session_id: Session identifier
             quiz_data: Dictionary containing quiz results, score, timing, etc.
+                       Optional 'answers' (chosen option letters, parallel to 'questions')
+                       feeds per-question mastery
+            now: Answer time for the review schedule; only passed when replaying the state journal
         
         Returns:
             Dictionary with success status and quiz number
         """
+        now = time.time() if now is None else now
         # Push to Stack - O(1) operation
         self.quiz_history.push(session_id, quiz_data)
+        self._journal("submit", session_id=session_id, quiz_data=quiz_data, now=now,
+                      at=self.quiz_history.peek(session_id)['timestamp'])
+
+        answers = quiz_data.get('answers')
+        recorded = 0
+        if answers:
+            recorded = self._record_answers(
+                session_id, quiz_data.get('questions', []), answers, quiz_data.get('per_question_time'), now
+            )
         
         return {
             'success': True,
             'quiz_number': self.quiz_history.size(session_id),
+            'answers_recorded': recorded,
             'message': 'Quiz results saved to history stack (LIFO)'
         }
     
+    @synchronized
+    def generate_review_quiz(self, session_id: str, num_questions: int = 10) -> Dict:
+        """
+        Build a review quiz from questions whose SM-2 review is due, most overdue first.
+        Nothing is scanned: due questions are popped from the session's min-heap.
+        
+        Time Complexity: O(k log r) where k = num_questions, r = scheduled questions
+        
+        Args:
+            session_id: Session identifier
+            num_questions: Maximum number of review questions
+        
+        Returns:
+            Dictionary with due questions (possibly none), scheduled count and next due time
+        """
+        schedule = self.review_schedules.get(session_id)
+        if schedule is None or not self.question_cache.has_questions(session_id):
+            return {
+                'success': False,
+                'error': 'No answered questions to review yet. Submit a quiz with answers first.'
+            }
+
+        all_questions = self.question_cache.get_questions(session_id)
+        positions = self._positions(session_id)
+        now = time.time()
+        selected_indices, popped, discarded = [], [], []
+        while len(selected_indices) < num_questions:
+            due_ids = schedule.pop_due(num_questions - len(selected_indices), now)
+            if not due_ids:
+                break
+            popped.extend(due_ids)
+            for question_id in due_ids:
+                if question_id in positions:
+                    selected_indices.append(positions[question_id])
+                else:
+                    schedule.discard(question_id)  # no longer in the bank
+                    discarded.append(question_id)
+        if popped:
+            self._journal("review", session_id=session_id, due=popped, discarded=discarded, now=now)
+        selected = self._render(session_id, all_questions, selected_indices)
+
+        next_due = schedule.next_due()
+        return {
+            'success': True,
+            'questions': selected,
+            'total_questions': len(selected),
+            'scheduled_questions': len(schedule),
+            'next_due_at': datetime.fromtimestamp(next_due).isoformat() if next_due else None,
+            'message': f'{len(selected)} questions due for review' if selected else 'Nothing due for review yet'
+        }
+
     def get_session_stats(self, session_id: str) -> Dict:
         """
         Get comprehensive session statistics from all data structures.
         
         Time Complexity: O(m) where m = number of quiz attempts
         - Hash Map lookup: O(1)
-        - Set size: O(1)
+        - Bitmap size: O(1)
         - Stack traversal: O(m) for history list
         - Score calculation: O(m)
         
@@ -404,7 +958,7 @@ class QuizManager:
             Dictionary with session statistics including:
             - Total quizzes taken (from Stack)
             - Questions in pool (from Hash Map)
-            - Questions used (from Set)
+            - Questions used (from Bitmap)
             - Complete quiz history (from Stack)
             - Average score
         """
@@ -412,10 +966,11 @@ class QuizManager:
         history = self.quiz_history.get_all(session_id)
         
         # Get total questions from Hash Map - O(1)
-        total_questions = len(self.question_cache.get_questions(session_id))
+        bank = self.question_cache.get_bank(session_id)
+        total_questions = len(bank) if bank is not None else 0
         
-        # Get used count from Set - O(1) size operation
-        used_count = len(self.used_questions.get(session_id, set()))
+        # Get used count from Bitmap - O(1) size operation
+        used_count = len(self.used_questions.get(session_id, ()))
         
         # Calculate average score - O(m)
         average_score = sum(q.get('score', 0) for q in history) / len(history) if history else 0
@@ -426,22 +981,26 @@ class QuizManager:
             'questions_used': used_count,
             'questions_remaining': total_questions - used_count,
             'quiz_history': history,
-            'average_score': round(average_score, 2)
+            'average_score': round(average_score, 2),
+            'bank_id': bank.bank_id if bank is not None else None,
+            'mastery': self.mastery[session_id].summary() if session_id in self.mastery else None
         }
     
+    @synchronized
     def reset_session(self, session_id: str, keep_cache: bool = True):
         """
         Reset session data and data structures.
         
         Time Complexity: O(1)
         - Dictionary deletion: O(1)
-        - Set clearing: O(1)
+        - Bitmap clearing: O(1)
         - Queue reset: O(1) reference update
+        - Bank reference released: O(1) (the bank is freed with its last session)
         
         Args:
             session_id: Session identifier to reset
             keep_cache: If True, keeps Hash Map cache but resets:
-                       - Set (used_questions)
+                       - Bitmap (used_questions)
                        - Queue (quiz_queue)
                        If False, clears all data structures including Hash Map
         
@@ -450,9 +1009,9 @@ class QuizManager:
         """
         if keep_cache:
             # Reset tracking structures but keep Hash Map cache
-            # Clear Set - O(1)
+            # Clear Bitmap - O(1)
             if session_id in self.used_questions:
-                self.used_questions[session_id] = set()
+                self.used_questions[session_id] = UsedBitmap()
             
             # Reset Queue by recreating from cached questions - O(n)
             if session_id in self.quiz_queues and self.question_cache.has_questions(session_id):
@@ -463,13 +1022,21 @@ class QuizManager:
                 self.quiz_queues[session_id] = QuizQueue(index_items)
         else:
             # Clear all data structures - O(1) operations
+            bank = self.question_cache.get_bank(session_id)
+            if bank is not None:
+                self.bank_library.release(bank)
             self.question_cache.clear_session(session_id)  # Hash Map deletion - O(1)
+            self.mastery.pop(session_id, None)
+            self.samplers.pop(session_id, None)
+            self.review_schedules.pop(session_id, None)
+            self.variant_counters.pop(session_id, None)
             
             if session_id in self.used_questions:
-                del self.used_questions[session_id]  # Set deletion - O(1)
+                del self.used_questions[session_id]  # Bitmap deletion - O(1)
             
             if session_id in self.quiz_queues:
                 del self.quiz_queues[session_id]  # Queue deletion - O(1)
+        self._journal("reset", session_id=session_id, keep_cache=keep_cache)
         
         return {
             'success': True,
@@ -0,0 +1,108 @@
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+DAY_SECONDS = 86400
+# A missed question comes back within the session instead of SM-2's one day
+LAPSE_SECONDS = 600
+# A served but unanswered review question is offered again after this long
+UNANSWERED_RETRY_SECONDS = 900
+MIN_EASE = 1.3
+
+
+def sm2_quality(correct: bool, time_spent: Optional[float] = None, slow_seconds: float = 60.0) -> int:
+    """Map an answer to an SM-2 quality grade (0-5): slow correct answers count as hesitant"""
+    if not correct:
+        return 1
+    if time_spent is not None and time_spent > slow_seconds:
+        return 3
+    return 4
+
+
+class ReviewScheduler:
+    """
+    SM-2 spaced repetition for one session, backed by a min-heap keyed on due time.
+
+    Each answered question has a card (repetitions, interval, ease, due). Rescheduling
+    pushes a new heap entry instead of searching for the old one; entries whose due
+    time no longer matches the card are skipped when popped (lazy deletion).
+
+    Time Complexity:
+    - record: O(log n)
+    - pop_due: O(k log n) for k returned questions (+ stale entries skipped)
+    """
+    def __init__(self):
+        self.cards: Dict[str, Dict] = {}  # question id -> card
+        self._heap: List[Tuple[float, str]] = []  # (due, question id)
+
+    def _is_current(self, entry: Tuple[float, str]) -> bool:
+        card = self.cards.get(entry[1])
+        return card is not None and card["due"] == entry[0]
+
+    def _push(self, question_id: str, due: float):
+        self.cards[question_id]["due"] = due
+        heapq.heappush(self._heap, (due, question_id))
+        # Drop stale entries once they outnumber live ones - O(n), amortized O(1) per push
+        if len(self._heap) > 2 * len(self.cards) + 64:
+            self._heap = [entry for entry in self._heap if self._is_current(entry)]
+            heapq.heapify(self._heap)
+
+    def record(self, question_id: str, quality: int, now: Optional[float] = None) -> float:
+        """Apply one SM-2 review and return the next due timestamp"""
+        now = time.time() if now is None else now
+        card = self.cards.setdefault(question_id, {"repetitions": 0, "interval_days": 0.0, "ease": 2.5, "due": now})
+
+        if quality < 3:
+            card["repetitions"] = 0
+            card["interval_days"] = 0.0
+            delay = LAPSE_SECONDS
+        else:
+            card["repetitions"] += 1
+            if card["repetitions"] == 1:
+                card["interval_days"] = 1.0
+            elif card["repetitions"] == 2:
+                card["interval_days"] = 6.0
+            else:
+                card["interval_days"] = round(card["interval_days"] * card["ease"], 2)
+            delay = card["interval_days"] * DAY_SECONDS
+        card["ease"] = max(MIN_EASE, card["ease"] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+        self._push(question_id, now + delay)
+        return card["due"]
+
+    def _clean_top(self):
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def pop_due(self, limit: int, now: Optional[float] = None) -> List[str]:
+        """
+        Remove and return up to `limit` question ids that are due, most overdue first.
+        They are re-queued UNANSWERED_RETRY_SECONDS out in case the review is abandoned;
+        recording an answer replaces that.
+        """
+        now = time.time() if now is None else now
+        due = []
+        self._clean_top()
+        while self._heap and len(due) < limit and self._heap[0][0] <= now:
+            _, question_id = heapq.heappop(self._heap)
+            due.append(question_id)
+            self._clean_top()
+        self.requeue(due, now)
+        return due
+
+    def requeue(self, question_ids: List[str], now: float):
+        """Offer served questions again UNANSWERED_RETRY_SECONDS after `now` (also replays a pop_due)"""
+        for question_id in question_ids:
+            if question_id in self.cards:
+                self._push(question_id, now + UNANSWERED_RETRY_SECONDS)
+
+    def next_due(self) -> Optional[float]:
+        self._clean_top()
+        return self._heap[0][0] if self._heap else None
+
+    def discard(self, question_id: str):
+        """Stop scheduling a question (its heap entries become stale)"""
+        self.cards.pop(question_id, None)
+
+    def __len__(self):
+        return len(self.cards)
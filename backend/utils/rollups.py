@@ -0,0 +1,217 @@
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+HOUR = 3600
+DAY = 86400
+DEFAULT_COHORT = "default"
+HOURLY_RETENTION_DAYS = 14
+DAILY_RETENTION_DAYS = 400
+
+
+class TimingSketch:
+    """
+    Mergeable answer-time distribution: log-spaced buckets with ~5% relative
+    error (DDSketch-style), so quantiles of merged buckets stay accurate.
+
+    Time Complexity: O(1) add, O(b) merge / quantile for b occupied buckets (a few dozen)
+    """
+    GAMMA = 1.1
+    _LOG_GAMMA = math.log(GAMMA)
+    MIN_SECONDS = 0.01
+
+    __slots__ = ("counts", "small")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.small = 0  # answers faster than MIN_SECONDS
+
+    def add(self, seconds: float):
+        if seconds < self.MIN_SECONDS:
+            self.small += 1
+            return
+        key = math.ceil(math.log(seconds) / self._LOG_GAMMA)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def merge(self, other: "TimingSketch"):
+        self.small += other.small
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.small + sum(self.counts.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.small
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if rank < seen:
+                return 2 * self.GAMMA ** key / (self.GAMMA + 1)  # bucket midpoint
+        return 2 * self.GAMMA ** max(self.counts) / (self.GAMMA + 1)
+
+
+class RollupCell:
+    """Answer counts, correct count, time sum and time sketch for one bucket x topic x cohort"""
+    __slots__ = ("answered", "correct", "time_sum", "timing")
+
+    def __init__(self):
+        self.answered = 0
+        self.correct = 0
+        self.time_sum = 0.0
+        self.timing = TimingSketch()
+
+    def add(self, correct: bool, time_spent: float):
+        self.answered += 1
+        self.correct += bool(correct)
+        self.time_sum += time_spent
+        self.timing.add(time_spent)
+
+    def merge(self, other: "RollupCell"):
+        self.answered += other.answered
+        self.correct += other.correct
+        self.time_sum += other.time_sum
+        self.timing.merge(other.timing)
+
+    def summary(self) -> Dict:
+        return {
+            'answered': self.answered,
+            'correct': self.correct,
+            'accuracy': round(self.correct / self.answered * 100, 2) if self.answered else 0,
+            'avg_time': round(self.time_sum / self.answered, 2) if self.answered else 0,
+            'p50_time': _rounded(self.timing.quantile(0.5)),
+            'p90_time': _rounded(self.timing.quantile(0.9)),
+        }
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+class RollupStore:
+    """
+    Time-bucketed analytics rollups maintained on submit: hourly and daily tables
+    of bucket start -> {(topic, cohort): RollupCell}.
+
+    A range query is planned as whole days plus hourly buckets at the ragged edges
+    (or whole days once hourly buckets have expired), and answered by merging
+    those cells - never by scanning raw answers.
+
+    Time Complexity:
+    - record: O(a) for a answers (two cell updates each)
+    - query: O(B * c) for B planned buckets (<= ~50 for any range) and c cells per bucket;
+      ranges are clipped to the daily retention window, so B stays bounded
+      (granularity="hour" over the whole window: ~10k buckets)
+    """
+    def __init__(self, hourly_retention_days: int = HOURLY_RETENTION_DAYS,
+                 daily_retention_days: int = DAILY_RETENTION_DAYS):
+        self.retention = {"hour": hourly_retention_days * DAY, "day": daily_retention_days * DAY}
+        self.tables: Dict[str, Dict[int, Dict[Tuple[str, str], RollupCell]]] = {"hour": {}, "day": {}}
+        self._dirty: Set[Tuple[str, int]] = set()  # (granularity, bucket) changed since take_dirty()
+        self._lock = threading.Lock()
+
+    def take_dirty(self) -> Set[Tuple[str, int]]:
+        """Buckets added, updated or pruned since the last call (for incremental snapshots)"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def _prune(self, granularity: str, now: float):
+        # Caller holds the lock; runs only when a new bucket is opened
+        cutoff = now - self.retention[granularity]
+        table = self.tables[granularity]
+        for bucket in [bucket for bucket in table if bucket < cutoff]:
+            del table[bucket]
+            self._dirty.add((granularity, bucket))
+
+    def record(self, answers: Iterable[Tuple[bool, float]], topic: str, cohort: Optional[str] = None,
+               timestamp: Optional[float] = None):
+        """Add answers as (is_correct, time_spent) pairs to the hour and day buckets of `timestamp`"""
+        timestamp = time.time() if timestamp is None else timestamp
+        key = (topic or "General", cohort or DEFAULT_COHORT)
+        answers = list(answers)
+        with self._lock:
+            for granularity, width in (("hour", HOUR), ("day", DAY)):
+                table = self.tables[granularity]
+                bucket = int(timestamp // width * width)
+                if bucket not in table:
+                    self._prune(granularity, timestamp)
+                    table[bucket] = {}
+                cell = table[bucket].get(key)
+                if cell is None:
+                    cell = table[bucket][key] = RollupCell()
+                for correct, time_spent in answers:
+                    cell.add(correct, time_spent)
+                self._dirty.add((granularity, bucket))
+
+    def plan(self, start: float, end: float, granularity: Optional[str] = None,
+             now: Optional[float] = None) -> List[Tuple[str, int]]:
+        """
+        (granularity, bucket start) pairs covering [start, end), coarsest first where possible.
+        The range is clipped to [now - daily retention, now + 1 day): nothing is stored outside it.
+        """
+        now = time.time() if now is None else now
+        hourly_since = now - self.retention["hour"]
+        start = max(start, now - self.retention["day"] - DAY)
+        end = min(end, now + DAY)
+        buckets = []
+        t = int(start // (DAY if granularity == "day" else HOUR) * (DAY if granularity == "day" else HOUR))
+        while t < end:
+            whole_day = t % DAY == 0 and t + DAY <= end
+            if granularity == "day" or (granularity is None and (whole_day or t < hourly_since)):
+                day = t // DAY * DAY
+                buckets.append(("day", day))
+                t = day + DAY
+            else:
+                buckets.append(("hour", t))
+                t += HOUR
+        return buckets
+
+    def query(self, start: float, end: float, topic: Optional[str] = None, cohort: Optional[str] = None,
+              group_by: str = "topic", granularity: Optional[str] = None) -> List[Dict]:
+        """
+        Merged rollups for [start, end) filtered by topic / cohort and grouped by
+        "topic", "cohort", "topic_cohort" or "bucket" (a time series; uses `granularity`,
+        default daily).
+        """
+        if group_by == "bucket":
+            granularity = granularity or "day"
+        merged: Dict[object, RollupCell] = {}
+        planned = self.plan(start, end, granularity)  # pure arithmetic: outside the lock
+        with self._lock:
+            for bucket_granularity, bucket in planned:
+                cells = self.tables[bucket_granularity].get(bucket)
+                if not cells:
+                    continue
+                for (cell_topic, cell_cohort), cell in cells.items():
+                    if (topic and cell_topic != topic) or (cohort and cell_cohort != cohort):
+                        continue
+                    group = {
+                        "topic": cell_topic,
+                        "cohort": cell_cohort,
+                        "topic_cohort": (cell_topic, cell_cohort),
+                        "bucket": bucket,
+                    }[group_by]
+                    target = merged.get(group)
+                    if target is None:
+                        target = merged[group] = RollupCell()
+                    target.merge(cell)
+
+        rows = []
+        for group, cell in sorted(merged.items()):
+            if group_by == "topic_cohort":
+                labels = {'topic': group[0], 'cohort': group[1]}
+            elif group_by == "bucket":
+                labels = {'bucket_start': datetime.fromtimestamp(group, timezone.utc).isoformat()}
+            else:
+                labels = {group_by: group}
+            rows.append({**labels, **cell.summary()})
+        return rows
+
+
+# Global instance, updated on every analytics submit
+rollups = RollupStore()
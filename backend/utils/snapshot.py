@@ -0,0 +1,514 @@
+import glob
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from utils.bank_library import QuestionBank, UsedBitmap
+from utils.quiz_manager import QuizManager, quiz_manager
+from utils.rollups import RollupCell, RollupStore, rollups
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"QZSNAP3\n"
+SNAPSHOT_FILE = "snapshot.bin"
+JOURNAL_PATTERN = "journal-%08d.log"
+_FRAME = struct.Struct(">I")  # journal record length prefix
+MAX_SESSION_CHUNKS = 32  # append-only chunks per session before they are merged into one
+
+
+def _dumps(obj) -> bytes:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(blob: bytes):
+    return pickle.loads(zlib.decompress(blob))
+
+
+class StateStore:
+    """
+    Incremental snapshots + append-only journal of the in-memory quiz state, for warm restarts.
+
+    State registers in two shapes:
+    - keyed components (banks by id, rollup buckets): a mapping of key -> object plus
+      the keys changed since the last snapshot (or, for content-addressed entries, none:
+      a key always names the same object)
+    - session components (per-session manager state, history, analytics): dumped per
+      session; "append-only" ones (history, analytics lists) are saved as chunks of
+      the entries added since the last snapshot
+
+    Each piece is kept as its own compressed pickle between snapshots. Mutations are
+    journaled as (op, payload) records while holding the quiz manager's lock; the
+    payload's session_id marks that session dirty.
+
+    - snapshot(): under the lock, pickles only dirty sessions / changed keys and
+      switches to a new journal file; compression, writing the file (a pickle of the
+      cached blobs, renamed into place) and deleting the old journal happen afterwards.
+      The background thread does this every `interval` seconds when anything changed.
+    - restore(): loads the snapshot, then replays journals newer than it in order;
+      a torn last record from a crash is ignored.
+
+    Time Complexity:
+    - record: O(p) for a payload of size p (one buffered write + flush)
+    - snapshot: O(changed state) with the lock held, O(blobs) for the file write
+    - restore: O(state + journal)
+    """
+    def __init__(self, manager: QuizManager, directory: str, interval: float = 300.0, enabled: bool = True):
+        self.manager = manager
+        self.directory = directory
+        self.interval = interval
+        self.enabled = enabled
+        self._components: Dict[str, Dict[str, Callable]] = {}
+        self._session_components: Dict[str, Dict[str, Any]] = {}
+        self._handlers: Dict[str, Callable[[Dict], Any]] = {}
+        self._journal = None
+        self._journal_number = 0
+        self._journal_records = 0
+        self._replaying = False
+        # Blob caches; only changed under _write_lock (dirty sets under the manager lock)
+        self._component_blobs: Dict[str, Dict[Hashable, bytes]] = {}
+        self._session_heads: Dict[str, bytes] = {}
+        self._session_chunks: Dict[str, List[bytes]] = {}
+        self._session_tails: Dict[str, Dict[str, Tuple[list, int]]] = {}  # list saved so far, entries saved
+        self._dirty_sessions: Set[str] = set()
+        self._write_lock = threading.Lock()  # one snapshot write at a time
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {}
+
+    # ---- registration ----------------------------------------------------
+
+    def register_component(self, name: str, items: Callable[[], Dict], load: Callable[[Dict], None],
+                           changed: Optional[Callable[[], Iterable]] = None):
+        """
+        items(): current key -> object mapping; load(mapping) on restore.
+        changed(): keys added/updated/removed since its last call; None when a key's
+        object never changes (only new and removed keys are saved).
+        """
+        self._components[name] = {"items": items, "load": load, "changed": changed}
+        self._component_blobs[name] = {}
+
+    def register_session_component(self, name: str, dump: Callable[[str], Any],
+                                   load: Callable[[str, Any], None], append_only: bool = False):
+        """
+        dump(session_id): the session's state (None = nothing); load(session_id, state).
+        append_only: dump returns a list that is only ever appended to (or replaced).
+        """
+        self._session_components[name] = {"dump": dump, "load": load, "append_only": append_only}
+
+    def register_handler(self, op: str, handler: Callable[[Dict], Any]):
+        self._handlers[op] = handler
+
+    # ---- journal ---------------------------------------------------------
+
+    def record(self, op: str, payload: Dict):
+        """Append one mutation; callers hold the quiz manager's lock so records and snapshots stay ordered"""
+        if not self.enabled:
+            return
+        if payload.get("session_id") is not None:
+            self._dirty_sessions.add(payload["session_id"])  # replayed mutations too
+        if self._replaying or self._journal is None:
+            return
+        data = _dumps((op, payload))
+        try:
+            self._journal.write(_FRAME.pack(len(data)) + data)
+            self._journal.flush()  # in the OS page cache: survives a process crash
+            self._journal_records += 1
+        except OSError as e:
+            logger.error("Journal write failed: %s", e, extra={"event": "state.journal_error"})
+
+    def _open_journal(self, number: int):
+        # Caller holds the manager lock (or runs before serving)
+        if self._journal is not None:
+            self._journal.close()
+        self._journal_number = number
+        self._journal_records = 0
+        self._journal = open(os.path.join(self.directory, JOURNAL_PATTERN % number), "ab")
+
+    def _read_journal(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _FRAME.size <= len(data):
+            (length,) = _FRAME.unpack_from(data, offset)
+            record = data[offset + _FRAME.size:offset + _FRAME.size + length]
+            if len(record) < length:
+                logger.warning("Ignoring torn journal record at end of %s", path, extra={"event": "state.journal_torn"})
+                return
+            offset += _FRAME.size + length
+            yield pickle.loads(record)
+
+    # ---- snapshot --------------------------------------------------------
+
+    def _capture_components(self) -> Dict[str, Tuple[Dict[Hashable, bytes], List[Hashable]]]:
+        # Caller holds the manager lock: pickle new / changed keyed objects
+        captured = {}
+        for name, component in self._components.items():
+            items, blobs = component["items"](), self._component_blobs[name]
+            if component["changed"] is None:
+                keys = [key for key in items if key not in blobs]
+                removed = [key for key in blobs if key not in items]
+            else:
+                changed = component["changed"]()
+                keys = [key for key in changed if key in items]
+                removed = [key for key in changed if key not in items]
+            captured[name] = ({key: _dumps(items[key]) for key in keys}, removed)
+        return captured
+
+    def _capture_session(self, session_id: str) -> Tuple[Optional[bytes], Optional[bytes], bool]:
+        """
+        Caller holds the manager lock. Returns (head, chunk, reset): the pickled non-append
+        state, the pickled entries appended since the last snapshot, and whether the
+        session's earlier chunks are obsolete (a list was replaced or cleared).
+        """
+        head, new_entries, tails = {}, {}, {}
+        previous = self._session_tails.get(session_id, {})
+        reset = False
+        for name, component in self._session_components.items():
+            state = component["dump"](session_id)
+            if not component["append_only"]:
+                if state is not None:
+                    head[name] = state
+                continue
+            saved = previous.get(name)
+            if state is None:
+                reset |= saved is not None
+                continue
+            if saved is None or saved[0] is not state or saved[1] > len(state):
+                reset |= saved is not None
+                saved = (state, 0)
+            new_entries[name] = state[saved[1]:]
+            tails[name] = (state, len(state))
+
+        if reset:
+            # Rewrite every append-only list of the session as one chunk
+            new_entries = {name: list(tail[0]) for name, tail in tails.items()}
+        if tails:
+            self._session_tails[session_id] = tails
+        else:
+            self._session_tails.pop(session_id, None)
+        chunk = _dumps(new_entries) if any(new_entries.values()) else None
+        return (_dumps(head) if head else None), chunk, reset
+
+    def _merge_chunks(self, chunks: List[bytes]) -> bytes:
+        # Off the lock: the unpickled entries are private copies
+        merged: Dict[str, list] = {}
+        for chunk in chunks:
+            for name, entries in _loads(chunk).items():
+                merged.setdefault(name, []).extend(entries)
+        return zlib.compress(_dumps(merged), 1)
+
+    def snapshot(self) -> Optional[Dict]:
+        """Write a snapshot and start a new journal; returns timings, or None before restore() / when disabled"""
+        if not self.enabled or self._journal is None:
+            return None
+        with self._write_lock:
+            started = time.perf_counter()
+            with self.manager.lock:
+                dirty, self._dirty_sessions = self._dirty_sessions, set()
+                try:
+                    components = self._capture_components()
+                    sessions = {session_id: self._capture_session(session_id) for session_id in dirty}
+                except Exception:
+                    self._dirty_sessions |= dirty
+                    raise
+                old_journal = self._journal_number
+                self._open_journal(old_journal + 1)
+            captured_at = time.perf_counter()
+
+            # Compress the changes and fold them into the blob caches
+            for name, (updated, removed) in components.items():
+                blobs = self._component_blobs[name]
+                for key in removed:
+                    blobs.pop(key, None)
+                for key, data in updated.items():
+                    blobs[key] = zlib.compress(data, 1)
+            for session_id, (head, chunk, reset) in sessions.items():
+                if head is None:
+                    self._session_heads.pop(session_id, None)
+                else:
+                    self._session_heads[session_id] = zlib.compress(head, 1)
+                chunks = [] if reset else self._session_chunks.get(session_id, [])
+                if chunk is not None:
+                    chunks.append(zlib.compress(chunk, 1))
+                if len(chunks) > MAX_SESSION_CHUNKS:
+                    chunks = [self._merge_chunks(chunks)]
+                if chunks:
+                    self._session_chunks[session_id] = chunks
+                else:
+                    self._session_chunks.pop(session_id, None)
+
+            path = os.path.join(self.directory, SNAPSHOT_FILE)
+            body = _dumps({
+                "journal": old_journal + 1,
+                "components": self._component_blobs,
+                "sessions": {session_id: (self._session_heads.get(session_id), self._session_chunks.get(session_id, []))
+                             for session_id in self._session_heads.keys() | self._session_chunks.keys()},
+            })
+            with open(path + ".tmp", "wb") as f:
+                f.write(SNAPSHOT_MAGIC + body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)  # atomic: a crash leaves the old snapshot + both journals
+            for old in glob.glob(os.path.join(self.directory, "journal-*.log")):
+                if self._journal_file_number(old) <= old_journal:
+                    os.remove(old)
+
+            self.stats["last_snapshot"] = {
+                "at": time.time(),
+                "lock_held_ms": round((captured_at - started) * 1000, 2),
+                "write_ms": round((time.perf_counter() - captured_at) * 1000, 2),
+                "bytes": len(body) + len(SNAPSHOT_MAGIC),
+                "sessions_saved": len(sessions),
+            }
+        logger.info("State snapshot written", extra={"event": "state.snapshot", **self.stats["last_snapshot"]})
+        return self.stats["last_snapshot"]
+
+    @staticmethod
+    def _journal_file_number(path: str) -> int:
+        return int(os.path.basename(path)[len("journal-"):-len(".log")])
+
+    # ---- restore ---------------------------------------------------------
+
+    def _load_snapshot(self, state: Dict):
+        # Caller holds the manager lock; keyed components first (sessions refer to banks)
+        for name, component in self._components.items():
+            blobs = state["components"].get(name, {})
+            component["load"]({key: _loads(blob) for key, blob in blobs.items()})
+            self._component_blobs[name] = dict(blobs)
+
+        for session_id, (head, chunks) in state["sessions"].items():
+            head_state = _loads(head) if head else {}
+            entries: Dict[str, list] = {}
+            for chunk in chunks:
+                for name, chunk_entries in _loads(chunk).items():
+                    entries.setdefault(name, []).extend(chunk_entries)
+            tails = {}
+            for name, component in self._session_components.items():
+                if component["append_only"]:
+                    if name in entries:
+                        component["load"](session_id, entries[name])
+                        saved = component["dump"](session_id)
+                        tails[name] = (saved, len(saved))
+                elif name in head_state:
+                    component["load"](session_id, head_state[name])
+            if head:
+                self._session_heads[session_id] = head
+            if chunks:
+                self._session_chunks[session_id] = list(chunks)
+            if tails:
+                self._session_tails[session_id] = tails
+
+    def restore(self) -> Optional[Dict]:
+        """Load the latest snapshot and replay newer journals before serving; later calls are no-ops"""
+        if not self.enabled:
+            return None
+        if self._journal is not None:
+            return self.stats.get("last_restore")  # e.g. the app started twice in one process
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.perf_counter()
+        first_journal, loaded = 1, False
+
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                if not data.startswith(SNAPSHOT_MAGIC):
+                    raise ValueError("not a snapshot file of this version")
+                state = pickle.loads(data[len(SNAPSHOT_MAGIC):])
+                with self.manager.lock:
+                    self._load_snapshot(state)
+                first_journal, loaded = state["journal"], True
+            except Exception as e:
+                # Incompatible or corrupt snapshot: start empty rather than fail to boot
+                logger.error("Could not load state snapshot: %s", e, extra={"event": "state.restore_error"})
+        snapshot_loaded_at = time.perf_counter()
+
+        replayed, last_journal = 0, first_journal - 1
+        journals = sorted(glob.glob(os.path.join(self.directory, "journal-*.log")), key=self._journal_file_number)
+        self._replaying = True
+        try:
+            with self.manager.lock:
+                for journal in journals:
+                    number = self._journal_file_number(journal)
+                    if number < first_journal:
+                        continue
+                    last_journal = number
+                    for op, payload in self._read_journal(journal):
+                        handler = self._handlers.get(op)
+                        if handler is None:
+                            continue
+                        try:
+                            handler(payload)
+                            replayed += 1
+                        except Exception as e:
+                            logger.warning("Skipping journal record %s: %s", op, e,
+                                           extra={"event": "state.replay_error"})
+        finally:
+            self._replaying = False
+
+        # New mutations go to a fresh journal after everything replayed
+        with self.manager.lock:
+            self._open_journal(max(last_journal, first_journal - 1) + 1)
+
+        self.stats["last_restore"] = {
+            "snapshot_loaded": loaded,
+            "snapshot_ms": round((snapshot_loaded_at - started) * 1000, 2),
+            "journal_records": replayed,
+            "replay_ms": round((time.perf_counter() - snapshot_loaded_at) * 1000, 2),
+        }
+        logger.info("State restored", extra={"event": "state.restore", **self.stats["last_restore"]})
+        return self.stats["last_restore"]
+
+    # ---- background snapshots -------------------------------------------
+
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="state-snapshots", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._journal_records:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    logger.error("State snapshot failed: %s", e, extra={"event": "state.snapshot_error"})
+
+    def stop(self, final_snapshot: bool = True):
+        """Stop the background thread; a final snapshot makes the next start a pure load"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if final_snapshot and self.enabled and self._journal is not None and self._journal_records:
+            self.snapshot()
+        with self.manager.lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def snapshot_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "journal": self._journal_number,
+            "journal_records": self._journal_records,
+            "sessions": len(self._session_heads.keys() | self._session_chunks.keys()),
+            **self.stats,
+        }
+
+
+# ---- quiz manager state ---------------------------------------------------
+# Queues and adaptive samplers are not saved: they are rebuilt lazily from this state
+
+def _load_banks(manager: QuizManager, banks: Dict[str, QuestionBank]):
+    for bank in banks.values():
+        bank.refcount = 0  # recounted as sessions attach
+    manager.bank_library.banks = banks
+
+
+def _dump_session(manager: QuizManager, session_id: str) -> Optional[Dict]:
+    state = {}
+    entry = manager.question_cache.cache.get(session_id)
+    if entry is not None:
+        state["cache"] = {**entry, 'bank': entry['bank'].bank_id}  # banks are saved once, by id
+    for key, store in (("source", manager.question_cache.sources), ("used", manager.used_questions),
+                       ("mastery", manager.mastery), ("reviews", manager.review_schedules),
+                       ("variants", manager.variant_counters)):
+        if session_id in store:
+            state[key] = store[session_id]
+    return state or None
+
+
+def _load_session(manager: QuizManager, session_id: str, state: Dict):
+    if "cache" in state:
+        entry = state["cache"]
+        bank = manager.bank_library.banks.get(entry['bank'])
+        if bank is not None:
+            entry['bank'] = bank
+            bank.refcount += 1
+            manager.question_cache.cache[session_id] = entry
+    for key, store in (("source", manager.question_cache.sources), ("used", manager.used_questions),
+                       ("mastery", manager.mastery), ("reviews", manager.review_schedules),
+                       ("variants", manager.variant_counters)):
+        if key in state:
+            store[session_id] = state[key]
+
+
+# ---- rollups (saved per bucket) ------------------------------------------
+
+def _rollup_buckets(store: RollupStore) -> Dict[Tuple[str, int], Dict[Tuple[str, str], RollupCell]]:
+    return {(granularity, bucket): cells
+            for granularity, table in store.tables.items() for bucket, cells in table.items()}
+
+
+def _load_rollup_buckets(store: RollupStore, buckets: Dict):
+    tables = {granularity: {} for granularity in store.tables}
+    for (granularity, bucket), cells in buckets.items():
+        tables[granularity][bucket] = cells
+    store.tables = tables
+    store.take_dirty()
+
+
+# ---- journal replay -------------------------------------------------------
+
+def _replay_serve(manager: QuizManager, payload: Dict):
+    session_id = payload["session_id"]
+    if payload["used"] is not None:
+        manager.used_questions.setdefault(session_id, UsedBitmap()).apply_changes(*payload["used"])
+    if payload["indices"] and manager.option_variants:
+        bank = manager.question_cache.get_bank(session_id)
+        if bank is not None:
+            manager._render(session_id, bank.questions, payload["indices"])  # advances the variant counters
+
+
+def _replay_review(manager: QuizManager, payload: Dict):
+    # The served questions themselves follow as a "serve" record
+    schedule = manager.review_schedules.get(payload["session_id"])
+    if schedule is not None:
+        schedule.requeue(payload["due"], payload["now"])
+        for question_id in payload["discarded"]:
+            schedule.discard(question_id)
+
+
+def _replay_history(method: Callable, payload: Dict):
+    # History entries keep their original timestamps
+    payload = dict(payload)
+    at = payload.pop("at", None)
+    result = method(**payload)
+    entry = quiz_manager.quiz_history.peek(payload["session_id"])
+    if result.get("success") and entry is not None and at:
+        entry["timestamp"] = at
+
+
+state_store = StateStore(
+    quiz_manager,
+    directory=os.getenv("STATE_DIR", "state"),
+    interval=float(os.getenv("STATE_SNAPSHOT_INTERVAL", "300")),
+    enabled=os.getenv("STATE_SNAPSHOTS", "true").lower() == "true",
+)
+quiz_manager.journal = state_store.record
+
+state_store.register_component("banks", lambda: quiz_manager.bank_library.banks,
+                               lambda banks: _load_banks(quiz_manager, banks))
+state_store.register_component("rollups", lambda: _rollup_buckets(rollups),
+                               lambda buckets: _load_rollup_buckets(rollups, buckets), changed=rollups.take_dirty)
+state_store.register_session_component("quiz_manager", lambda sid: _dump_session(quiz_manager, sid),
+                                       lambda sid, state: _load_session(quiz_manager, sid, state))
+state_store.register_session_component("history", quiz_manager.quiz_history.history.get,
+                                       quiz_manager.quiz_history.history.__setitem__, append_only=True)
+
+state_store.register_handler("upload", lambda p: quiz_manager.upload_and_cache_questions(**p))
+state_store.register_handler("attach", lambda p: quiz_manager.attach_bank(**p))
+state_store.register_handler("source", lambda p: quiz_manager.set_source(**p))
+state_store.register_handler("reset", lambda p: quiz_manager.reset_session(**p))
+state_store.register_handler("grade", lambda p: _replay_history(quiz_manager.grade_and_submit, p))
+state_store.register_handler("submit", lambda p: _replay_history(quiz_manager.submit_quiz_results, p))
+state_store.register_handler("serve", lambda p: _replay_serve(quiz_manager, p))
+state_store.register_handler("review", lambda p: _replay_review(quiz_manager, p))
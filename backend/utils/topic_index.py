@@ -0,0 +1,86 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Set
+
+from utils.near_duplicate import content_words
+
+# Set bit offsets for every byte value, to turn a bitmap into positions 8 bits at a time
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def topic_terms(text: str) -> Set[str]:
+    """Index/query terms: content words (same normalization as near-duplicate detection), 3+ chars, no numbers"""
+    return {word for word in content_words(text) if len(word) >= 3 and not word.isdigit()}
+
+
+def bitmap_positions(bitmap: int) -> List[int]:
+    """Positions of the set bits, ascending - O(n / 8) byte steps"""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    return [offset * 8 + bit for offset, value in enumerate(data) if value for bit in _BYTE_BITS[value]]
+
+
+class TopicIndex:
+    """
+    Inverted index of term -> bank positions for one question bank.
+
+    Terms come from the question stem plus the question's topic/section tag.
+    Postings are append-only position arrays (positions only grow), and each is
+    materialized as an int bitmap on first query and cached, so filters are
+    answered with bitmap AND/OR instead of scanning questions.
+
+    Time Complexity:
+    - add: O(t) for t terms in the question
+    - match: O(q * n / 64) word operations for q query terms (cached bitmaps)
+    """
+    def __init__(self):
+        self.postings: Dict[str, array] = {}
+        self._bitmaps: Dict[str, int] = {}
+
+    def add(self, position: int, question: Dict):
+        terms = topic_terms(question.get('question', ''))
+        if question.get('topic'):
+            terms |= topic_terms(question['topic'])
+        for term in terms:
+            self.postings.setdefault(term, array("I")).append(position)
+            self._bitmaps.pop(term, None)  # only touched terms are rebuilt
+
+    def bitmap(self, term: str) -> int:
+        cached = self._bitmaps.get(term)
+        if cached is None:
+            posting = self.postings.get(term)
+            if not posting:
+                return 0
+            bits = bytearray(posting[-1] // 8 + 1)
+            for position in posting:
+                bits[position >> 3] |= 1 << (position & 7)
+            cached = self._bitmaps[term] = int.from_bytes(bits, "little")
+        return cached
+
+    def match(self, topics: Iterable[str]) -> Optional[int]:
+        """
+        Bitmap of questions matching any of `topics`; a multi-word topic needs all
+        of its words. Returns None when no topic has indexable words.
+        """
+        result, any_terms = 0, False
+        for topic in topics:
+            terms = topic_terms(topic)
+            if not terms:
+                continue
+            any_terms = True
+            bitmaps = sorted((self.bitmap(term) for term in terms), key=int.bit_count)
+            matched = bitmaps[0]
+            for other in bitmaps[1:]:
+                if not matched:
+                    break
+                matched &= other
+            result |= matched
+        return result if any_terms else None
+
+    def top_terms(self, limit: int = 50) -> List[Dict]:
+        ranked = sorted(self.postings.items(), key=lambda item: len(item[1]), reverse=True)[:limit]
+        return [{'term': term, 'questions': len(posting)} for term, posting in ranked]
+
+    def copy(self) -> "TopicIndex":
+        clone = TopicIndex()
+        clone.postings = {term: array("I", posting) for term, posting in self.postings.items()}
+        clone._bitmaps = dict(self._bitmaps)
+        return clone
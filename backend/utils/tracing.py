@@ -0,0 +1,225 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+
+# ============================================================
+# Metrics registry (Prometheus text exposition format)
+# ============================================================
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter per label set - O(1) inc"""
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label set.
+    Time Complexity: O(b) per observation where b = number of buckets (small, fixed)
+    """
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, List[float]] = {}  # key -> [bucket counts..., +Inf, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1  # +Inf bucket doubles as count
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {count}")
+                count = series[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Hash Map of metric name -> metric; get-or-create is O(1)"""
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and status"
+)
+stage_duration = metrics.histogram(
+    "quiz_stage_duration_seconds", "Latency of each quiz generation pipeline stage"
+)
+
+
+# ============================================================
+# Per-request trace (spans) carried in a context variable
+# ============================================================
+class RequestTrace:
+    """Ordered list of timed spans for one request"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+
+    def add_span(self, name: str, duration: float, attrs: Dict):
+        self.spans.append({"name": name, "duration_ms": duration * 1000, **attrs})
+
+    def server_timing(self, details: bool = False) -> str:
+        """
+        Server-Timing header value, e.g. 'extract;dur=12.3, generate;dur=840.1'.
+        Span attributes (model names, outcomes...) are internal: they are only put
+        in desc when details is set, e.g. 'generate;desc="model=x attempt=1";dur=840.1'
+        """
+        entries = []
+        for s in self.spans:
+            desc = ""
+            if details:
+                desc = " ".join(f"{k}={v}" for k, v in s.items() if k not in ("name", "duration_ms"))
+                desc = desc.replace("\\", "").replace('"', "").replace("\r", " ").replace("\n", " ")
+            desc_part = f';desc="{desc}"' if desc else ""
+            entries.append(f"{s['name']}{desc_part};dur={s['duration_ms']:.1f}")
+        total = (time.perf_counter() - self.started) * 1000
+        entries.append(f"total;dur={total:.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+_current_span_attrs: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("span_attrs", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a pipeline stage. Recorded in the request trace (for Server-Timing)
+    and in the stage latency histogram. Works outside a request too.
+    """
+    start = time.perf_counter()
+    token = _current_span_attrs.set(attrs)
+    try:
+        yield attrs
+    finally:
+        duration = time.perf_counter() - start
+        _current_span_attrs.reset(token)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, duration, attrs)
+        stage_duration.observe(duration, stage=name)
+
+
+def annotate(key: str, value):
+    """Attach an attribute to the innermost open span (no-op outside a span)"""
+    attrs = _current_span_attrs.get()
+    if attrs is not None:
+        attrs[key] = value
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens a RequestTrace per HTTP request, adds a
+    Server-Timing header and records request latency by route template.
+    The header carries durations only unless details=True (debugging).
+    """
+    def __init__(self, app, details: bool = False):
+        self.app = app
+        self.details = details
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        status_code = 500
+
+        async def traced_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", trace.server_timing(self.details))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        finally:
+            _current_trace.reset(token)
+            route = scope.get("route")
+            request_duration.observe(
+                time.perf_counter() - trace.started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status_code,
+            )
@@ -136,37 +136,62 @@ export function QuizAnalytics({
           quizData.total_time = timing.total_time;
         }
 
-        // Submit quiz results to backend analytics
-        const submitResponse = await fetch('http://localhost:8000/api/analytics/submit-quiz', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify(quizData)
-        });
-
-        if (!submitResponse.ok) {
-          throw new Error('Failed to submit quiz results');
-        }
+        if (sessionId && questions.every((q) => q.id)) {
+          // Cached questions: one submit, graded server-side, recorded to history + analytics
+          const gradedResponse = await fetch('http://localhost:8000/api/quiz/submit-answers', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+              sessionId,
+              topic,
+              answers: questions.map((q, idx) => ({
+                id: q.id,
+                answer: answers[idx] ?? null,
+                timeSpent: timing?.per_question_time?.[idx] || 0
+              })),
+              start_time: timing?.start_time,
+              end_time: timing?.end_time,
+              total_time: timing?.total_time
+            })
+          });
+          const graded = gradedResponse.ok ? await gradedResponse.json() : null;
+          if (!graded?.success) {
+            throw new Error('Failed to submit quiz results');
+          }
+        } else {
+          // Submit quiz results to backend analytics
+          const submitResponse = await fetch('http://localhost:8000/api/analytics/submit-quiz', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(quizData)
+          });
+
+          if (!submitResponse.ok) {
+            throw new Error('Failed to submit quiz results');
+          }
 
-        // Also submit to quiz submission endpoint for Stack history tracking
-        if (sessionId) {
-          try {
-            const score = questions.filter((q, idx) => answers[idx] === q.correct_answer).length;
-            await fetch('http://localhost:8000/api/quiz/submit', {
-              method: 'POST',
-              headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify({
-                sessionId: sessionId,
-                questions: questions,
-                score: score,
-                total: questions.length,
-                start_time: timing?.start_time,
-                end_time: timing?.end_time,
-                total_time: timing?.total_time,
-                per_question_time: timing?.per_question_time || []
-              })
-            });
-          } catch (err) {
-            console.warn('Failed to submit quiz to history stack:', err);
+          // Also submit to quiz submission endpoint for Stack history tracking
+          if (sessionId) {
+            try {
+              const score = questions.filter((q, idx) => answers[idx] === q.correct_answer).length;
+              await fetch('http://localhost:8000/api/quiz/submit', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                  sessionId: sessionId,
+                  questions: questions,
+                  answers: questions.map((_, idx) => answers[idx] ?? null),
+                  score: score,
+                  total: questions.length,
+                  start_time: timing?.start_time,
+                  end_time: timing?.end_time,
+                  total_time: timing?.total_time,
+                  per_question_time: timing?.per_question_time || []
+                })
+              });
+            } catch (err) {
+              console.warn('Failed to submit quiz to history stack:', err);
+            }
           }
         }
 
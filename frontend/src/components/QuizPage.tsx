@@ -7,6 +7,7 @@ import { Progress } from './ui/progress';
 import { Clock } from 'lucide-react';
 
 export interface Question {
+  id?: string;
   question: string;
   options: {
     A: string;